@@ -0,0 +1,318 @@
+"""
+Escritor asíncrono por lotes para la tabla `auditoria`
+
+En modo "asincrono" (por defecto) `crud_sql.crear_auditoria_sql` ya no inserta
+la fila en la transacción de la petición: la deja pendiente en la sesión y,
+cuando esa transacción se confirma, la pasa a una cola en memoria. Una tarea
+de fondo vacía la cola e inserta las filas en lote, cuando se junta un lote
+completo o cuando pasa el intervalo máximo. Si la transacción hace rollback
+las filas pendientes se descartan.
+
+La cola es acotada: si se llena, las nuevas transacciones esperan a que haya
+lugar antes de empezar (backpressure, en `crud_sql.unidad_de_trabajo`) y la
+espera queda registrada en `metricas()`. Una transacción ya abierta nunca
+espera: retendría conexiones y bloqueos de filas que el escritor puede
+necesitar, así que el tope se puede pasar por las filas que ya estaban en
+curso. El escritor usa su propio pool (`database_sql.engine_auditoria`).
+
+Si un lote no se puede insertar después de los reintentos se guarda en
+AUDITORIA_DERRAME_PATH (JSON por línea) y se vuelve a intentar al arrancar
+el escritor; solo se pierde si tampoco se puede escribir el archivo. Los
+contadores `derramadas`, `recuperadas` y `perdidas` de `metricas()` lo muestran.
+
+Al detenerse, las auditorías nuevas pasan al modo estricto y el escritor
+espera a que las transacciones que ya reservaron lugar terminen antes de
+vaciar la cola, así ninguna fila confirmada queda sin escribir.
+
+En modo "estricto" las filas se escriben en la misma transacción que el
+cambio auditado, como antes.
+"""
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+from app.database_sql import ES_SQLITE, AsyncSessionAuditoria, turno_escritura
+from app.models_sql import AuditoriaSQL
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Set
+import asyncio
+import json
+import os
+import time
+
+# Configuración (desde variables de entorno)
+AUDITORIA_MODO = os.getenv("AUDITORIA_MODO", "asincrono")  # "asincrono" o "estricto"
+AUDITORIA_COLA_MAX = int(os.getenv("AUDITORIA_COLA_MAX", "10000"))
+AUDITORIA_LOTE = int(os.getenv("AUDITORIA_LOTE", "500"))
+AUDITORIA_INTERVALO = float(os.getenv("AUDITORIA_INTERVALO", "1.0"))  # segundos
+AUDITORIA_REINTENTOS = 3
+AUDITORIA_ESPERA_CIERRE = float(os.getenv("AUDITORIA_ESPERA_CIERRE", "10"))  # segundos
+# Lotes que no se pudieron insertar (se reintentan al arrancar)
+AUDITORIA_DERRAME_PATH = os.getenv("AUDITORIA_DERRAME_PATH", "auditoria_pendiente.jsonl")
+
+# Clave en `session.info` con las filas que esperan el commit de la sesión
+PENDIENTES = "auditoria_pendiente"
+
+_FIN = object()
+
+
+class EscritorAuditoria:
+    """Cola acotada + tarea de fondo que inserta auditorías en lote"""
+
+    def __init__(self, capacidad: int = AUDITORIA_COLA_MAX, tam_lote: int = AUDITORIA_LOTE,
+                 intervalo: float = AUDITORIA_INTERVALO):
+        self.capacidad = capacidad
+        self.tam_lote = tam_lote
+        self.intervalo = intervalo
+        self._cola: Optional[asyncio.Queue] = None
+        self._con_lugar: Optional[asyncio.Event] = None
+        self._tarea: Optional[asyncio.Task] = None
+        self._reservadas = 0
+        self._sin_reservas: Optional[asyncio.Event] = None
+        self._cerrando = False
+        # Escrituras de filas confirmadas después de detener el escritor
+        self._tardias: Set[asyncio.Task] = set()
+        # Métricas
+        self.encoladas = 0
+        self.escritas = 0
+        self.descartadas = 0
+        self.lotes = 0
+        self.errores = 0
+        self.derramadas = 0
+        self.recuperadas = 0
+        self.perdidas = 0
+        self.esperas_backpressure = 0
+        self.tiempo_espera_total = 0.0
+        self.max_ocupacion = 0
+
+    @property
+    def activo(self) -> bool:
+        """Acepta filas nuevas (falso mientras se detiene)"""
+        return self._corriendo and not self._cerrando
+
+    @property
+    def _corriendo(self) -> bool:
+        return self._tarea is not None and not self._tarea.done()
+
+    async def iniciar(self):
+        """Arrancar la tarea de fondo (se llama en el startup de la app)"""
+        if self.activo:
+            return
+        self._cola = asyncio.Queue()
+        self._con_lugar = asyncio.Event()
+        self._con_lugar.set()
+        self._reservadas = 0
+        self._sin_reservas = asyncio.Event()
+        self._sin_reservas.set()
+        self._cerrando = False
+        self._tarea = asyncio.create_task(self._bucle())
+
+    async def detener(self):
+        """Escribir todo lo pendiente y detener la tarea (shutdown de la app)"""
+        if not self._corriendo:
+            return
+        # Las auditorías nuevas van por el camino estricto; las ya reservadas
+        # llegan a la cola cuando su transacción hace commit (o se descartan)
+        self._cerrando = True
+        self._con_lugar.set()
+        try:
+            await asyncio.wait_for(self._sin_reservas.wait(), AUDITORIA_ESPERA_CIERRE)
+        except asyncio.TimeoutError:
+            print(f"⚠️  {self._reservadas} auditorías siguen pendientes al detener el escritor")
+        self._cola.put_nowait(_FIN)
+        await self._tarea
+        self._tarea = None
+        self._cerrando = False
+        # Filas entregadas después de la marca de fin
+        resto = []
+        while not self._cola.empty():
+            fila = self._cola.get_nowait()
+            if fila is not _FIN:
+                resto.append(fila)
+        if resto:
+            await self._escribir(resto)
+
+    async def esperar_lugar(self):
+        """Esperar a que la cola tenga lugar (backpressure); llamar antes de abrir la transacción"""
+        if not self.activo or self._reservadas < self.capacidad:
+            return
+        self.esperas_backpressure += 1
+        if self.esperas_backpressure == 1 or self.esperas_backpressure % 1000 == 0:
+            print(f"⚠️  Cola de auditoría llena ({self.capacidad}); las escrituras esperan lugar")
+        inicio = time.perf_counter()
+        while self.activo and self._reservadas >= self.capacidad:
+            await self._con_lugar.wait()
+        self.tiempo_espera_total += time.perf_counter() - inicio
+
+    def reservar(self):
+        """Contar una fila que espera el commit de su transacción (no espera: ver `esperar_lugar`)"""
+        self._reservadas += 1
+        self._sin_reservas.clear()
+        if self._reservadas >= self.capacidad:
+            self._con_lugar.clear()
+        self.max_ocupacion = max(self.max_ocupacion, self._reservadas)
+
+    def liberar(self, cantidad: int):
+        """Devolver lugares reservados (filas escritas o descartadas)"""
+        self._reservadas -= cantidad
+        if self._reservadas < self.capacidad:
+            self._con_lugar.set()
+        if self._reservadas <= 0:
+            self._sin_reservas.set()
+
+    def entregar(self, filas: List[dict]):
+        """Pasar a la cola las filas de una transacción ya confirmada"""
+        if not self._corriendo:
+            # La transacción terminó después de detener el escritor: escribirlas aparte
+            tarea = asyncio.get_running_loop().create_task(self._escribir(list(filas)))
+            self._tardias.add(tarea)
+            tarea.add_done_callback(self._tardias.discard)
+            self.encoladas += len(filas)
+            return
+        for fila in filas:
+            self._cola.put_nowait(fila)
+        self.encoladas += len(filas)
+
+    def descartar(self, filas: List[dict]):
+        """Olvidar las filas de una transacción que hizo rollback"""
+        self.descartadas += len(filas)
+        self.liberar(len(filas))
+
+    async def _bucle(self):
+        loop = asyncio.get_running_loop()
+        await self._recuperar_derramadas()
+        while True:
+            fila = await self._cola.get()
+            if fila is _FIN:
+                return
+            lote = [fila]
+            limite = loop.time() + self.intervalo
+            fin = False
+            while len(lote) < self.tam_lote:
+                restante = limite - loop.time()
+                # Si la cola está llena no esperar al intervalo: hay escrituras bloqueadas
+                if restante <= 0 or self._reservadas >= self.capacidad:
+                    break
+                try:
+                    fila = await asyncio.wait_for(self._cola.get(), restante)
+                except asyncio.TimeoutError:
+                    break
+                if fila is _FIN:
+                    fin = True
+                    break
+                lote.append(fila)
+            await self._escribir(lote)
+            if fin:
+                return
+
+    async def _insertar(self, lote: List[dict]) -> Optional[Exception]:
+        """Insertar un lote con un solo executemany; devuelve el último error si no se pudo"""
+        for intento in range(1, AUDITORIA_REINTENTOS + 1):
+            try:
+                async with turno_escritura():
+                    async with AsyncSessionAuditoria() as session:
+                        await session.execute(insert(AuditoriaSQL), lote)
+                        await session.commit()
+                self.escritas += len(lote)
+                self.lotes += 1
+                return None
+            except Exception as e:
+                if intento == AUDITORIA_REINTENTOS:
+                    return e
+                await asyncio.sleep(0.1 * intento)
+
+    async def _escribir(self, lote: List[dict]):
+        """Insertar un lote; si falla, guardarlo en disco para reintentarlo"""
+        try:
+            error = await self._insertar(lote)
+            if error is not None:
+                self.errores += len(lote)
+                self._derramar(lote, error)
+        finally:
+            self.liberar(len(lote))
+
+    def _derramar(self, lote: List[dict], error: Exception):
+        """Agregar un lote que no se pudo insertar al archivo de derrame"""
+        try:
+            with open(AUDITORIA_DERRAME_PATH, "a", encoding="utf-8") as archivo:
+                for fila in lote:
+                    archivo.write(json.dumps(fila, default=str) + "\n")
+        except OSError as e:
+            self.perdidas += len(lote)
+            print(f"❌ Se perdieron {len(lote)} auditorías ({error}); no se pudo escribir {AUDITORIA_DERRAME_PATH}: {e}")
+            return
+        self.derramadas += len(lote)
+        print(f"⚠️  {len(lote)} auditorías guardadas en {AUDITORIA_DERRAME_PATH} para reintentar: {error}")
+
+    async def _recuperar_derramadas(self):
+        """Reintentar los lotes guardados en disco por una corrida anterior"""
+        ruta = Path(AUDITORIA_DERRAME_PATH)
+        # Se procesa una copia: los lotes que vuelvan a fallar se agregan al archivo original
+        recuperando = ruta.with_name(ruta.name + ".recuperando")
+        if ruta.exists() and not recuperando.exists():
+            ruta.replace(recuperando)
+        if not recuperando.exists():
+            return
+        filas = []
+        for linea in recuperando.read_text(encoding="utf-8").splitlines():
+            if linea.strip():
+                fila = json.loads(linea)
+                if fila.get("timestamp"):
+                    fila["timestamp"] = datetime.fromisoformat(fila["timestamp"])
+                filas.append(fila)
+        for inicio in range(0, len(filas), self.tam_lote):
+            lote = filas[inicio:inicio + self.tam_lote]
+            error = await self._insertar(lote)
+            if error is None:
+                self.recuperadas += len(lote)
+            else:
+                self._derramar(lote, error)
+        recuperando.unlink()
+        if filas:
+            print(f"✅ Auditorías recuperadas de {AUDITORIA_DERRAME_PATH}: {self.recuperadas}")
+
+    def metricas(self) -> dict:
+        """Estado de la cola y contadores de backpressure"""
+        return {
+            "modo": "estricto" if ES_SQLITE else AUDITORIA_MODO,
+            "activo": self.activo,
+            "capacidad": self.capacidad,
+            "ocupacion": self._reservadas,
+            "max_ocupacion": self.max_ocupacion,
+            "encoladas": self.encoladas,
+            "escritas": self.escritas,
+            "descartadas": self.descartadas,
+            "lotes": self.lotes,
+            "errores": self.errores,
+            "derramadas": self.derramadas,
+            "recuperadas": self.recuperadas,
+            "perdidas": self.perdidas,
+            "esperas_backpressure": self.esperas_backpressure,
+            "tiempo_espera_total": round(self.tiempo_espera_total, 6),
+        }
+
+
+escritor = EscritorAuditoria()
+
+
+def usar_escritor() -> bool:
+    """
+    Indica si las auditorías deben ir por la cola en lugar de la transacción
+
+    Con SQLite no: hay un solo escritor, así que la fila va en la transacción
+    que ya tiene el turno (otra escritura esperaría ese mismo turno).
+    """
+    return AUDITORIA_MODO != "estricto" and not ES_SQLITE and escritor.activo
+
+
+@event.listens_for(Session, "after_commit")
+def _entregar_pendientes(session):
+    filas = session.info.pop(PENDIENTES, None)
+    if filas:
+        escritor.entregar(filas)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _descartar_pendientes(session, previous_transaction):
+    filas = session.info.pop(PENDIENTES, None)
+    if filas:
+        escritor.descartar(filas)
@@ -0,0 +1,192 @@
+"""
+Caché en memoria del catálogo de seguros (colección `seguros` de MongoDB)
+
+El catálogo son unas decenas de documentos que casi nunca cambian, así que se
+mantiene completo en memoria indexado por `id` y por `tipo`. La caché expira
+según un TTL, las recargas concurrentes se agrupan en una sola consulta y
+cualquier escritura (`crud.crear_seguro_economico`) la invalida al instante.
+
+Cada copia cargada tiene un ETag (hash de su contenido, igual en todos los
+procesos) y guarda las respuestas ya serializadas, así un GET condicional o
+repetido no consulta MongoDB ni vuelve a serializar.
+"""
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.respuestas import a_json, seguro_publico
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import bisect
+import hashlib
+import os
+import time
+
+# Segundos que una copia del catálogo se considera vigente
+CATALOGO_CACHE_TTL = float(os.getenv("CATALOGO_CACHE_TTL", "60"))
+
+# Respuestas serializadas que se guardan por copia (skip/limit/cursor las multiplican)
+CATALOGO_MAX_RESPUESTAS = 256
+
+
+def clave_seguro(seguro: dict) -> Tuple[datetime, str]:
+    """Clave de orden estable del catálogo: `(fecha_creacion, id)`"""
+    return seguro.get("fecha_creacion") or datetime.min, seguro["id"]
+
+
+class CatalogoCache:
+    """Copia en memoria del catálogo, indexada por id y por tipo"""
+
+    def __init__(self, ttl: float = CATALOGO_CACHE_TTL):
+        self.ttl = ttl
+        self.version = 0
+        self._por_id: Dict[str, dict] = {}
+        self._por_tipo: Dict[str, List[dict]] = {}
+        self._activos: List[dict] = []
+        self._claves: List[Tuple[datetime, str]] = []
+        self._cargado_en: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self.etag: Optional[str] = None
+        self._respuestas: Dict[Any, Tuple[bytes, Dict[str, str]]] = {}
+
+    def _vigente(self) -> bool:
+        return self._cargado_en is not None and time.monotonic() - self._cargado_en < self.ttl
+
+    def _cargar(self, documentos: List[dict]):
+        por_id = {}
+        por_tipo: Dict[str, List[dict]] = {}
+        activos = []
+        for doc in documentos:
+            doc.pop("_id", None)
+            por_id[doc["id"]] = doc
+            if doc.get("activo", True):
+                activos.append(doc)
+                por_tipo.setdefault(doc.get("tipo"), []).append(doc)
+        self._por_id = por_id
+        activos.sort(key=clave_seguro)
+        self._por_tipo = por_tipo
+        self._activos = activos
+        self._claves = [clave_seguro(doc) for doc in activos]
+        # El ETag depende solo del contenido: dos procesos con el mismo catálogo dan el mismo
+        contenido = a_json([seguro_publico(por_id[i]) for i in sorted(por_id)])
+        self.etag = '"' + hashlib.sha1(contenido).hexdigest()[:20] + '"'
+        self._respuestas = {}
+        self._cargado_en = time.monotonic()
+
+    async def _asegurar(self, db: AsyncIOMotorDatabase):
+        """Recargar el catálogo si expiró; solo una recarga corre a la vez"""
+        if self._vigente():
+            return
+        async with self._lock:
+            # Otra corrutina pudo haber recargado mientras esperábamos el lock
+            if self._vigente():
+                return
+            while True:
+                version = self.version
+                documentos = [doc async for doc in db.seguros.find({}, {"_id": 0})]
+                # Si hubo una escritura durante la consulta, no guardar datos viejos: releer
+                if version == self.version:
+                    self._cargar(documentos)
+                    return
+
+    def invalidar(self):
+        """Descartar la copia actual; la siguiente lectura recarga desde MongoDB"""
+        self.version += 1
+        self._cargado_en = None
+
+    async def etag_vigente(self, db: AsyncIOMotorDatabase) -> str:
+        """ETag de la copia vigente (recarga solo si expiró o se invalidó)"""
+        await self._asegurar(db)
+        return self.etag
+
+    def representacion(self, clave: Any, construir: Callable[[], Tuple[Any, Dict[str, str]]]) -> Tuple[bytes, Dict[str, str]]:
+        """
+        Cuerpo JSON y headers de una respuesta del catálogo, serializados una vez por copia
+
+        Llamar después de `etag_vigente` sin `await` en el medio, para que el
+        cuerpo corresponda al ETag. `construir` devuelve `(contenido, headers)`.
+        """
+        guardada = self._respuestas.get(clave)
+        if guardada is None:
+            contenido, headers = construir()
+            if len(self._respuestas) >= CATALOGO_MAX_RESPUESTAS:
+                self._respuestas.clear()
+            guardada = self._respuestas[clave] = (a_json(contenido), headers)
+        return guardada
+
+    async def obtener(self, db: AsyncIOMotorDatabase, seguro_id: str, solo_activos: bool = False,
+                      perfil: str = "completo") -> Optional[dict]:
+        """
+        Obtener un seguro por id (incluye inactivos salvo que se pida lo contrario)
+
+        Si no está en la caché se busca en MongoDB trayendo solo los campos de
+        `perfil` (ver `crud.PROYECCIONES_SEGURO`).
+        """
+        from app import crud  # crud importa este módulo para invalidar la caché
+        await self._asegurar(db)
+        seguro = self._por_id.get(seguro_id)
+        if seguro is None:
+            return await crud.obtener_seguro(db, seguro_id, perfil=perfil, solo_activos=solo_activos)
+        if solo_activos and not seguro.get("activo", True):
+            return None
+        return seguro
+
+    async def obtener_muchos(self, db: AsyncIOMotorDatabase, seguro_ids: Iterable[str],
+                             perfil: str = "completo") -> Dict[str, dict]:
+        """
+        Resolver varios seguros de una vez, indexados por id
+
+        Los que no estén en la caché (p. ej. creados por otro proceso después
+        de la última recarga) se piden juntos en una sola consulta `$in`, con
+        solo los campos de `perfil`.
+        """
+        from app import crud  # crud importa este módulo para invalidar la caché
+        await self._asegurar(db)
+        resultado = {}
+        faltantes = []
+        for seguro_id in set(seguro_ids):
+            seguro = self._por_id.get(seguro_id)
+            if seguro is None:
+                faltantes.append(seguro_id)
+            else:
+                resultado[seguro_id] = seguro
+        if faltantes:
+            resultado.update(await crud.obtener_seguros_por_ids(db, faltantes, perfil=perfil))
+        return resultado
+
+    async def listar(self, db: AsyncIOMotorDatabase, skip: int = 0, limit: Optional[int] = None,
+                     despues_de: Optional[Tuple[datetime, str]] = None) -> List[dict]:
+        """Listar los seguros activos ordenados por `(fecha_creacion, id)`"""
+        await self._asegurar(db)
+        return self.pagina(skip, limit, despues_de)
+
+    def pagina(self, skip: int = 0, limit: Optional[int] = None,
+               despues_de: Optional[Tuple[datetime, str]] = None) -> List[dict]:
+        """Como `listar`, sobre la copia ya cargada (sin await)"""
+        inicio = skip
+        if despues_de is not None:
+            inicio += bisect.bisect_right(self._claves, despues_de)
+        fin = None if limit is None else inicio + limit
+        return self._activos[inicio:fin]
+
+    async def listar_por_tipo(self, db: AsyncIOMotorDatabase, tipo: str) -> List[dict]:
+        """Listar los seguros activos de un tipo"""
+        await self._asegurar(db)
+        return self.de_tipo(tipo)
+
+    def de_tipo(self, tipo: str) -> List[dict]:
+        """Como `listar_por_tipo`, sobre la copia ya cargada (sin await)"""
+        return list(self._por_tipo.get(tipo, []))
+
+
+catalogo_cache = CatalogoCache()
+
+
+async def resolver_seguros(db: AsyncIOMotorDatabase, filas: Iterable[Any], campo: str = "seguro_id",
+                           perfil: str = "resumen") -> Dict[str, dict]:
+    """
+    Resolver en lote los seguros referenciados por filas SQL (p. ej. pólizas)
+
+    Reúne todos los `seguro_id` de las filas y los resuelve con una sola
+    búsqueda, en lugar de una consulta a MongoDB por fila. Por defecto solo
+    trae nombre y tipo, que es lo que muestran los listados de pólizas.
+    """
+    return await catalogo_cache.obtener_muchos(db, (getattr(fila, campo) for fila in filas), perfil=perfil)
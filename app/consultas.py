@@ -0,0 +1,140 @@
+"""
+Conteo de consultas por petición (SQL y MongoDB) para detectar N+1
+
+Cada petición HTTP recibe un contador en un ContextVar. Las sentencias SQL se
+cuentan con el evento `before_cursor_execute` de los engines y los comandos
+de MongoDB con un CommandListener de pymongo (Motor copia el contexto al
+thread donde ejecuta pymongo, así que el conteo llega a la petición correcta).
+
+- CONSULTAS_DEBUG=1: agrega los headers X-Consultas-SQL y X-Consultas-Mongo
+- CONSULTAS_PRESUPUESTO_SQL / CONSULTAS_PRESUPUESTO_MONGO: si una petición
+  supera el presupuesto se imprime un aviso con la ruta (0 = sin límite)
+
+En tests, `limite_consultas` falla si alguna petición hecha dentro del bloque
+supera el máximo indicado:
+
+    with limite_consultas(sql=4, mongo=1):
+        client.post("/api/v1/usuarios/{id}/comprar-seguro", json=...)
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pymongo import monitoring
+from sqlalchemy import event
+from typing import List, Optional
+import os
+import threading
+
+# Configuración (desde variables de entorno)
+CONSULTAS_DEBUG = os.getenv("CONSULTAS_DEBUG", "0") == "1"
+CONSULTAS_PRESUPUESTO_SQL = int(os.getenv("CONSULTAS_PRESUPUESTO_SQL", "0"))
+CONSULTAS_PRESUPUESTO_MONGO = int(os.getenv("CONSULTAS_PRESUPUESTO_MONGO", "0"))
+
+HEADER_CONSULTAS_SQL = "X-Consultas-SQL"
+HEADER_CONSULTAS_MONGO = "X-Consultas-Mongo"
+
+
+class ConteoConsultas:
+    """Consultas emitidas durante una petición"""
+
+    def __init__(self):
+        self.sql = 0
+        self.mongo = 0
+        self._lock = threading.Lock()
+
+    def sumar_sql(self):
+        self.sql += 1
+
+    def sumar_mongo(self):
+        # Los comandos de Motor se registran desde threads del executor
+        with self._lock:
+            self.mongo += 1
+
+
+_conteo_actual: ContextVar[Optional[ConteoConsultas]] = ContextVar("conteo_consultas", default=None)
+
+# Límites activos de `limite_consultas` (solo se usan en tests)
+_limites: List["LimiteConsultas"] = []
+
+
+def iniciar_conteo() -> ConteoConsultas:
+    """Empezar a contar las consultas del contexto actual (una petición)"""
+    conteo = ConteoConsultas()
+    _conteo_actual.set(conteo)
+    return conteo
+
+
+def finalizar_conteo(conteo: ConteoConsultas, metodo: str, ruta: str, response=None):
+    """Exponer el conteo en headers, avisar si se pasó el presupuesto e informar a los tests"""
+    if response is not None and CONSULTAS_DEBUG:
+        response.headers[HEADER_CONSULTAS_SQL] = str(conteo.sql)
+        response.headers[HEADER_CONSULTAS_MONGO] = str(conteo.mongo)
+
+    excedido = (
+        (CONSULTAS_PRESUPUESTO_SQL and conteo.sql > CONSULTAS_PRESUPUESTO_SQL) or
+        (CONSULTAS_PRESUPUESTO_MONGO and conteo.mongo > CONSULTAS_PRESUPUESTO_MONGO)
+    )
+    if excedido:
+        print(f"⚠️  {metodo} {ruta} superó el presupuesto de consultas: "
+              f"{conteo.sql} SQL (máx {CONSULTAS_PRESUPUESTO_SQL or '-'}), "
+              f"{conteo.mongo} Mongo (máx {CONSULTAS_PRESUPUESTO_MONGO or '-'})")
+
+    for limite in _limites:
+        limite.registrar(metodo, ruta, conteo)
+
+
+def instrumentar_engine(engine):
+    """Contar cada sentencia SQL que ejecuta el engine"""
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _contar(conn, cursor, statement, parameters, context, executemany):
+        conteo = _conteo_actual.get()
+        if conteo is not None:
+            conteo.sumar_sql()
+
+
+class ContadorMongo(monitoring.CommandListener):
+    """Listener de pymongo que suma cada comando al conteo de la petición"""
+
+    def started(self, event):
+        conteo = _conteo_actual.get()
+        if conteo is not None:
+            conteo.sumar_mongo()
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+contador_mongo = ContadorMongo()
+
+
+class LimiteConsultas:
+    """Máximo de consultas por petición que se verifica al salir del bloque"""
+
+    def __init__(self, sql: Optional[int] = None, mongo: Optional[int] = None):
+        self.sql = sql
+        self.mongo = mongo
+        self.peticiones: List[tuple] = []
+
+    def registrar(self, metodo: str, ruta: str, conteo: ConteoConsultas):
+        self.peticiones.append((metodo, ruta, conteo.sql, conteo.mongo))
+
+    def verificar(self):
+        for metodo, ruta, sql, mongo in self.peticiones:
+            if self.sql is not None and sql > self.sql:
+                raise AssertionError(f"{metodo} {ruta} hizo {sql} consultas SQL (máximo {self.sql})")
+            if self.mongo is not None and mongo > self.mongo:
+                raise AssertionError(f"{metodo} {ruta} hizo {mongo} comandos Mongo (máximo {self.mongo})")
+
+
+@contextmanager
+def limite_consultas(sql: Optional[int] = None, mongo: Optional[int] = None):
+    """Helper para pytest: falla si una petición del bloque supera el máximo de consultas"""
+    limite = LimiteConsultas(sql, mongo)
+    _limites.append(limite)
+    try:
+        yield limite
+    finally:
+        _limites.remove(limite)
+    limite.verificar()
@@ -1,8 +1,9 @@
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from . import models, schemas
+from .catalogo_cache import catalogo_cache
 import uuid
 import datetime
-from typing import List, Optional, Tuple, Any
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 
 # --- Helpers ---
@@ -15,6 +16,28 @@ def _to_dict(obj: Any) -> dict:
     return dict(obj)
 
 
+# --- Proyecciones del catálogo ---
+# Perfiles de campos de `seguros`: cada llamada pide solo lo que usa y no
+# trae `descripcion` ni `beneficios` (los campos largos) si no los muestra
+PROYECCIONES_SEGURO: Dict[str, dict] = {
+    # Catálogo público (listados, caché en memoria)
+    "completo": {"_id": 0},
+    # Pólizas, próximos pagos y dashboard: solo el nombre y el tipo
+    "resumen": {"_id": 0, "id": 1, "nombre": 1, "tipo": 1, "activo": 1},
+    # Compra y cobro de cuotas
+    "precio": {"_id": 0, "id": 1, "nombre": 1, "tipo": 1, "activo": 1,
+               "precio": 1, "cuota_mensual": 1, "duracion_meses": 1},
+}
+
+
+def proyeccion_seguro(perfil: str) -> dict:
+    """Proyección de MongoDB de un perfil de `PROYECCIONES_SEGURO`"""
+    try:
+        return PROYECCIONES_SEGURO[perfil]
+    except KeyError:
+        raise ValueError(f"Perfil de seguro desconocido: {perfil}")
+
+
 async def crear_seguro_economico(db: AsyncIOMotorDatabase, seguro: schemas.SeguroCreate) -> dict:
     data = _to_dict(seguro)
     # asegurar id y metadata
@@ -22,22 +45,55 @@ async def crear_seguro_economico(db: AsyncIOMotorDatabase, seguro: schemas.Segur
     data.setdefault("activo", True)
     data.setdefault("fecha_creacion", datetime.datetime.utcnow())
     await db.seguros.insert_one(data)
+    catalogo_cache.invalidar()
     return data
 
 
-async def obtener_seguros(db: AsyncIOMotorDatabase, skip: int = 0, limit: int = 10) -> List[dict]:
-    cursor = db.seguros.find({"activo": True}).skip(skip).limit(limit)
+async def obtener_seguros(db: AsyncIOMotorDatabase, skip: int = 0, limit: int = 10,
+                          despues_de: Optional[Tuple[datetime.datetime, str]] = None,
+                          perfil: str = "completo") -> List[dict]:
+    filtro = {"activo": True}
+    if despues_de is not None:
+        # Paginación por cursor sobre (fecha_creacion, id)
+        fecha, seguro_id = despues_de
+        filtro["$or"] = [
+            {"fecha_creacion": {"$gt": fecha}},
+            {"fecha_creacion": fecha, "id": {"$gt": seguro_id}},
+        ]
+    cursor = (
+        db.seguros.find(filtro, proyeccion_seguro(perfil))
+        .sort([("fecha_creacion", 1), ("id", 1)]).skip(skip).limit(limit)
+    )
     return [doc async for doc in cursor]
 
 
-async def obtener_seguros_economicos(db: AsyncIOMotorDatabase, tipo: Optional[str] = None) -> List[dict]:
+async def obtener_seguros_economicos(db: AsyncIOMotorDatabase, tipo: Optional[str] = None,
+                                     perfil: str = "completo") -> List[dict]:
     filtro = {"activo": True}
     if tipo:
         filtro["tipo"] = tipo
-    cursor = db.seguros.find(filtro)
+    cursor = db.seguros.find(filtro, proyeccion_seguro(perfil))
     return [doc async for doc in cursor]
 
 
+async def obtener_seguro(db: AsyncIOMotorDatabase, seguro_id: str, perfil: str = "completo",
+                         solo_activos: bool = False) -> Optional[dict]:
+    filtro = {"id": seguro_id}
+    if solo_activos:
+        filtro["activo"] = True
+    return await db.seguros.find_one(filtro, proyeccion_seguro(perfil))
+
+
+async def obtener_seguros_por_ids(db: AsyncIOMotorDatabase, seguro_ids: Iterable[str],
+                                  perfil: str = "completo") -> Dict[str, dict]:
+    """Varios seguros con una sola consulta `$in`, indexados por id"""
+    ids = list(set(seguro_ids))
+    if not ids:
+        return {}
+    cursor = db.seguros.find({"id": {"$in": ids}}, proyeccion_seguro(perfil))
+    return {doc["id"]: doc async for doc in cursor}
+
+
 async def procesar_pago(db: AsyncIOMotorDatabase, usuario_id: str, monto: float) -> bool:
     # Intentar decrementar el saldo solo si hay saldo suficiente (operación atómica)
     result = await db.usuarios.update_one({"id": usuario_id, "saldo": {"$gte": monto}}, {"$inc": {"saldo": -monto}})
@@ -46,7 +102,7 @@ async def procesar_pago(db: AsyncIOMotorDatabase, usuario_id: str, monto: float)
 
 async def comprar_seguro(db: AsyncIOMotorDatabase, usuario_id: str, seguro_id: str) -> Tuple[Optional[dict], Optional[dict], str]:
     usuario = await db.usuarios.find_one({"id": usuario_id})
-    seguro = await db.seguros.find_one({"id": seguro_id})
+    seguro = await obtener_seguro(db, seguro_id, perfil="precio")
 
     if not usuario or not seguro:
         return None, None, "Usuario o seguro no encontrado"
@@ -98,7 +154,7 @@ async def pagar_cuota_mensual(db: AsyncIOMotorDatabase, poliza_id: str, metodo_p
     if poliza.get("pagos_realizados", 0) >= poliza.get("total_pagos", 0):
         return None, "Ya has completado todos los pagos de esta póliza"
 
-    seguro = await db.seguros.find_one({"id": poliza.get("seguro_id")})
+    seguro = await obtener_seguro(db, poliza.get("seguro_id"), perfil="precio")
     usuario = await db.usuarios.find_one({"id": poliza.get("usuario_id")})
 
     if metodo_pago == "saldo":
@@ -2,15 +2,85 @@
 Operaciones CRUD para MySQL usando SQLAlchemy (async)
 """
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, and_, or_
+from sqlalchemy import select, update, and_, or_, func, case, bindparam, inspect
+from sqlalchemy.dialects.mysql import insert as insert_mysql
+from sqlalchemy.dialects.sqlite import insert as insert_sqlite
 from sqlalchemy.orm import selectinload
-from app.models_sql import UsuarioSQL, SeguroSQL, PolizaSQL, PagoSQL, AuditoriaSQL, EstadoPoliza, EstadoPago
+from sqlalchemy.orm.attributes import set_committed_value
+from app.models_sql import (
+    UsuarioSQL, SeguroSQL, PolizaSQL, PagoSQL, PagoArchivadoSQL, AuditoriaSQL, ResumenCuentaSQL, EstadoPoliza, EstadoPago
+)
 from app import schemas
-from typing import List, Optional
+from app import auditoria_async
+from app.particiones import inicio_ventana_caliente
+from typing import AsyncIterator, Dict, Iterable, List, Mapping, Optional, Tuple
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
+from decimal import Decimal
 import uuid
 
 
+# ============================================
+# Unidad de trabajo
+# ============================================
+
+# Clave en `session.info` que indica que la sesión está en una unidad de trabajo
+UNIDAD_DE_TRABAJO = "unidad_de_trabajo"
+
+
+def en_unidad_de_trabajo(db: AsyncSession) -> bool:
+    """Indica si la sesión está dentro de una unidad de trabajo"""
+    return db.info.get(UNIDAD_DE_TRABAJO, False)
+
+
+@asynccontextmanager
+async def unidad_de_trabajo(db: AsyncSession) -> AsyncIterator[AsyncSession]:
+    """
+    Agrupar varias operaciones CRUD en una sola transacción
+
+    Dentro del bloque las funciones de este módulo solo hacen `add` y `flush`;
+    al salir se hace un único commit, o rollback si hubo una excepción.
+
+    Uso:
+        async with crud_sql.unidad_de_trabajo(db):
+            await crud_sql.crear_poliza_sql(db, ...)
+            await crud_sql.crear_pago_sql(db, ...)
+    """
+    if en_unidad_de_trabajo(db):
+        # Unidad de trabajo anidada: la externa es la que confirma
+        yield db
+        return
+    
+    if auditoria_async.usar_escritor():
+        # Backpressure de la auditoría antes de tomar bloqueos: adentro ya no se espera
+        await auditoria_async.escritor.esperar_lugar()
+    db.info[UNIDAD_DE_TRABAJO] = True
+    try:
+        yield db
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    finally:
+        db.info.pop(UNIDAD_DE_TRABAJO, None)
+
+
+async def _guardar(db: AsyncSession, *objetos):
+    """Enviar los cambios: flush en una unidad de trabajo, commit y refresh fuera de ella"""
+    if en_unidad_de_trabajo(db):
+        await db.flush()
+        return
+    
+    await db.commit()
+    for objeto in objetos:
+        # Solo recargar las columnas que genera la base (server_default / onupdate);
+        # con expire_on_commit=False el resto ya está en memoria
+        estado = inspect(objeto)
+        columnas = [attr.key for attr in estado.mapper.column_attrs if attr.key in estado.unloaded]
+        if columnas:
+            await db.refresh(objeto, attribute_names=columnas)
+
+
 # ============================================
 # CRUD: Usuarios
 # ============================================
@@ -23,11 +93,12 @@ async def crear_usuario_sql(db: AsyncSession, usuario: schemas.UsuarioCreate) ->
         email=usuario.email,
         telefono=usuario.telefono,
         saldo=500.00,
-        activo=True
+        activo=True,
+        fecha_registro=datetime.now()
     )
     db.add(db_usuario)
-    await db.commit()
-    await db.refresh(db_usuario)
+    db.add(ResumenCuentaSQL(usuario_id=db_usuario.id))
+    await _guardar(db, db_usuario)
     
     # Registrar en auditoría
     await crear_auditoria_sql(
@@ -43,11 +114,19 @@ async def crear_usuario_sql(db: AsyncSession, usuario: schemas.UsuarioCreate) ->
 
 
 async def obtener_usuario_sql(db: AsyncSession, usuario_id: str) -> Optional[UsuarioSQL]:
-    """Obtener un usuario por ID"""
+    """Obtener un usuario por ID (sin consulta si ya está en la sesión)"""
+    return await db.get(UsuarioSQL, usuario_id)
+
+
+async def obtener_usuarios_por_ids_sql(db: AsyncSession, usuario_ids: Iterable[str]) -> Dict[str, UsuarioSQL]:
+    """Obtener varios usuarios con una sola consulta IN, indexados por ID"""
+    ids = list(set(usuario_ids))
+    if not ids:
+        return {}
     result = await db.execute(
-        select(UsuarioSQL).where(UsuarioSQL.id == usuario_id)
+        select(UsuarioSQL).where(UsuarioSQL.id.in_(ids))
     )
-    return result.scalar_one_or_none()
+    return {usuario.id: usuario for usuario in result.scalars().all()}
 
 
 async def obtener_usuario_por_email_sql(db: AsyncSession, email: str) -> Optional[UsuarioSQL]:
@@ -58,34 +137,100 @@ async def obtener_usuario_por_email_sql(db: AsyncSession, email: str) -> Optiona
     return result.scalar_one_or_none()
 
 
-async def obtener_usuarios_sql(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[UsuarioSQL]:
-    """Obtener lista de usuarios"""
-    result = await db.execute(
-        select(UsuarioSQL).where(UsuarioSQL.activo == True).offset(skip).limit(limit)
-    )
+async def obtener_usuarios_sql(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    despues_de: Optional[Tuple[datetime, str]] = None
+) -> List[UsuarioSQL]:
+    """
+    Obtener lista de usuarios ordenada por (fecha_registro, id)
+
+    Con `despues_de` se pagina por cursor (keyset) usando el índice
+    (activo, fecha_registro, id) en lugar de OFFSET.
+    """
+    result = await db.execute(_consulta_usuarios(select(UsuarioSQL), skip, limit, despues_de))
     return result.scalars().all()
 
 
-async def actualizar_saldo_usuario_sql(db: AsyncSession, usuario_id: str, nuevo_saldo: float) -> UsuarioSQL:
-    """Actualizar el saldo de un usuario"""
-    usuario = await obtener_usuario_sql(db, usuario_id)
-    if usuario:
-        saldo_anterior = usuario.saldo
-        usuario.saldo = nuevo_saldo
+async def obtener_usuarios_filas_sql(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    despues_de: Optional[Tuple[datetime, str]] = None
+) -> List[Mapping]:
+    """Como `obtener_usuarios_sql`, pero devuelve filas (mappings) sin crear objetos ORM"""
+    columnas = [UsuarioSQL.__table__.c[campo] for campo in schemas.Usuario.model_fields]
+    result = await db.execute(_consulta_usuarios(select(*columnas), skip, limit, despues_de))
+    return result.mappings().all()
+
+
+def _consulta_usuarios(query, skip: int, limit: int, despues_de: Optional[Tuple[datetime, str]]):
+    """Filtro de usuarios activos, orden (fecha_registro, id) y página"""
+    query = query.where(UsuarioSQL.activo == True)
+    if despues_de is not None:
+        fecha, usuario_id = despues_de
+        query = query.where(or_(
+            UsuarioSQL.fecha_registro > fecha,
+            and_(UsuarioSQL.fecha_registro == fecha, UsuarioSQL.id > usuario_id)
+        ))
+    return query.order_by(UsuarioSQL.fecha_registro, UsuarioSQL.id).offset(skip).limit(limit)
+
+
+async def _mover_saldo_sql(
+    db: AsyncSession, usuario_id: str, delta: Decimal, accion: str, condicion=None
+) -> Optional[float]:
+    """
+    Aplicar `saldo = saldo + delta` en un solo UPDATE; devuelve el saldo resultante
+
+    None si no se modificó la fila. El saldo nuevo sale del mismo UPDATE
+    (RETURNING) donde el dialecto lo admite; en MySQL se lee en la misma
+    transacción, con la fila todavía bloqueada por el UPDATE.
+    """
+    criterios = [UsuarioSQL.id == usuario_id]
+    if condicion is not None:
+        criterios.append(condicion)
+    consulta = update(UsuarioSQL).where(*criterios).values(saldo=UsuarioSQL.saldo + delta)
+    if db.bind.dialect.update_returning:
+        saldo = (await db.execute(consulta.returning(UsuarioSQL.saldo))).scalar_one_or_none()
+    else:
+        result = await db.execute(consulta)
+        saldo = None
+        if result.rowcount == 1:
+            saldo = (await db.execute(select(UsuarioSQL.saldo).where(UsuarioSQL.id == usuario_id))).scalar_one()
+    if saldo is None:
+        return None
+    
+    # Auditoría
+    await crear_auditoria_sql(
+        db,
+        usuario_id=usuario_id,
+        accion=accion,
+        tabla="usuarios",
+        registro_id=usuario_id,
+        datos_anteriores={"saldo": float(saldo - delta)},
+        datos_nuevos={"saldo": float(saldo), "monto": float(abs(delta))}
+    )
+    if not en_unidad_de_trabajo(db):
         await db.commit()
-        await db.refresh(usuario)
-        
-        # Auditoría
-        await crear_auditoria_sql(
-            db,
-            usuario_id=usuario_id,
-            accion="UPDATE_SALDO",
-            tabla="usuarios",
-            registro_id=usuario_id,
-            datos_anteriores={"saldo": float(saldo_anterior)},
-            datos_nuevos={"saldo": nuevo_saldo}
-        )
-    return usuario
+    return float(saldo)
+
+
+async def debitar_saldo_sql(db: AsyncSession, usuario_id: str, monto: float) -> Optional[float]:
+    """
+    Descontar `monto` del saldo de forma atómica, solo si el saldo alcanza
+
+    Equivale a `UPDATE usuarios SET saldo = saldo - :m WHERE id = :id AND saldo >= :m`.
+    Devuelve el saldo resultante, o None si el usuario no existe o no tiene
+    saldo suficiente.
+    """
+    monto = Decimal(str(monto))
+    return await _mover_saldo_sql(db, usuario_id, -monto, "DEBITO_SALDO", UsuarioSQL.saldo >= monto)
+
+
+async def acreditar_saldo_sql(db: AsyncSession, usuario_id: str, monto: float) -> Optional[float]:
+    """Sumar `monto` al saldo de forma atómica; devuelve el saldo resultante (None si el usuario no existe)"""
+    return await _mover_saldo_sql(db, usuario_id, Decimal(str(monto)), "CREDITO_SALDO")
 
 
 # ============================================
@@ -106,8 +251,7 @@ async def crear_seguro_sql(db: AsyncSession, seguro: schemas.SeguroCreate) -> Se
         activo=True
     )
     db.add(db_seguro)
-    await db.commit()
-    await db.refresh(db_seguro)
+    await _guardar(db, db_seguro)
     return db_seguro
 
 
@@ -156,8 +300,17 @@ async def crear_poliza_sql(
         cuotas_totales=duracion_meses
     )
     db.add(db_poliza)
-    await db.commit()
-    await db.refresh(db_poliza)
+    await _guardar(db, db_poliza)
+    
+    # Resumen de cuenta: nueva póliza activa con su pago inicial
+    await ajustar_resumen_sql(
+        db,
+        usuario_id,
+        polizas_activas=1,
+        total_pagado=monto_total,
+        cuotas_pendientes=duracion_meses,
+        proximo_monto=cuota_mensual
+    )
     
     # Auditoría
     await crear_auditoria_sql(
@@ -173,39 +326,69 @@ async def crear_poliza_sql(
 
 
 async def obtener_poliza_sql(db: AsyncSession, poliza_id: str) -> Optional[PolizaSQL]:
-    """Obtener una póliza por ID con sus relaciones"""
+    """Obtener una póliza por ID (sin consulta si ya está en la sesión, sin cargar relaciones)"""
+    return await db.get(PolizaSQL, poliza_id)
+
+
+async def obtener_polizas_por_ids_sql(db: AsyncSession, poliza_ids: Iterable[str]) -> Dict[str, PolizaSQL]:
+    """Obtener varias pólizas con una sola consulta IN, indexadas por ID"""
+    ids = list(set(poliza_ids))
+    if not ids:
+        return {}
     result = await db.execute(
-        select(PolizaSQL)
-        .options(selectinload(PolizaSQL.usuario), selectinload(PolizaSQL.seguro))
-        .where(PolizaSQL.id == poliza_id)
+        select(PolizaSQL).where(PolizaSQL.id.in_(ids))
     )
-    return result.scalar_one_or_none()
+    return {poliza.id: poliza for poliza in result.scalars().all()}
 
 
 async def obtener_polizas_usuario_sql(db: AsyncSession, usuario_id: str) -> List[PolizaSQL]:
-    """Obtener todas las pólizas de un usuario"""
+    """Obtener todas las pólizas de un usuario (el seguro se resuelve aparte con el catálogo)"""
     result = await db.execute(
         select(PolizaSQL)
-        .options(selectinload(PolizaSQL.seguro))
         .where(PolizaSQL.usuario_id == usuario_id)
         .order_by(PolizaSQL.fecha_inicio.desc())
     )
     return result.scalars().all()
 
 
-async def actualizar_cuotas_poliza_sql(db: AsyncSession, poliza_id: str) -> PolizaSQL:
-    """Incrementar el contador de cuotas pagadas"""
-    poliza = await obtener_poliza_sql(db, poliza_id)
-    if poliza:
-        poliza.cuotas_pagadas += 1
-        
-        # Si se completaron todas las cuotas, marcar como vencida
-        if poliza.cuotas_pagadas >= poliza.cuotas_totales:
-            poliza.estado = EstadoPoliza.VENCIDA
-        
+async def actualizar_cuotas_poliza_sql(db: AsyncSession, poliza: PolizaSQL) -> bool:
+    """
+    Avanzar el contador de cuotas pagadas con un UPDATE guardado
+
+    Equivale a `UPDATE polizas SET cuotas_pagadas = cuotas_pagadas + 1
+    WHERE id = :id AND cuotas_pagadas = :leidas`. Devuelve False si otro pago
+    o la facturación avanzó la póliza desde que se leyó. Dentro de una unidad
+    de trabajo la fila queda bloqueada hasta el commit.
+    """
+    leidas = poliza.cuotas_pagadas
+    # Si se completaron todas las cuotas, marcar como vencida
+    completada = leidas + 1 >= poliza.cuotas_totales
+    valores = {"cuotas_pagadas": PolizaSQL.cuotas_pagadas + 1}
+    if completada:
+        valores["estado"] = EstadoPoliza.VENCIDA
+    result = await db.execute(
+        update(PolizaSQL.__table__)
+        .where(PolizaSQL.id == poliza.id, PolizaSQL.cuotas_pagadas == leidas)
+        .values(**valores)
+    )
+    if result.rowcount != 1:
+        return False
+    
+    # Reflejar el UPDATE en el objeto sin marcarlo como modificado
+    set_committed_value(poliza, "cuotas_pagadas", leidas + 1)
+    if completada:
+        set_committed_value(poliza, "estado", EstadoPoliza.VENCIDA)
+        # Resumen de cuenta: la póliza completa deja de estar activa
+        await ajustar_resumen_sql(
+            db,
+            poliza.usuario_id,
+            polizas_activas=-1,
+            proximo_monto=-float(poliza.cuota_mensual)
+        )
+    
+    if not en_unidad_de_trabajo(db):
         await db.commit()
-        await db.refresh(poliza)
-    return poliza
+    return True
 
 
 # ============================================
@@ -230,8 +413,10 @@ async def crear_pago_sql(
         numero_cuota=numero_cuota
     )
     db.add(db_pago)
-    await db.commit()
-    await db.refresh(db_pago)
+    await _guardar(db, db_pago)
+    
+    # Resumen de cuenta: una cuota pagada menos pendiente
+    await ajustar_resumen_sql(db, usuario_id, total_pagado=monto, cuotas_pendientes=-1)
     
     # Auditoría
     await crear_auditoria_sql(
@@ -246,26 +431,304 @@ async def crear_pago_sql(
     return db_pago
 
 
-async def obtener_pagos_poliza_sql(db: AsyncSession, poliza_id: str) -> List[PagoSQL]:
-    """Obtener todos los pagos de una póliza"""
+# Las consultas de historial leen por defecto solo la ventana caliente
+# (HISTORIAL_MESES_CALIENTES): en MySQL tocan solo las particiones de esos
+# meses. `desde` pide una ventana más larga (los meses archivados ya no están).
+
+async def obtener_pagos_poliza_sql(db: AsyncSession, poliza_id: str, desde: Optional[datetime] = None) -> List[PagoSQL]:
+    """Obtener los pagos de una póliza desde `desde` (por defecto, la ventana caliente)"""
     result = await db.execute(
         select(PagoSQL)
-        .where(PagoSQL.poliza_id == poliza_id)
+        .where(PagoSQL.poliza_id == poliza_id, PagoSQL.fecha_pago >= (desde or inicio_ventana_caliente()))
         .order_by(PagoSQL.fecha_pago.desc())
     )
     return result.scalars().all()
 
 
-async def obtener_pagos_usuario_sql(db: AsyncSession, usuario_id: str) -> List[PagoSQL]:
-    """Obtener todos los pagos de un usuario"""
+async def obtener_pagos_poliza_filas_sql(db: AsyncSession, poliza_id: str, desde: Optional[datetime] = None) -> List[Mapping]:
+    """Historial de pagos de una póliza como filas (mappings), con los nombres de la respuesta"""
+    result = await db.execute(
+        select(
+            PagoSQL.id.label("pago_id"),
+            PagoSQL.monto,
+            PagoSQL.fecha_pago,
+            PagoSQL.numero_cuota,
+            PagoSQL.metodo_pago,
+            PagoSQL.estado
+        )
+        .where(PagoSQL.poliza_id == poliza_id, PagoSQL.fecha_pago >= (desde or inicio_ventana_caliente()))
+        .order_by(PagoSQL.fecha_pago.desc())
+    )
+    return result.mappings().all()
+
+
+async def obtener_pagos_polizas_sql(
+    db: AsyncSession,
+    poliza_ids: Iterable[str],
+    desde: Optional[datetime] = None
+) -> Dict[str, List[PagoSQL]]:
+    """Obtener los pagos de varias pólizas con una sola consulta IN, agrupados por póliza"""
+    ids = list(set(poliza_ids))
+    if not ids:
+        return {}
     result = await db.execute(
         select(PagoSQL)
-        .where(PagoSQL.usuario_id == usuario_id)
+        .where(PagoSQL.poliza_id.in_(ids), PagoSQL.fecha_pago >= (desde or inicio_ventana_caliente()))
+        .order_by(PagoSQL.poliza_id, PagoSQL.fecha_pago.desc())
+    )
+    pagos: Dict[str, List[PagoSQL]] = {}
+    for pago in result.scalars().all():
+        pagos.setdefault(pago.poliza_id, []).append(pago)
+    return pagos
+
+
+async def obtener_pagos_usuario_sql(db: AsyncSession, usuario_id: str, desde: Optional[datetime] = None) -> List[PagoSQL]:
+    """Obtener los pagos de un usuario desde `desde` (por defecto, la ventana caliente)"""
+    result = await db.execute(
+        select(PagoSQL)
+        .where(PagoSQL.usuario_id == usuario_id, PagoSQL.fecha_pago >= (desde or inicio_ventana_caliente()))
         .order_by(PagoSQL.fecha_pago.desc())
     )
     return result.scalars().all()
 
 
+# ============================================
+# CRUD: Resumen de cuenta
+# ============================================
+
+_resumenes = ResumenCuentaSQL.__table__
+
+# Ajuste incremental de los totales de un usuario
+_ajustar_resumen = (
+    update(_resumenes)
+    .where(_resumenes.c.usuario_id == bindparam("b_usuario_id"))
+    .values(
+        polizas_activas=_resumenes.c.polizas_activas + bindparam("b_polizas_activas"),
+        total_pagado=_resumenes.c.total_pagado + bindparam("b_total_pagado"),
+        cuotas_pendientes=_resumenes.c.cuotas_pendientes + bindparam("b_cuotas_pendientes"),
+        proximo_monto=_resumenes.c.proximo_monto + bindparam("b_proximo_monto"),
+        actualizado=bindparam("b_actualizado")
+    )
+)
+
+_CAMPOS_RESUMEN = ("polizas_activas", "total_pagado", "cuotas_pendientes", "proximo_monto")
+
+
+def _insertar_resumen(dialecto: str, reemplazar: bool = False):
+    """
+    INSERT del resumen reconstruido de un usuario (executemany)
+
+    Si la fila ya existe no falla por la clave primaria: con `reemplazar`
+    la pisa con los valores dados; si no, le suma el ajuste de esta
+    transacción (`b_ajuste_*`, 0 si no hay) porque otra la creó mientras tanto.
+    """
+    valores = {campo: bindparam(f"b_{campo}") for campo in ("usuario_id", *_CAMPOS_RESUMEN, "actualizado")}
+    if reemplazar:
+        cambios = {campo: bindparam(f"b_{campo}") for campo in _CAMPOS_RESUMEN}
+    else:
+        cambios = {campo: _resumenes.c[campo] + bindparam(f"b_ajuste_{campo}") for campo in _CAMPOS_RESUMEN}
+    cambios["actualizado"] = bindparam("b_actualizado")
+    if dialecto == "mysql":
+        return insert_mysql(_resumenes).values(valores).on_duplicate_key_update(cambios)
+    return insert_sqlite(_resumenes).values(valores).on_conflict_do_update(
+        index_elements=[_resumenes.c.usuario_id], set_=cambios
+    )
+
+
+async def ajustar_resumenes_sql(db: AsyncSession, ajustes: List[dict]):
+    """
+    Aplicar ajustes incrementales a los resúmenes de varios usuarios (executemany)
+
+    Cada ajuste es un dict con `usuario_id` y los deltas `polizas_activas`,
+    `total_pagado`, `cuotas_pendientes` y `proximo_monto`. Los usuarios que
+    aún no tienen resumen se reconstruyen desde su historial, que ya incluye
+    los cambios de esta transacción.
+    """
+    if not ajustes:
+        return
+    ahora = datetime.now()
+    result = await db.execute(_ajustar_resumen, [
+        {
+            "b_usuario_id": ajuste["usuario_id"],
+            "b_polizas_activas": ajuste.get("polizas_activas", 0),
+            "b_total_pagado": Decimal(str(ajuste.get("total_pagado", 0))),
+            "b_cuotas_pendientes": ajuste.get("cuotas_pendientes", 0),
+            "b_proximo_monto": Decimal(str(ajuste.get("proximo_monto", 0))),
+            "b_actualizado": ahora
+        }
+        for ajuste in ajustes
+    ])
+    if result.rowcount != len(ajustes):
+        ids = {ajuste["usuario_id"] for ajuste in ajustes}
+        existentes = await db.execute(
+            select(_resumenes.c.usuario_id).where(_resumenes.c.usuario_id.in_(ids))
+        )
+        faltantes = ids - set(existentes.scalars().all())
+        if faltantes:
+            pendientes = {usuario_id: dict.fromkeys(_CAMPOS_RESUMEN, 0) for usuario_id in faltantes}
+            for ajuste in ajustes:
+                if ajuste["usuario_id"] in pendientes:
+                    for campo in _CAMPOS_RESUMEN:
+                        pendientes[ajuste["usuario_id"]][campo] += ajuste.get(campo, 0)
+            await insertar_resumenes_sql(db, await calcular_resumenes_sql(db, faltantes), pendientes)
+    
+    if not en_unidad_de_trabajo(db):
+        await db.commit()
+
+
+async def ajustar_resumen_sql(
+    db: AsyncSession,
+    usuario_id: str,
+    polizas_activas: int = 0,
+    total_pagado: float = 0,
+    cuotas_pendientes: int = 0,
+    proximo_monto: float = 0
+):
+    """Aplicar un ajuste incremental al resumen de un usuario"""
+    await ajustar_resumenes_sql(db, [{
+        "usuario_id": usuario_id,
+        "polizas_activas": polizas_activas,
+        "total_pagado": total_pagado,
+        "cuotas_pendientes": cuotas_pendientes,
+        "proximo_monto": proximo_monto
+    }])
+
+
+async def calcular_resumenes_sql(db: AsyncSession, usuario_ids: Iterable[str]) -> Dict[str, dict]:
+    """Calcular los totales de varios usuarios recorriendo sus pólizas y pagos"""
+    ids = list(set(usuario_ids))
+    resumenes = {
+        usuario_id: {
+            "polizas_activas": 0,
+            "total_pagado": Decimal("0"),
+            "cuotas_pendientes": 0,
+            "proximo_monto": Decimal("0")
+        }
+        for usuario_id in ids
+    }
+    if not ids:
+        return resumenes
+    
+    activa = PolizaSQL.estado == EstadoPoliza.ACTIVA
+    polizas = await db.execute(
+        select(
+            PolizaSQL.usuario_id,
+            func.sum(case((activa, 1), else_=0)),
+            func.sum(PolizaSQL.monto_total),
+            func.sum(case((activa, PolizaSQL.cuotas_totales - PolizaSQL.cuotas_pagadas), else_=0)),
+            func.sum(case((activa, PolizaSQL.cuota_mensual), else_=0))
+        )
+        .where(PolizaSQL.usuario_id.in_(ids))
+        .group_by(PolizaSQL.usuario_id)
+    )
+    for usuario_id, activas, pagado_inicial, pendientes, proximo in polizas.all():
+        resumen = resumenes[usuario_id]
+        resumen["polizas_activas"] = int(activas or 0)
+        resumen["total_pagado"] += Decimal(str(pagado_inicial or 0))
+        resumen["cuotas_pendientes"] = int(pendientes or 0)
+        resumen["proximo_monto"] = Decimal(str(proximo or 0))
+    
+    # Meses archivados (ver `app.particiones`): sus pagos ya no están en `pagos`,
+    # quedan sus totales; los pagos anteriores al corte no se vuelven a sumar
+    archivados = await db.execute(
+        select(PagoArchivadoSQL.usuario_id, func.sum(PagoArchivadoSQL.total))
+        .where(PagoArchivadoSQL.usuario_id.in_(ids))
+        .group_by(PagoArchivadoSQL.usuario_id)
+    )
+    for usuario_id, total in archivados.all():
+        resumenes[usuario_id]["total_pagado"] += Decimal(str(total or 0))
+    corte = (await db.execute(select(func.max(PagoArchivadoSQL.hasta)))).scalar()
+    
+    criterios = [PagoSQL.usuario_id.in_(ids), PagoSQL.estado == EstadoPago.COMPLETADO]
+    if corte is not None:
+        criterios.append(PagoSQL.fecha_pago >= corte)
+    pagos = await db.execute(
+        select(PagoSQL.usuario_id, func.sum(PagoSQL.monto))
+        .where(*criterios)
+        .group_by(PagoSQL.usuario_id)
+    )
+    for usuario_id, total in pagos.all():
+        resumenes[usuario_id]["total_pagado"] += Decimal(str(total or 0))
+    
+    return resumenes
+
+
+async def bloquear_resumenes_sql(db: AsyncSession, usuario_ids: Iterable[str]):
+    """
+    Bloquear (FOR UPDATE) los usuarios y resúmenes de un bloque antes de recalcularlo
+
+    Compras, pagos y facturación actualizan el saldo del usuario antes de
+    ajustar su resumen, así que con estos bloqueos ninguna de ellas confirma
+    entre el cálculo y el guardado. Con SQLite no hace falta: el turno de
+    escritura ya serializa. Mismo orden que esas transacciones (usuarios y
+    luego resúmenes, por ID) para no provocar deadlocks.
+    """
+    ids = sorted(set(usuario_ids))
+    if not ids:
+        return
+    await db.execute(
+        select(UsuarioSQL.id).where(UsuarioSQL.id.in_(ids)).order_by(UsuarioSQL.id).with_for_update()
+    )
+    await db.execute(
+        select(_resumenes.c.usuario_id)
+        .where(_resumenes.c.usuario_id.in_(ids))
+        .order_by(_resumenes.c.usuario_id)
+        .with_for_update()
+    )
+
+
+async def guardar_resumenes_sql(db: AsyncSession, resumenes: Dict[str, dict]):
+    """
+    Reemplazar los resúmenes de varios usuarios por los valores dados (upsert)
+
+    Llamar con las filas ya bloqueadas (`bloquear_resumenes_sql`) y los
+    totales calculados después del bloqueo.
+    """
+    if not resumenes:
+        return
+    ahora = datetime.now()
+    await db.execute(_insertar_resumen(db.bind.dialect.name, reemplazar=True), [
+        {"b_usuario_id": usuario_id, "b_actualizado": ahora, **{f"b_{campo}": datos[campo] for campo in _CAMPOS_RESUMEN}}
+        for usuario_id, datos in resumenes.items()
+    ])
+
+
+async def insertar_resumenes_sql(
+    db: AsyncSession,
+    resumenes: Dict[str, dict],
+    ajustes: Optional[Dict[str, dict]] = None
+):
+    """
+    Guardar los resúmenes reconstruidos de usuarios que no tenían
+
+    Dos transacciones pueden reconstruir a la vez el mismo resumen (primera
+    lectura o primer ajuste del usuario): la segunda no falla, le suma su
+    ajuste (`ajustes[usuario_id]`) a la fila que guardó la primera.
+    """
+    if not resumenes:
+        return
+    ajustes = ajustes or {}
+    ahora = datetime.now()
+    filas = []
+    for usuario_id, datos in resumenes.items():
+        ajuste = ajustes.get(usuario_id, {})
+        fila = {"b_usuario_id": usuario_id, "b_actualizado": ahora}
+        for campo in _CAMPOS_RESUMEN:
+            fila[f"b_{campo}"] = datos[campo]
+            valor = ajuste.get(campo, 0)
+            fila[f"b_ajuste_{campo}"] = Decimal(str(valor)) if campo in ("total_pagado", "proximo_monto") else valor
+        filas.append(fila)
+    await db.execute(_insertar_resumen(db.bind.dialect.name), filas)
+
+
+async def obtener_resumen_sql(db: AsyncSession, usuario_id: str) -> Optional[ResumenCuentaSQL]:
+    """Obtener el resumen de cuenta de un usuario (lectura O(1) por clave primaria)"""
+    result = await db.execute(
+        select(ResumenCuentaSQL).where(ResumenCuentaSQL.usuario_id == usuario_id)
+    )
+    return result.scalar_one_or_none()
+
+
 # ============================================
 # CRUD: Auditoría
 # ============================================
@@ -280,8 +743,14 @@ async def crear_auditoria_sql(
     datos_nuevos: dict = None,
     ip_address: str = None
 ) -> AuditoriaSQL:
-    """Crear un registro de auditoría"""
-    db_auditoria = AuditoriaSQL(
+    """
+    Crear un registro de auditoría
+
+    Con el escritor asíncrono activo la fila queda pendiente en la sesión y se
+    inserta en lote después del commit (ver `app.auditoria_async`). En modo
+    estricto se escribe en la misma transacción que el cambio auditado.
+    """
+    datos = dict(
         usuario_id=usuario_id,
         accion=accion,
         tabla_afectada=tabla,
@@ -290,27 +759,50 @@ async def crear_auditoria_sql(
         datos_nuevos=datos_nuevos,
         ip_address=ip_address
     )
-    db.add(db_auditoria)
-    await db.commit()
+    
+    if auditoria_async.usar_escritor():
+        if not db.in_transaction():
+            await auditoria_async.escritor.esperar_lugar()
+        auditoria_async.escritor.reservar()
+        datos["timestamp"] = datetime.now()
+        db.info.setdefault(auditoria_async.PENDIENTES, []).append(datos)
+        db_auditoria = AuditoriaSQL(**datos)
+    else:
+        db_auditoria = AuditoriaSQL(**datos)
+        db.add(db_auditoria)
+    
+    # En una unidad de trabajo la fila se envía junto con el commit final
+    if not en_unidad_de_trabajo(db):
+        await db.commit()
     return db_auditoria
 
 
-async def obtener_auditoria_usuario_sql(db: AsyncSession, usuario_id: str, limit: int = 50) -> List[AuditoriaSQL]:
+async def obtener_auditoria_usuario_sql(
+    db: AsyncSession,
+    usuario_id: str,
+    limit: int = 50,
+    desde: Optional[datetime] = None
+) -> List[AuditoriaSQL]:
     """Obtener historial de auditoría de un usuario"""
     result = await db.execute(
         select(AuditoriaSQL)
-        .where(AuditoriaSQL.usuario_id == usuario_id)
+        .where(AuditoriaSQL.usuario_id == usuario_id, AuditoriaSQL.timestamp >= (desde or inicio_ventana_caliente()))
         .order_by(AuditoriaSQL.timestamp.desc())
         .limit(limit)
     )
     return result.scalars().all()
 
 
-async def obtener_auditoria_tabla_sql(db: AsyncSession, tabla: str, limit: int = 100) -> List[AuditoriaSQL]:
+async def obtener_auditoria_tabla_sql(
+    db: AsyncSession,
+    tabla: str,
+    limit: int = 100,
+    desde: Optional[datetime] = None
+) -> List[AuditoriaSQL]:
     """Obtener auditoría por tabla"""
     result = await db.execute(
         select(AuditoriaSQL)
-        .where(AuditoriaSQL.tabla_afectada == tabla)
+        .where(AuditoriaSQL.tabla_afectada == tabla, AuditoriaSQL.timestamp >= (desde or inicio_ventana_caliente()))
         .order_by(AuditoriaSQL.timestamp.desc())
         .limit(limit)
     )
@@ -1,10 +1,15 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from typing import Optional
+from app.metricas import METRICAS_HABILITADAS, monitor_mongo
+from app.consultas import contador_mongo
+from app.database_sql import BACKEND_ALMACENAMIENTO
+from app.documentos_sqlite import ClienteDocumentos
 import os
 
 # Constantes de configuración
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017/")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "seguros_db")
+MONGO_POOL_MIN = int(os.getenv("MONGO_POOL_MIN", "2"))
 
 class Database:
     client: Optional[AsyncIOMotorClient] = None
@@ -15,8 +20,26 @@ async def get_db() -> AsyncIOMotorClient:
     return db.client[DATABASE_NAME]
 
 async def connect_to_mongo():
-    db.client = AsyncIOMotorClient(MONGODB_URL)
+    # Sin servidor de MongoDB: el catálogo vive en el mismo archivo SQLite
+    if BACKEND_ALMACENAMIENTO == "sqlite":
+        cliente = ClienteDocumentos()
+        await cliente.inicializar()
+        db.client = cliente
+        return
     
+    # Latencia por colección para /metrics (pymongo command monitoring)
+    # y conteo de comandos por petición (N+1)
+    listeners = [monitor_mongo, contador_mongo] if METRICAS_HABILITADAS else [contador_mongo]
+    # minPoolSize: pymongo abre y mantiene esas conexiones en segundo plano
+    db.client = AsyncIOMotorClient(MONGODB_URL, event_listeners=listeners, minPoolSize=MONGO_POOL_MIN)
+
+async def ping_mongo():
+    """Comprobar que MongoDB responde (con el backend SQLite, la tabla de documentos)"""
+    if isinstance(db.client, ClienteDocumentos):
+        await db.client.ping()
+    else:
+        await db.client.admin.command("ping")
+
 async def close_mongo_connection():
     if db.client is not None:
         db.client.close()
\ No newline at end of file
@@ -1,10 +1,42 @@
 """
 Configuración de la conexión a MySQL usando SQLAlchemy (async)
+
+Soporta una réplica de solo lectura opcional: las rutas GET que la usan
+(`get_db_sql_read`) tienen su propio engine y pool, separados de las
+escrituras en el primario.
+
+Con BACKEND_ALMACENAMIENTO=sqlite todo (tablas y catálogo) vive en un archivo
+SQLite en modo WAL, sin servidores de base de datos. SQLite admite un solo
+escritor a la vez, así que las sesiones que escriben pasan por una cola
+(`sesion_escritura`) en lugar de chocar con `database is locked`. Las sesiones
+de las peticiones (`get_db_sql`) toman ese turno recién cuando van a escribir
+y lo sueltan al terminar la transacción: las lecturas siguen siendo
+concurrentes (WAL).
 """
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from fastapi import Request, Response
+from sqlalchemy import event, text
+from sqlalchemy.sql.elements import TextClause
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.orm import declarative_base
-from typing import AsyncGenerator
+from sqlalchemy.orm import Session, declarative_base
+from app.metricas import METRICAS_HABILITADAS, PoolMedido, instrumentar_engine
+from app import consultas
+from typing import AsyncGenerator, AsyncIterator, Optional
+import asyncio
 import os
+import time
+
+# Almacenamiento: "mysql" (MySQL + MongoDB) o "sqlite" (un solo archivo local)
+BACKEND_ALMACENAMIENTO = os.getenv("BACKEND_ALMACENAMIENTO", "mysql")
+
+# SQLite (BACKEND_ALMACENAMIENTO=sqlite). `seguros.db` tiene un esquema anterior, por eso otro archivo
+SQLITE_PATH = os.getenv("SQLITE_PATH", "seguros_local.db")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # NORMAL es seguro con WAL
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "64"))
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "256"))
 
 # Configuración de la base de datos MySQL (desde variables de entorno o defaults locales)
 MYSQL_USER = os.getenv("MYSQL_USER", "root")
@@ -13,32 +45,238 @@ MYSQL_HOST = os.getenv("MYSQL_HOST", "localhost")
 MYSQL_PORT = int(os.getenv("MYSQL_PORT", "3306"))
 MYSQL_DATABASE = os.getenv("MYSQL_DATABASE", "seguros_db_sql")
 
-# URL de conexión async para MySQL
-SQLALCHEMY_DATABASE_URL = f"mysql+aiomysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}"
+# Réplica de lectura (opcional): mismo usuario y base, otro host/puerto
+MYSQL_READ_HOST = os.getenv("MYSQL_READ_HOST")
+MYSQL_READ_PORT = int(os.getenv("MYSQL_READ_PORT", str(MYSQL_PORT)))
+
+# Tamaño de los pools (primario y réplica)
+SQL_POOL_SIZE = int(os.getenv("SQL_POOL_SIZE", "10"))
+SQL_MAX_OVERFLOW = int(os.getenv("SQL_MAX_OVERFLOW", "20"))
+SQL_READ_POOL_SIZE = int(os.getenv("SQL_READ_POOL_SIZE", str(SQL_POOL_SIZE)))
+SQL_READ_MAX_OVERFLOW = int(os.getenv("SQL_READ_MAX_OVERFLOW", str(SQL_MAX_OVERFLOW)))
+# Conexiones que se abren al arrancar en cada pool (así las primeras peticiones no las pagan)
+SQL_POOL_MIN = int(os.getenv("SQL_POOL_MIN", "2"))
+# Pool propio del escritor de auditoría (no compite con las peticiones por conexiones)
+SQL_AUDITORIA_POOL_SIZE = int(os.getenv("SQL_AUDITORIA_POOL_SIZE", "2"))
+
+# Mostrar SQL queries en consola (útil para desarrollo; SQL_ECHO=0 para medir rendimiento)
+SQL_ECHO = os.getenv("SQL_ECHO", "1") != "0"
+
+# Segundos que un cliente lee del primario después de escribir (read-your-writes)
+READ_YOUR_WRITES_SEGUNDOS = float(os.getenv("READ_YOUR_WRITES_SEGUNDOS", "5"))
+COOKIE_ULTIMA_ESCRITURA = "leer_primario_hasta"
+HEADER_LEER_PRIMARIO = "X-Leer-Primario"
+
+# URL de conexión async para MySQL. SQL_DATABASE_URL / SQL_READ_DATABASE_URL permiten
+# usar cualquier URL completa, p. ej. dos archivos SQLite para probar la réplica en local
+SQLALCHEMY_DATABASE_URL = os.getenv("SQL_DATABASE_URL") or (
+    f"sqlite+aiosqlite:///{SQLITE_PATH}" if BACKEND_ALMACENAMIENTO == "sqlite" else None
+) or f"mysql+aiomysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}"
+SQLALCHEMY_READ_DATABASE_URL = os.getenv("SQL_READ_DATABASE_URL") or (
+    f"mysql+aiomysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_READ_HOST}:{MYSQL_READ_PORT}/{MYSQL_DATABASE}"
+    if MYSQL_READ_HOST else None
+)
+
+
+def _configurar_sqlite(dbapi_connection, connection_record):
+    """Pragmas de cada conexión SQLite: WAL, espera ante bloqueo, caché y mmap"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_MB * 1024}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
 
-# Crear el engine async
-engine = create_async_engine(
-    SQLALCHEMY_DATABASE_URL,
-    echo=True,  # Mostrar SQL queries en consola (útil para desarrollo)
-    pool_pre_ping=True,  # Verificar conexión antes de usar
-    pool_size=10,  # Número de conexiones en el pool
-    max_overflow=20  # Conexiones adicionales permitidas
+
+def _crear_engine(url: str, pool_size: int, max_overflow: int, nombre: str):
+    """Crear un engine async con su propio pool de conexiones"""
+    opciones = {"poolclass": PoolMedido} if METRICAS_HABILITADAS else {}
+    nuevo = create_async_engine(
+        url,
+        echo=SQL_ECHO,  # Mostrar SQL queries en consola (útil para desarrollo)
+        pool_pre_ping=True,  # Verificar conexión antes de usar
+        pool_size=pool_size,  # Número de conexiones en el pool
+        max_overflow=max_overflow,  # Conexiones adicionales permitidas
+        **opciones
+    )
+    if nuevo.dialect.name == "sqlite":
+        event.listen(nuevo.sync_engine, "connect", _configurar_sqlite)
+    if METRICAS_HABILITADAS:
+        instrumentar_engine(nuevo, nombre)
+    consultas.instrumentar_engine(nuevo)
+    return nuevo
+
+
+def _crear_sessionmaker(engine_destino, clase=AsyncSession):
+    return async_sessionmaker(
+        engine_destino,
+        class_=clase,
+        expire_on_commit=False,
+        autocommit=False,
+        autoflush=False
+    )
+
+
+# Crear el engine async (primario: todas las escrituras)
+engine = _crear_engine(SQLALCHEMY_DATABASE_URL, SQL_POOL_SIZE, SQL_MAX_OVERFLOW, "primario")
+
+# Engine de la réplica de lectura; sin réplica configurada se usa el primario
+engine_lectura = (
+    _crear_engine(SQLALCHEMY_READ_DATABASE_URL, SQL_READ_POOL_SIZE, SQL_READ_MAX_OVERFLOW, "lectura")
+    if SQLALCHEMY_READ_DATABASE_URL else engine
 )
 
 # Crear sessionmaker async
-AsyncSessionLocal = async_sessionmaker(
-    engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
-    autocommit=False,
-    autoflush=False
+AsyncSessionLocal = _crear_sessionmaker(engine)
+AsyncSessionLectura = _crear_sessionmaker(engine_lectura) if engine_lectura is not engine else AsyncSessionLocal
+
+# Engine del escritor de auditoría (primario, pool aparte); con SQLite el mismo engine,
+# ahí las auditorías van en la transacción de la petición
+engine_auditoria = (
+    engine if engine.dialect.name == "sqlite"
+    else _crear_engine(SQLALCHEMY_DATABASE_URL, SQL_AUDITORIA_POOL_SIZE, 0, "auditoria")
 )
+AsyncSessionAuditoria = _crear_sessionmaker(engine_auditoria) if engine_auditoria is not engine else AsyncSessionLocal
 
 # Base para los modelos SQLAlchemy
 Base = declarative_base()
 
+# Cola de escritores de SQLite (asyncio.Lock atiende en orden de llegada)
+ES_SQLITE = engine.dialect.name == "sqlite"
+_cola_escritura = asyncio.Lock()
+_escribiendo: ContextVar[bool] = ContextVar("escribiendo_sqlite", default=False)
+
+
+@asynccontextmanager
+async def turno_escritura() -> AsyncIterator[None]:
+    """Esperar el turno de escritura en SQLite (no hace nada con MySQL; reentrante en la misma tarea)"""
+    if not ES_SQLITE or _escribiendo.get():
+        yield
+        return
+    async with _cola_escritura:
+        token = _escribiendo.set(True)
+        try:
+            yield
+        finally:
+            _escribiendo.reset(token)
 
-async def get_db_sql() -> AsyncGenerator[AsyncSession, None]:
+
+@asynccontextmanager
+async def sesion_escritura() -> AsyncIterator[AsyncSession]:
+    """Sesión del primario para escribir; en SQLite espera su turno en la cola de escritores"""
+    async with turno_escritura():
+        async with AsyncSessionLocal() as session:
+            yield session
+
+
+class SesionTurnoPerezoso(AsyncSession):
+    """
+    Sesión que toma el turno de escritura de SQLite recién antes de escribir
+
+    El driver de SQLite abre la transacción con el primer INSERT/UPDATE/DELETE
+    (los SELECT previos no la abren), así que tomar el turno ahí alcanza; se
+    suelta con el commit, el rollback o al cerrar. Con MySQL no hace nada.
+    """
+
+    _token = None
+
+    async def _tomar_turno(self):
+        if not ES_SQLITE or self._token is not None or _escribiendo.get():
+            return
+        await _cola_escritura.acquire()
+        self._token = _escribiendo.set(True)
+
+    def _soltar_turno(self):
+        if self._token is None:
+            return
+        _escribiendo.reset(self._token)
+        self._token = None
+        _cola_escritura.release()
+
+    def _hay_cambios(self) -> bool:
+        return bool(self.new or self.dirty or self.deleted)
+
+    @staticmethod
+    def _escribe(statement) -> bool:
+        # SQL textual: no se sabe si escribe, se trata como escritura
+        return getattr(statement, "is_dml", False) or isinstance(statement, TextClause)
+
+    async def execute(self, statement, *args, **kwargs):
+        if self._escribe(statement):
+            await self._tomar_turno()
+        return await super().execute(statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        if self._escribe(statement):
+            await self._tomar_turno()
+        return await super().scalar(statement, *args, **kwargs)
+
+    async def flush(self, objects=None):
+        if self._hay_cambios():
+            await self._tomar_turno()
+        await super().flush(objects)
+
+    async def commit(self):
+        if self._hay_cambios():
+            await self._tomar_turno()
+        try:
+            await super().commit()
+        finally:
+            self._soltar_turno()
+
+    async def rollback(self):
+        try:
+            await super().rollback()
+        finally:
+            self._soltar_turno()
+
+    async def close(self):
+        try:
+            await super().close()
+        finally:
+            self._soltar_turno()
+
+
+# Sesiones de las peticiones (ver `get_db_sql`)
+AsyncSessionPeticion = _crear_sessionmaker(engine, SesionTurnoPerezoso)
+
+
+# Claves en `session.info`: la transacción en curso modificó filas / alguna ya confirmó cambios
+_MODIFICO_FILAS = "modifico_filas"
+_ESCRITURA_CONFIRMADA = "escritura_confirmada"
+
+
+@event.listens_for(Session, "after_flush")
+def _flush_con_cambios(session, flush_context):
+    session.info[_MODIFICO_FILAS] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _ejecucion_dml(estado):
+    if estado.is_insert or estado.is_update or estado.is_delete:
+        estado.session.info[_MODIFICO_FILAS] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _cambios_confirmados(session):
+    if session.info.pop(_MODIFICO_FILAS, False):
+        session.info[_ESCRITURA_CONFIRMADA] = True
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _cambios_deshechos(session, previous_transaction):
+    session.info.pop(_MODIFICO_FILAS, None)
+
+
+def escritura_confirmada(request: Request) -> bool:
+    """Indica si la sesión de escritura de la petición confirmó algún cambio en el primario"""
+    session = getattr(request.state, "sesion_escritura", None)
+    return session is not None and session.info.get(_ESCRITURA_CONFIRMADA, False)
+
+
+async def get_db_sql(request: Request) -> AsyncGenerator[AsyncSession, None]:
     """
     Dependencia para obtener una sesión de base de datos SQL
     
@@ -47,7 +285,10 @@ async def get_db_sql() -> AsyncGenerator[AsyncSession, None]:
         async def endpoint(db: AsyncSession = Depends(get_db_sql)):
             # usar db aquí
     """
-    async with AsyncSessionLocal() as session:
+    # En SQLite el turno de escritura se toma recién al escribir (ver `SesionTurnoPerezoso`)
+    async with AsyncSessionPeticion() as session:
+        # Para read-your-writes: solo cuenta como escritura si confirma cambios
+        request.state.sesion_escritura = session
         try:
             yield session
             await session.commit()
@@ -58,23 +299,87 @@ async def get_db_sql() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+def requiere_primario(request: Request) -> bool:
+    """Indica si la petición debe leer del primario (escribió hace poco o lo pidió)"""
+    if request.headers.get(HEADER_LEER_PRIMARIO) == "1":
+        return True
+    try:
+        return float(request.cookies.get(COOKIE_ULTIMA_ESCRITURA, "0")) > time.time()
+    except ValueError:
+        return False
+
+
+def marcar_escritura(response: Response):
+    """Hacer que el cliente lea del primario durante la ventana de read-your-writes"""
+    if engine_lectura is engine:
+        return
+    response.set_cookie(
+        COOKIE_ULTIMA_ESCRITURA,
+        str(time.time() + READ_YOUR_WRITES_SEGUNDOS),
+        max_age=int(READ_YOUR_WRITES_SEGUNDOS) + 1,
+        httponly=True,
+        samesite="lax"
+    )
+
+
+def fabrica_lectura(request: Request):
+    """Sessionmaker de lectura para esta petición (réplica, o primario si aplica read-your-writes)"""
+    return AsyncSessionLocal if requiere_primario(request) else AsyncSessionLectura
+
+
+async def get_db_sql_read(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependencia para obtener una sesión de solo lectura (réplica)
+    
+    Usa la réplica y su pool salvo que el cliente haya escrito hace menos de
+    READ_YOUR_WRITES_SEGUNDOS o envíe `X-Leer-Primario: 1`; en ese caso lee
+    del primario para ver sus propios cambios.
+    """
+    async with fabrica_lectura(request)() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
 async def init_db_sql():
     """
     Inicializar la base de datos SQL
-    Crear todas las tablas definidas en los modelos
+    Aplicar las migraciones pendientes (con una base vacía, crea el esquema completo)
     """
-    async with engine.begin() as conn:
-        # Crear todas las tablas
-        await conn.run_sync(Base.metadata.create_all)
+    from app import migraciones  # importa los modelos, que a su vez importan este módulo
+    await migraciones.migrar()
     
     print("✅ Base de datos MySQL inicializada correctamente")
 
 
+async def calentar_pools(minimo: int = SQL_POOL_MIN):
+    """Abrir `minimo` conexiones en cada pool (sin pasar de pool_size, que es lo que el pool conserva)"""
+    async def abrir(engine_destino, cantidad: int):
+        conexiones = await asyncio.gather(*(engine_destino.connect() for _ in range(cantidad)))
+        for conexion in conexiones:
+            await conexion.close()  # vuelve al pool, abierta
+
+    # Solo los pools con cola conservan conexiones (no NullPool/StaticPool)
+    engines = [e for e in {engine, engine_lectura} if isinstance(e.pool, QueuePool)]
+    await asyncio.gather(*(abrir(e, min(minimo, e.pool.size())) for e in engines if minimo > 0))
+
+
+async def ping_sql(engine_destino=None):
+    """SELECT 1 contra el engine (por defecto el primario); lanza la excepción si no responde"""
+    async with (engine_destino or engine).connect() as conexion:
+        await conexion.execute(text("SELECT 1"))
+
+
 async def close_db_sql():
     """
     Cerrar la conexión a la base de datos SQL
     """
     await engine.dispose()
+    if engine_lectura is not engine:
+        await engine_lectura.dispose()
+    if engine_auditoria is not engine:
+        await engine_auditoria.dispose()
     print("✅ Conexión a MySQL cerrada")
 
 
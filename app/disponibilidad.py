@@ -0,0 +1,136 @@
+"""
+Arranque en paralelo de los backends y sonda de disponibilidad (`/ready`)
+
+Cada backend (MongoDB y SQL) tiene un paso de inicialización. Los pasos
+corren a la vez en el startup. Si uno falla o tarda más de
+ARRANQUE_TIMEOUT_SEGUNDOS, la app igual arranca y ese paso se reintenta en
+segundo plano cada ARRANQUE_REINTENTO_SEGUNDOS.
+
+Un backend puede tener además un paso de migración, que corre antes que el
+de inicialización y sin ese tope: cancelar del lado del cliente un DDL largo
+(un índice nuevo) no lo detiene en el servidor, que sigue con el lock de
+migraciones tomado y haría esperar al reintento.
+
+`/ready` responde 200 solo cuando todos los backends terminaron de
+inicializarse y responden a un ping en menos de READY_TIMEOUT_SEGUNDOS. Si
+no, responde 503 con el detalle por backend, así el balanceador no manda
+tráfico a una instancia que no puede atenderlo.
+"""
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import os
+import time
+
+# Configuración (desde variables de entorno)
+READY_TIMEOUT_SEGUNDOS = float(os.getenv("READY_TIMEOUT_SEGUNDOS", "2"))
+ARRANQUE_REINTENTO_SEGUNDOS = float(os.getenv("ARRANQUE_REINTENTO_SEGUNDOS", "5"))
+# Tope por intento de inicialización: un backend caído no retrasa el arranque de la app
+ARRANQUE_TIMEOUT_SEGUNDOS = float(os.getenv("ARRANQUE_TIMEOUT_SEGUNDOS", "10"))
+
+
+class Backend:
+    """Paso de inicialización de un backend y los pings que lo verifican"""
+
+    def __init__(
+        self,
+        nombre: str,
+        iniciar: Callable[[], Awaitable],
+        pings: Dict[str, Callable[[], Awaitable]],
+        migrar: Optional[Callable[[], Awaitable]] = None
+    ):
+        self.nombre = nombre
+        self.iniciar = iniciar
+        self.pings = pings
+        self.migrar = migrar
+        self.migrado = migrar is None
+        self.inicializado = False
+        self.error: Optional[str] = None
+        self._reintento: Optional[asyncio.Task] = None
+
+    async def arrancar(self) -> bool:
+        inicio = time.perf_counter()
+        try:
+            # Sin tope de tiempo: se reintenta solo si falla
+            if not self.migrado:
+                await self.migrar()
+                self.migrado = True
+            await asyncio.wait_for(self.iniciar(), ARRANQUE_TIMEOUT_SEGUNDOS)
+        except asyncio.TimeoutError:
+            self.error = f"sin terminar en {ARRANQUE_TIMEOUT_SEGUNDOS:g}s"
+            return False
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            return False
+        self.inicializado = True
+        self.error = None
+        print(f"✅ {self.nombre} listo en {(time.perf_counter() - inicio) * 1000:.0f} ms")
+        return True
+
+    async def _reintentar(self):
+        while not await self.arrancar():
+            await asyncio.sleep(ARRANQUE_REINTENTO_SEGUNDOS)
+
+    def reintentar_en_segundo_plano(self):
+        print(f"⚠️  {self.nombre} no disponible ({self.error}); reintentando cada {ARRANQUE_REINTENTO_SEGUNDOS:g}s")
+        self._reintento = asyncio.create_task(self._reintentar())
+
+    def detener(self):
+        if self._reintento is not None:
+            self._reintento.cancel()
+
+
+class Disponibilidad:
+    """Backends registrados por la app"""
+
+    def __init__(self):
+        self.backends: Dict[str, Backend] = {}
+
+    def registrar(
+        self,
+        nombre: str,
+        iniciar: Callable[[], Awaitable],
+        pings: Dict[str, Callable[[], Awaitable]],
+        migrar: Optional[Callable[[], Awaitable]] = None
+    ):
+        """Registrar un backend con su paso de inicialización, sus pings (por nombre) y su migración opcional"""
+        self.backends[nombre] = Backend(nombre, iniciar, pings, migrar)
+
+    async def arrancar(self):
+        """Inicializar todos los backends en paralelo; los que fallen se reintentan en segundo plano"""
+        backends = list(self.backends.values())
+        resultados = await asyncio.gather(*(b.arrancar() for b in backends))
+        for backend, ok in zip(backends, resultados):
+            if not ok:
+                backend.reintentar_en_segundo_plano()
+
+    def detener(self):
+        for backend in self.backends.values():
+            backend.detener()
+
+    async def _ping(self, ping: Callable[[], Awaitable]) -> dict:
+        inicio = time.perf_counter()
+        try:
+            await asyncio.wait_for(ping(), READY_TIMEOUT_SEGUNDOS)
+        except asyncio.TimeoutError:
+            return {"estado": "error", "error": f"sin respuesta en {READY_TIMEOUT_SEGUNDOS:g}s"}
+        except Exception as e:
+            return {"estado": "error", "error": f"{type(e).__name__}: {e}"}
+        return {"estado": "ok", "latencia_ms": round((time.perf_counter() - inicio) * 1000, 1)}
+
+    async def comprobar(self) -> Tuple[bool, Dict[str, dict]]:
+        """`(listo, detalle por backend)`; los pings de todos los backends corren en paralelo"""
+        pendientes = {}
+        detalle: Dict[str, dict] = {}
+        for backend in self.backends.values():
+            if not backend.inicializado:
+                detalle[backend.nombre] = {"estado": "iniciando", "error": backend.error}
+                continue
+            for nombre, ping in backend.pings.items():
+                pendientes[nombre] = self._ping(ping)
+        for nombre, resultado in zip(pendientes, await asyncio.gather(*pendientes.values())):
+            detalle[nombre] = resultado
+        listo = all(d["estado"] == "ok" for d in detalle.values())
+        return listo, detalle
+
+
+disponibilidad = Disponibilidad()
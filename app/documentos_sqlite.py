@@ -0,0 +1,299 @@
+"""
+Colecciones de documentos sobre SQLite (reemplazo de MongoDB con BACKEND_ALMACENAMIENTO=sqlite)
+
+`ClienteDocumentos` expone la misma forma que Motor (`cliente[base].coleccion`)
+con las operaciones que usan `app.crud`, `app.catalogo_cache` y `main.py`:
+find (filtro, proyección, sort, skip, limit, to_list, async for), find_one,
+insert_one, insert_many, update_one ($set/$inc), delete_one, count_documents
+y create_index. Así las rutas corren sin cambios contra un solo archivo.
+
+Cada documento es una fila JSON en la tabla `documentos`, con clave
+`(coleccion, id)`. Los filtros por `id` (igualdad o $in) usan la clave
+primaria; el resto se evalúa en Python sobre la colección, que en la práctica
+es el catálogo de seguros (pocas filas y con caché en memoria).
+"""
+from sqlalchemy import Column, MetaData, String, Table, Text, delete, insert, select, update
+from app import database_sql
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+import json
+import uuid
+
+_metadata = MetaData()
+
+documentos = Table(
+    "documentos", _metadata,
+    Column("coleccion", String(50), primary_key=True),
+    Column("id", String(64), primary_key=True),
+    Column("datos", Text, nullable=False),
+)
+
+_FALTA = object()
+
+
+# ==================== FILTROS Y PROYECCIONES (semántica de MongoDB) ====================
+
+def _valor(documento: dict, campo: str):
+    actual = documento
+    for parte in campo.split("."):
+        if not isinstance(actual, dict) or parte not in actual:
+            return _FALTA
+        actual = actual[parte]
+    return actual
+
+
+def _comparar(valor, operador: str, esperado) -> bool:
+    if operador == "$exists":
+        return (valor is not _FALTA) == bool(esperado)
+    if valor is _FALTA:
+        valor = None
+    if operador == "$eq":
+        return valor == esperado
+    if operador == "$ne":
+        return valor != esperado
+    if operador == "$in":
+        return valor in esperado
+    if operador == "$nin":
+        return valor not in esperado
+    if valor is None:
+        return False
+    if operador == "$gt":
+        return valor > esperado
+    if operador == "$gte":
+        return valor >= esperado
+    if operador == "$lt":
+        return valor < esperado
+    if operador == "$lte":
+        return valor <= esperado
+    raise ValueError(f"Operador no soportado: {operador}")
+
+
+def coincide(documento: dict, filtro: Optional[dict]) -> bool:
+    """Evaluar un filtro de MongoDB (igualdad, $in, $nin, $ne, $gt..., $exists, $or, $and)"""
+    for campo, condicion in (filtro or {}).items():
+        if campo == "$or":
+            if not any(coincide(documento, sub) for sub in condicion):
+                return False
+        elif campo == "$and":
+            if not all(coincide(documento, sub) for sub in condicion):
+                return False
+        elif isinstance(condicion, dict) and condicion and all(k.startswith("$") for k in condicion):
+            valor = _valor(documento, campo)
+            if not all(_comparar(valor, op, esperado) for op, esperado in condicion.items()):
+                return False
+        else:
+            valor = _valor(documento, campo)
+            if (None if valor is _FALTA else valor) != condicion:
+                return False
+    return True
+
+
+def proyectar(documento: dict, proyeccion: Optional[dict]) -> dict:
+    """Aplicar una proyección de inclusión o exclusión (el documento se copia)"""
+    if not proyeccion:
+        return dict(documento)
+    incluir = {k for k, v in proyeccion.items() if v and k != "_id"}
+    if incluir:
+        resultado = {k: documento[k] for k in incluir if k in documento}
+        if proyeccion.get("_id", 1) and "_id" in documento:
+            resultado["_id"] = documento["_id"]
+        return resultado
+    return {k: v for k, v in documento.items() if proyeccion.get(k, 1)}
+
+
+def ordenar(documentos: List[dict], orden: List[tuple]) -> List[dict]:
+    """Ordenar por varias claves como `cursor.sort([...])`; None/faltante primero"""
+    for campo, direccion in reversed(orden):
+        documentos.sort(
+            key=lambda d: (0, "") if _valor(d, campo) in (_FALTA, None) else (1, _valor(d, campo)),
+            reverse=direccion < 0
+        )
+    return documentos
+
+
+# ==================== CODIFICACIÓN ====================
+
+def _codificar(valor):
+    if isinstance(valor, datetime):
+        return {"$date": valor.isoformat()}
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+
+def _decodificar(objeto: dict):
+    if len(objeto) == 1 and "$date" in objeto:
+        return datetime.fromisoformat(objeto["$date"])
+    return objeto
+
+
+def _a_json(documento: dict) -> str:
+    return json.dumps(documento, default=_codificar, ensure_ascii=False)
+
+
+def _de_json(texto: str) -> dict:
+    return json.loads(texto, object_hook=_decodificar)
+
+
+def _ids_del_filtro(filtro: Optional[dict]) -> Optional[List[str]]:
+    """IDs si el filtro restringe por `id` (igualdad o $in): se buscan por clave primaria"""
+    condicion = (filtro or {}).get("id", _FALTA)
+    if condicion is _FALTA:
+        return None
+    if isinstance(condicion, dict):
+        return [str(i) for i in condicion["$in"]] if set(condicion) == {"$in"} else None
+    return [str(condicion)]
+
+
+# ==================== CURSOR, COLECCIÓN, BASE ====================
+
+class CursorDocumentos:
+    def __init__(self, coleccion: "ColeccionDocumentos", filtro: Optional[dict], proyeccion: Optional[dict]):
+        self._coleccion = coleccion
+        self._filtro = filtro
+        self._proyeccion = proyeccion
+        self._orden: List[tuple] = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, clave, direccion: int = 1):
+        self._orden = list(clave) if isinstance(clave, list) else [(clave, direccion)]
+        return self
+
+    def skip(self, cantidad: int):
+        self._skip = cantidad
+        return self
+
+    def limit(self, cantidad: int):
+        self._limit = cantidad
+        return self
+
+    async def to_list(self, length: Optional[int] = None) -> List[dict]:
+        resultado = ordenar(await self._coleccion._buscar(self._filtro), self._orden)[self._skip:]
+        limite = min(x for x in (self._limit, length) if x) if (self._limit or length) else None
+        if limite:
+            resultado = resultado[:limite]
+        return [proyectar(d, self._proyeccion) for d in resultado]
+
+    def __aiter__(self):
+        return self._iterar()
+
+    async def _iterar(self):
+        for documento in await self.to_list():
+            yield documento
+
+
+class ColeccionDocumentos:
+    def __init__(self, nombre: str):
+        self.name = nombre
+
+    async def _buscar(self, filtro: Optional[dict], db=None) -> List[dict]:
+        query = select(documentos.c.datos).where(documentos.c.coleccion == self.name)
+        ids = _ids_del_filtro(filtro)
+        if ids is not None:
+            query = query.where(documentos.c.id.in_(ids))
+        if db is None:
+            async with database_sql.AsyncSessionLectura() as sesion:
+                filas = (await sesion.execute(query)).scalars().all()
+        else:
+            filas = (await db.execute(query)).scalars().all()
+        return [d for d in map(_de_json, filas) if coincide(d, filtro)]
+
+    def find(self, filtro: Optional[dict] = None, proyeccion: Optional[dict] = None) -> CursorDocumentos:
+        return CursorDocumentos(self, filtro, proyeccion)
+
+    async def find_one(self, filtro: Optional[dict] = None, proyeccion: Optional[dict] = None):
+        encontrados = await self._buscar(filtro)
+        return proyectar(encontrados[0], proyeccion) if encontrados else None
+
+    async def count_documents(self, filtro: Optional[dict] = None) -> int:
+        return len(await self._buscar(filtro))
+
+    async def insert_many(self, nuevos: List[dict]):
+        filas = []
+        for documento in nuevos:
+            documento.setdefault("_id", str(documento.get("id") or uuid.uuid4()))
+            filas.append({"coleccion": self.name, "id": str(documento["_id"]), "datos": _a_json(documento)})
+        async with database_sql.sesion_escritura() as db:
+            await db.execute(insert(documentos), filas)
+            await db.commit()
+        return SimpleNamespace(inserted_ids=[d["_id"] for d in nuevos], acknowledged=True)
+
+    async def insert_one(self, documento: dict):
+        resultado = await self.insert_many([documento])
+        return SimpleNamespace(inserted_id=resultado.inserted_ids[0], acknowledged=True)
+
+    async def update_one(self, filtro: dict, cambios: Dict[str, Dict[str, Any]]):
+        # Leer y escribir con el turno de escritura: nadie cambia el documento en el medio
+        async with database_sql.sesion_escritura() as db:
+            encontrados = await self._buscar(filtro, db)
+            if not encontrados:
+                return SimpleNamespace(matched_count=0, modified_count=0, acknowledged=True)
+            documento = encontrados[0]
+            documento.update(cambios.get("$set", {}))
+            for campo, valor in cambios.get("$inc", {}).items():
+                documento[campo] = documento.get(campo, 0) + valor
+            await db.execute(
+                update(documentos)
+                .where(documentos.c.coleccion == self.name, documentos.c.id == str(documento["_id"]))
+                .values(datos=_a_json(documento))
+            )
+            await db.commit()
+        return SimpleNamespace(matched_count=1, modified_count=1, acknowledged=True)
+
+    async def delete_one(self, filtro: dict):
+        async with database_sql.sesion_escritura() as db:
+            encontrados = await self._buscar(filtro, db)
+            if not encontrados:
+                return SimpleNamespace(deleted_count=0, acknowledged=True)
+            await db.execute(delete(documentos).where(
+                documentos.c.coleccion == self.name, documentos.c.id == str(encontrados[0]["_id"])
+            ))
+            await db.commit()
+        return SimpleNamespace(deleted_count=1, acknowledged=True)
+
+    async def create_index(self, claves, **opciones) -> str:
+        # Los filtros se evalúan en Python; `id` ya usa la clave primaria
+        claves = [(claves, 1)] if isinstance(claves, str) else claves
+        return opciones.get("name") or "_".join(f"{campo}_{direccion}" for campo, direccion in claves)
+
+
+class BaseDocumentos:
+    def __init__(self, nombre: str):
+        self.name = nombre
+        self._colecciones: Dict[str, ColeccionDocumentos] = {}
+
+    def __getitem__(self, nombre: str) -> ColeccionDocumentos:
+        if nombre not in self._colecciones:
+            self._colecciones[nombre] = ColeccionDocumentos(nombre)
+        return self._colecciones[nombre]
+
+    def __getattr__(self, nombre: str) -> ColeccionDocumentos:
+        if nombre.startswith("_"):
+            raise AttributeError(nombre)
+        return self[nombre]
+
+
+class ClienteDocumentos:
+    """Reemplazo de AsyncIOMotorClient sobre el mismo archivo SQLite que las tablas"""
+
+    def __init__(self):
+        self._bases: Dict[str, BaseDocumentos] = {}
+
+    async def inicializar(self):
+        """Crear la tabla de documentos si no existe"""
+        async with database_sql.turno_escritura():
+            async with database_sql.engine.begin() as conn:
+                await conn.run_sync(_metadata.create_all)
+
+    async def ping(self):
+        """Comprobar que la tabla de documentos responde"""
+        async with database_sql.AsyncSessionLectura() as sesion:
+            await sesion.execute(select(documentos.c.id).limit(1))
+
+    def __getitem__(self, nombre: str) -> BaseDocumentos:
+        if nombre not in self._bases:
+            self._bases[nombre] = BaseDocumentos(nombre)
+        return self._bases[nombre]
+
+    def close(self):
+        pass
@@ -0,0 +1,196 @@
+"""
+Assets del frontend con huella de contenido y precomprimidos
+
+Paso de build (`python -m app.estaticos`):
+- copia `frontend/` a `frontend/dist/`, renombrando js/app.js, js/api.js y
+  css/styles.css con un hash de su contenido (p. ej. `js/app.3f2a9c1b7d4e.js`)
+- reescribe las referencias en index.html
+- genera variantes .gz y, si está instalado el paquete `brotli`, .br
+
+Servicio (`FrontendPrecomprimido`): carga dist/ en memoria al arrancar, elige
+la mejor codificación según Accept-Encoding y responde con
+`Cache-Control: immutable` para los assets con hash y `no-cache` para
+index.html, que se revalida con su ETag (304).
+"""
+from starlette.datastructures import Headers
+from starlette.responses import PlainTextResponse, Response
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import gzip
+import hashlib
+import json
+import mimetypes
+import re
+import shutil
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se generan variantes gzip
+    brotli = None
+
+DIRECTORIO_FRONTEND = Path(__file__).resolve().parent.parent / "frontend"
+DIRECTORIO_DIST = DIRECTORIO_FRONTEND / "dist"
+
+# Assets que llevan huella de contenido en el nombre
+ASSETS_CON_HUELLA = ("js/app.js", "js/api.js", "css/styles.css")
+
+# Solo se comprimen archivos de texto de al menos este tamaño
+EXTENSIONES_COMPRIMIBLES = {".html", ".js", ".css", ".json", ".svg", ".txt", ".map"}
+TAM_MINIMO_COMPRESION = 512
+
+CACHE_INMUTABLE = "public, max-age=31536000, immutable"
+CACHE_REVALIDAR = "no-cache"
+
+_PATRON_HUELLA = re.compile(r"\.[0-9a-f]{12}\.[A-Za-z0-9]+$")
+
+
+def _huella(contenido: bytes) -> str:
+    return hashlib.sha256(contenido).hexdigest()[:12]
+
+
+def _nombre_con_huella(ruta: str, huella: str) -> str:
+    base, _, extension = ruta.rpartition(".")
+    return f"{base}.{huella}.{extension}"
+
+
+def _comprimir(archivo: Path):
+    """Escribir archivo.gz (y archivo.br si hay brotli) junto al original"""
+    contenido = archivo.read_bytes()
+    if archivo.suffix not in EXTENSIONES_COMPRIMIBLES or len(contenido) < TAM_MINIMO_COMPRESION:
+        return
+    # mtime=0: el .gz es idéntico entre builds del mismo contenido
+    archivo.with_name(archivo.name + ".gz").write_bytes(gzip.compress(contenido, compresslevel=9, mtime=0))
+    if brotli is not None:
+        archivo.with_name(archivo.name + ".br").write_bytes(brotli.compress(contenido, quality=11))
+
+
+def construir(origen: Path = DIRECTORIO_FRONTEND, destino: Path = DIRECTORIO_DIST) -> Dict[str, str]:
+    """Generar dist/ y devolver el manifiesto {ruta original: ruta con huella}"""
+    if destino.exists():
+        shutil.rmtree(destino)
+    destino.mkdir(parents=True)
+
+    manifiesto: Dict[str, str] = {}
+    for archivo in sorted(origen.rglob("*")):
+        relativa = archivo.relative_to(origen).as_posix()
+        if archivo.is_dir() or destino in archivo.parents or relativa == "index.html":
+            continue
+        contenido = archivo.read_bytes()
+        salida = _nombre_con_huella(relativa, _huella(contenido)) if relativa in ASSETS_CON_HUELLA else relativa
+        if relativa in ASSETS_CON_HUELLA:
+            manifiesto[relativa] = salida
+        (destino / salida).parent.mkdir(parents=True, exist_ok=True)
+        (destino / salida).write_bytes(contenido)
+
+    # index.html apunta a los nombres con huella
+    html = (origen / "index.html").read_text(encoding="utf-8")
+    for original, con_huella in manifiesto.items():
+        html = re.sub(rf'(src|href)="(\./)?{re.escape(original)}"', rf'\1="{con_huella}"', html)
+    (destino / "index.html").write_text(html, encoding="utf-8")
+    (destino / "manifest.json").write_text(json.dumps(manifiesto, indent=2, sort_keys=True))
+
+    for archivo in list(destino.rglob("*")):
+        if archivo.is_file():
+            _comprimir(archivo)
+    return manifiesto
+
+
+def _codificaciones_aceptadas(accept_encoding: str) -> Dict[str, float]:
+    aceptadas: Dict[str, float] = {}
+    for parte in accept_encoding.split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        calidad = 1.0
+        if parametros.strip().startswith("q="):
+            try:
+                calidad = float(parametros.strip()[2:])
+            except ValueError:
+                calidad = 0.0
+        if nombre:
+            aceptadas[nombre.lower()] = calidad
+    return aceptadas
+
+
+class FrontendPrecomprimido:
+    """App ASGI que sirve dist/ desde memoria, con la mejor codificación disponible"""
+
+    # Orden de preferencia cuando el cliente acepta varias
+    CODIFICACIONES = (("br", ".br"), ("gzip", ".gz"))
+    # Cada variante tiene su propio ETag: son representaciones distintas del archivo
+    SUFIJOS_ETAG = {"identity": "", "br": "-br", "gzip": "-gz"}
+
+    def __init__(self, directorio: Path = DIRECTORIO_DIST):
+        self._archivos: Dict[str, Tuple[str, Dict[str, str], Dict[str, bytes]]] = {}
+        for archivo in directorio.rglob("*"):
+            if not archivo.is_file() or archivo.suffix in (".gz", ".br"):
+                continue
+            relativa = archivo.relative_to(directorio).as_posix()
+            variantes = {"identity": archivo.read_bytes()}
+            for codificacion, extension in self.CODIFICACIONES:
+                comprimido = archivo.with_name(archivo.name + extension)
+                if comprimido.exists():
+                    variantes[codificacion] = comprimido.read_bytes()
+            tipo = mimetypes.guess_type(archivo.name)[0] or "application/octet-stream"
+            huella = _huella(variantes["identity"])
+            etags = {codificacion: f'"{huella}{self.SUFIJOS_ETAG[codificacion]}"' for codificacion in variantes}
+            self._archivos[relativa] = (tipo, etags, variantes)
+
+    def _elegir(self, variantes: Dict[str, bytes], accept_encoding: str) -> str:
+        aceptadas = _codificaciones_aceptadas(accept_encoding)
+        for codificacion, _ in self.CODIFICACIONES:
+            if codificacion in variantes and aceptadas.get(codificacion, aceptadas.get("*", 0)) > 0:
+                return codificacion
+        return "identity"
+
+    def _buscar(self, ruta: str) -> Optional[Tuple[str, Tuple[str, Dict[str, str], Dict[str, bytes]]]]:
+        ruta = ruta.lstrip("/")
+        if ruta == "" or ruta.endswith("/"):
+            ruta += "index.html"
+        if ruta in self._archivos:
+            return ruta, self._archivos[ruta]
+        # Igual que StaticFiles(html=True): /carpeta -> /carpeta/index.html
+        indice = f"{ruta}/index.html"
+        if indice in self._archivos:
+            return indice, self._archivos[indice]
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        if scope["method"] not in ("GET", "HEAD"):
+            await PlainTextResponse("Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"})(scope, receive, send)
+            return
+        # Montada en un prefijo, la ruta propia es lo que sigue al root_path
+        ruta = scope["path"]
+        if scope.get("root_path") and ruta.startswith(scope["root_path"]):
+            ruta = ruta[len(scope["root_path"]):]
+        encontrado = self._buscar(ruta)
+        if encontrado is None:
+            await PlainTextResponse("Not Found", status_code=404)(scope, receive, send)
+            return
+
+        ruta, (tipo, etags, variantes) = encontrado
+        headers = Headers(scope=scope)
+        codificacion = self._elegir(variantes, headers.get("accept-encoding", ""))
+        etag = etags[codificacion]
+        respuesta_headers = {
+            "ETag": etag,
+            "Cache-Control": CACHE_INMUTABLE if _PATRON_HUELLA.search(ruta) else CACHE_REVALIDAR,
+            "Vary": "Accept-Encoding",
+        }
+        if codificacion != "identity":
+            respuesta_headers["Content-Encoding"] = codificacion
+
+        if etag in [e.strip() for e in headers.get("if-none-match", "").split(",")]:
+            respuesta = Response(status_code=304, headers=respuesta_headers)
+        else:
+            cuerpo = variantes[codificacion]
+            respuesta = Response(b"" if scope["method"] == "HEAD" else cuerpo, media_type=tipo, headers=respuesta_headers)
+            respuesta.headers["Content-Length"] = str(len(cuerpo))
+        await respuesta(scope, receive, send)
+
+
+if __name__ == "__main__":
+    manifiesto = construir()
+    for original, con_huella in manifiesto.items():
+        print(f"✅ {original} -> {con_huella}")
+    print(f"✅ Frontend listo en {DIRECTORIO_DIST} ({'gzip + brotli' if brotli else 'gzip; instala brotli para .br'})")
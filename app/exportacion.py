@@ -0,0 +1,125 @@
+"""
+Exportación en streaming de pagos y auditoría (NDJSON o CSV)
+
+Las filas se leen con un cursor del lado del servidor (`stream_results` +
+`yield_per`) y se escriben a la respuesta por bloques, así que la memoria
+usada no depende de cuántas filas se exporten.
+"""
+from sqlalchemy import select
+from app import database_sql
+from app.models_sql import PagoSQL, AuditoriaSQL
+from datetime import datetime
+from decimal import Decimal
+from typing import AsyncIterator, List, Optional
+import csv
+import enum
+import io
+import json
+
+# Filas que se piden al servidor y se escriben a la respuesta por bloque
+EXPORTACION_LOTE = 1000
+
+FORMATOS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+_pagos = PagoSQL.__table__
+_auditoria = AuditoriaSQL.__table__
+
+
+def _valor_json(valor):
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, enum.Enum):
+        return valor.value
+    return valor
+
+
+def _valor_csv(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    if isinstance(valor, enum.Enum):
+        return valor.value
+    if isinstance(valor, (dict, list)):
+        return json.dumps(valor, ensure_ascii=False)
+    return valor
+
+
+async def _stream_filas(query, primario: bool = False) -> AsyncIterator[List]:
+    """Leer la consulta con un cursor del servidor (en la réplica salvo `primario`) y entregar bloques de filas"""
+    fabrica = database_sql.AsyncSessionLocal if primario else database_sql.AsyncSessionLectura
+    async with fabrica() as db:
+        result = await db.stream(query.execution_options(yield_per=EXPORTACION_LOTE))
+        async for bloque in result.partitions():
+            yield bloque
+
+
+async def _codificar(query, columnas: List[str], formato: str, primario: bool = False) -> AsyncIterator[bytes]:
+    """Convertir el stream de filas en bytes NDJSON o CSV, bloque por bloque"""
+    if formato == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columnas)
+        yield buffer.getvalue().encode()
+        async for bloque in _stream_filas(query, primario):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows([_valor_csv(valor) for valor in fila] for fila in bloque)
+            yield buffer.getvalue().encode()
+    else:
+        async for bloque in _stream_filas(query, primario):
+            lineas = [
+                json.dumps({columna: _valor_json(valor) for columna, valor in zip(columnas, fila)}, ensure_ascii=False)
+                for fila in bloque
+            ]
+            yield ("\n".join(lineas) + "\n").encode()
+
+
+def exportar_pagos(
+    formato: str,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    usuario_id: Optional[str] = None,
+    poliza_id: Optional[str] = None,
+    primario: bool = False
+) -> AsyncIterator[bytes]:
+    """Stream de pagos filtrados por fecha, usuario y póliza"""
+    query = select(_pagos).order_by(_pagos.c.fecha_pago, _pagos.c.id)
+    if desde:
+        query = query.where(_pagos.c.fecha_pago >= desde)
+    if hasta:
+        query = query.where(_pagos.c.fecha_pago < hasta)
+    if usuario_id:
+        query = query.where(_pagos.c.usuario_id == usuario_id)
+    if poliza_id:
+        query = query.where(_pagos.c.poliza_id == poliza_id)
+    return _codificar(query, [c.name for c in _pagos.columns], formato, primario)
+
+
+def exportar_auditoria(
+    formato: str,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    usuario_id: Optional[str] = None,
+    tabla: Optional[str] = None,
+    registro_id: Optional[str] = None,
+    primario: bool = False
+) -> AsyncIterator[bytes]:
+    """Stream de auditoría filtrada por fecha, usuario, tabla y registro"""
+    query = select(_auditoria).order_by(_auditoria.c.timestamp, _auditoria.c.id)
+    if desde:
+        query = query.where(_auditoria.c.timestamp >= desde)
+    if hasta:
+        query = query.where(_auditoria.c.timestamp < hasta)
+    if usuario_id:
+        query = query.where(_auditoria.c.usuario_id == usuario_id)
+    if tabla:
+        query = query.where(_auditoria.c.tabla_afectada == tabla)
+    if registro_id:
+        query = query.where(_auditoria.c.registro_id == registro_id)
+    return _codificar(query, [c.name for c in _auditoria.columns], formato, primario)
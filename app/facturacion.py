@@ -0,0 +1,374 @@
+"""
+Motor de facturación mensual: cobra en lote las cuotas vencidas
+
+Selecciona todas las pólizas activas con una cuota vencida (la cuota N vence
+`30 * N` días después de `fecha_inicio`) y las cobra por bloques. Una póliza
+atrasada paga en la misma corrida todas sus cuotas vencidas que el saldo
+alcance a cubrir. Cada bloque es una sola transacción:
+    1. bloquea las pólizas y los saldos de sus usuarios (SELECT ... FOR UPDATE)
+    2. descuenta los saldos con un executemany de UPDATE
+    3. avanza `cuotas_pagadas` y marca como vencidas las pólizas completas
+    4. inserta los pagos y su auditoría con executemany
+    5. ajusta los resúmenes de cuenta de los usuarios cobrados
+
+Los bloques se procesan en paralelo con un número acotado de sesiones y
+nunca parten a un usuario entre dos bloques, así que no compiten por las
+mismas filas.
+
+Es reiniciable: cada bloque se confirma por separado y las actualizaciones
+exigen que `cuotas_pagadas` no haya cambiado desde la lectura. Si la corrida
+se interrumpe, volver a ejecutarla solo cobra lo que sigue vencido. Un
+bloque que falla se cuenta en `bloques_fallidos` y sus pólizas en
+`polizas_omitidas`; la CLI termina con código 1 si hubo alguno, para que el
+cron lo detecte.
+
+Uso desde la línea de comandos:
+    python -m app.facturacion [--fecha-corte 2025-01-31] [--lote 500] [--sesiones 4]
+"""
+from sqlalchemy import select, update, insert, and_, or_, bindparam
+from app import database_sql, crud_sql
+from app.models_sql import UsuarioSQL, PolizaSQL, PagoSQL, AuditoriaSQL, EstadoPoliza, EstadoPago
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import List, Optional, Tuple
+import argparse
+import asyncio
+import os
+import time
+import uuid
+
+# Configuración (desde variables de entorno)
+FACTURACION_TAM_LOTE = int(os.getenv("FACTURACION_TAM_LOTE", "500"))
+FACTURACION_SESIONES = int(os.getenv("FACTURACION_SESIONES", "4"))
+FACTURACION_INTERVALO_HORAS = float(os.getenv("FACTURACION_INTERVALO_HORAS", "0"))  # 0 = sin tarea programada
+FACTURACION_REINTENTOS = 3
+
+DIAS_POR_CUOTA = 30
+
+_polizas = PolizaSQL.__table__
+_usuarios = UsuarioSQL.__table__
+
+# Descuento guardado: solo aplica si el saldo sigue alcanzando
+_debitar = (
+    update(_usuarios)
+    .where(and_(_usuarios.c.id == bindparam("b_usuario_id"), _usuarios.c.saldo >= bindparam("b_total")))
+    .values(saldo=_usuarios.c.saldo - bindparam("b_total"))
+)
+
+# Avance de cuotas guardado: solo si nadie pagó la cuota desde la lectura
+_avanzar = (
+    update(_polizas)
+    .where(and_(_polizas.c.id == bindparam("b_poliza_id"), _polizas.c.cuotas_pagadas == bindparam("b_pagadas")))
+    .values(cuotas_pagadas=bindparam("b_nuevas"), estado=bindparam("b_estado"))
+)
+
+
+class ConflictoFacturacion(Exception):
+    """Alguna fila cambió entre la lectura y la escritura del bloque"""
+
+
+def cuota_vencida(fecha_inicio: datetime, cuotas_pagadas: int, fecha_corte: datetime) -> bool:
+    """Indica si la siguiente cuota de la póliza ya venció"""
+    return fecha_inicio + timedelta(days=DIAS_POR_CUOTA * (cuotas_pagadas + 1)) <= fecha_corte
+
+
+def cuotas_vencidas(fecha_inicio: datetime, cuotas_pagadas: int, cuotas_totales: int, fecha_corte: datetime) -> int:
+    """Cuántas cuotas de la póliza vencieron y siguen sin pagar"""
+    transcurridas = (fecha_corte - fecha_inicio) // timedelta(days=DIAS_POR_CUOTA)
+    return max(0, min(transcurridas, cuotas_totales) - cuotas_pagadas)
+
+
+class ResultadoFacturacion:
+    """Contadores de una corrida"""
+
+    def __init__(self):
+        self.polizas_evaluadas = 0
+        self.cuotas_cobradas = 0
+        self.saldo_insuficiente = 0
+        self.polizas_completadas = 0
+        self.conflictos = 0
+        self.bloques = 0
+        self.bloques_fallidos = 0
+        self.polizas_omitidas = 0
+        self.monto_total = Decimal("0")
+        self.inicio = time.perf_counter()
+        self.segundos = 0.0
+
+    def resumen(self) -> dict:
+        segundos = self.segundos or (time.perf_counter() - self.inicio)
+        return {
+            "polizas_evaluadas": self.polizas_evaluadas,
+            "cuotas_cobradas": self.cuotas_cobradas,
+            "saldo_insuficiente": self.saldo_insuficiente,
+            "polizas_completadas": self.polizas_completadas,
+            "conflictos": self.conflictos,
+            "bloques": self.bloques,
+            "bloques_fallidos": self.bloques_fallidos,
+            "polizas_omitidas": self.polizas_omitidas,
+            "monto_total": float(self.monto_total),
+            "segundos": round(segundos, 3),
+            "polizas_por_segundo": round(self.polizas_evaluadas / segundos, 1) if segundos else 0.0,
+        }
+
+
+async def _producir_bloques(cola: asyncio.Queue, fecha_corte: datetime, tam_lote: int, sesiones: int):
+    """Recorrer las pólizas candidatas por (usuario_id, id) y armar bloques sin partir usuarios"""
+    # Ninguna póliza más reciente que esto tiene su primera cuota vencida
+    inicio_maximo = fecha_corte - timedelta(days=DIAS_POR_CUOTA)
+    ultimo: Optional[Tuple[str, str]] = None
+    bloque: List[str] = []
+    usuario_actual = None
+
+    while True:
+        query = (
+            select(_polizas.c.id, _polizas.c.usuario_id, _polizas.c.fecha_inicio, _polizas.c.cuotas_pagadas)
+            .where(
+                _polizas.c.estado == EstadoPoliza.ACTIVA,
+                _polizas.c.cuotas_pagadas < _polizas.c.cuotas_totales,
+                _polizas.c.fecha_inicio <= inicio_maximo
+            )
+            .order_by(_polizas.c.usuario_id, _polizas.c.id)
+            .limit(tam_lote * sesiones)
+        )
+        if ultimo is not None:
+            query = query.where(or_(
+                _polizas.c.usuario_id > ultimo[0],
+                and_(_polizas.c.usuario_id == ultimo[0], _polizas.c.id > ultimo[1])
+            ))
+        async with database_sql.AsyncSessionLocal() as db:
+            filas = (await db.execute(query)).all()
+        if not filas:
+            break
+
+        for poliza_id, usuario_id, fecha_inicio, cuotas_pagadas in filas:
+            # Cerrar el bloque solo al cambiar de usuario
+            if len(bloque) >= tam_lote and usuario_id != usuario_actual:
+                await cola.put(bloque)
+                bloque = []
+            usuario_actual = usuario_id
+            if cuota_vencida(fecha_inicio, cuotas_pagadas, fecha_corte):
+                bloque.append(poliza_id)
+        ultimo = (filas[-1].usuario_id, filas[-1].id)
+
+    if bloque:
+        await cola.put(bloque)
+
+
+async def _cobrar_bloque(poliza_ids: List[str], fecha_corte: datetime, resultado: ResultadoFacturacion):
+    """Cobrar un bloque de pólizas en una sola transacción"""
+    async with database_sql.sesion_escritura() as db:
+        async with crud_sql.unidad_de_trabajo(db):
+            polizas = (await db.execute(
+                select(_polizas)
+                .where(
+                    _polizas.c.id.in_(poliza_ids),
+                    _polizas.c.estado == EstadoPoliza.ACTIVA,
+                    _polizas.c.cuotas_pagadas < _polizas.c.cuotas_totales
+                )
+                .order_by(_polizas.c.usuario_id, _polizas.c.fecha_inicio, _polizas.c.id)
+                .with_for_update()
+            )).all()
+            # Releer el vencimiento: la póliza pudo pagarse después de seleccionarla
+            polizas = [p for p in polizas if cuota_vencida(p.fecha_inicio, p.cuotas_pagadas, fecha_corte)]
+            if not polizas:
+                return
+
+            saldos = dict((await db.execute(
+                select(_usuarios.c.id, _usuarios.c.saldo)
+                .where(_usuarios.c.id.in_({p.usuario_id for p in polizas}))
+                .order_by(_usuarios.c.id)
+                .with_for_update()
+            )).all())
+
+            # Repartir el saldo de cada usuario entre sus pólizas, de la más antigua a la más nueva;
+            # cada póliza cobra todas sus cuotas vencidas que el saldo alcance
+            totales = {}
+            cobradas: List[Tuple] = []  # (póliza, cuotas cobradas)
+            insuficientes = 0
+            for poliza in polizas:
+                saldo = saldos.get(poliza.usuario_id, Decimal("0"))
+                vencidas = cuotas_vencidas(poliza.fecha_inicio, poliza.cuotas_pagadas, poliza.cuotas_totales, fecha_corte)
+                cuotas = min(vencidas, int(saldo // poliza.cuota_mensual)) if poliza.cuota_mensual > 0 else vencidas
+                if cuotas < vencidas:
+                    insuficientes += 1
+                if not cuotas:
+                    continue
+                monto = poliza.cuota_mensual * cuotas
+                saldos[poliza.usuario_id] = saldo - monto
+                totales[poliza.usuario_id] = totales.get(poliza.usuario_id, Decimal("0")) + monto
+                cobradas.append((poliza, cuotas))
+
+            if cobradas:
+                # 1. Descontar saldos
+                result = await db.execute(
+                    _debitar,
+                    [{"b_usuario_id": u, "b_total": total} for u, total in totales.items()]
+                )
+                if result.rowcount != len(totales):
+                    raise ConflictoFacturacion("Saldo modificado durante la facturación")
+
+                # 2. Avanzar cuotas y cerrar las pólizas completas
+                result = await db.execute(_avanzar, [
+                    {
+                        "b_poliza_id": p.id,
+                        "b_pagadas": p.cuotas_pagadas,
+                        "b_nuevas": p.cuotas_pagadas + cuotas,
+                        "b_estado": EstadoPoliza.VENCIDA if p.cuotas_pagadas + cuotas >= p.cuotas_totales else EstadoPoliza.ACTIVA
+                    }
+                    for p, cuotas in cobradas
+                ])
+                if result.rowcount != len(cobradas):
+                    raise ConflictoFacturacion("Póliza modificada durante la facturación")
+
+                # 3. Registrar pagos y auditoría
+                ahora = datetime.now()
+                pagos = [
+                    {
+                        "id": str(uuid.uuid4()),
+                        "poliza_id": p.id,
+                        "usuario_id": p.usuario_id,
+                        "monto": p.cuota_mensual,
+                        "fecha_pago": ahora,
+                        "metodo_pago": "saldo",
+                        "estado": EstadoPago.COMPLETADO,
+                        "numero_cuota": p.cuotas_pagadas + n
+                    }
+                    for p, cuotas in cobradas
+                    for n in range(1, cuotas + 1)
+                ]
+                await db.execute(insert(PagoSQL.__table__), pagos)
+                await db.execute(insert(AuditoriaSQL.__table__), [
+                    {
+                        "usuario_id": pago["usuario_id"],
+                        "accion": "COBRO_CUOTA",
+                        "tabla_afectada": "pagos",
+                        "registro_id": pago["id"],
+                        "datos_nuevos": {
+                            "poliza_id": pago["poliza_id"],
+                            "monto": float(pago["monto"]),
+                            "cuota": pago["numero_cuota"]
+                        },
+                        "timestamp": ahora
+                    }
+                    for pago in pagos
+                ])
+
+                # 5. Ajustar los resúmenes de cuenta de los usuarios cobrados
+                ajustes = {}
+                for p, cuotas in cobradas:
+                    ajuste = ajustes.setdefault(p.usuario_id, {
+                        "usuario_id": p.usuario_id,
+                        "total_pagado": Decimal("0"),
+                        "cuotas_pendientes": 0,
+                        "polizas_activas": 0,
+                        "proximo_monto": Decimal("0")
+                    })
+                    ajuste["total_pagado"] += p.cuota_mensual * cuotas
+                    ajuste["cuotas_pendientes"] -= cuotas
+                    if p.cuotas_pagadas + cuotas >= p.cuotas_totales:
+                        ajuste["polizas_activas"] -= 1
+                        ajuste["proximo_monto"] -= p.cuota_mensual
+                await crud_sql.ajustar_resumenes_sql(db, list(ajustes.values()))
+
+    resultado.polizas_evaluadas += len(polizas)
+    resultado.cuotas_cobradas += sum(cuotas for _, cuotas in cobradas)
+    resultado.saldo_insuficiente += insuficientes
+    resultado.polizas_completadas += sum(1 for p, cuotas in cobradas if p.cuotas_pagadas + cuotas >= p.cuotas_totales)
+    resultado.monto_total += sum((p.cuota_mensual * cuotas for p, cuotas in cobradas), Decimal("0"))
+
+
+async def _trabajador(cola: asyncio.Queue, fecha_corte: datetime, resultado: ResultadoFacturacion):
+    while True:
+        bloque = await cola.get()
+        try:
+            if bloque is None:
+                return
+            cobrado = False
+            for intento in range(1, FACTURACION_REINTENTOS + 1):
+                try:
+                    await _cobrar_bloque(bloque, fecha_corte, resultado)
+                    cobrado = True
+                    break
+                except ConflictoFacturacion as e:
+                    resultado.conflictos += 1
+                    if intento == FACTURACION_REINTENTOS:
+                        print(f"⚠️  Bloque de {len(bloque)} pólizas omitido: {e}")
+                except Exception as e:
+                    # El bloque hizo rollback; una corrida posterior lo vuelve a intentar
+                    print(f"❌ Error al cobrar un bloque de {len(bloque)} pólizas: {e}")
+                    break
+            if cobrado:
+                resultado.bloques += 1
+            else:
+                resultado.bloques_fallidos += 1
+                resultado.polizas_omitidas += len(bloque)
+        finally:
+            cola.task_done()
+
+
+async def ejecutar_facturacion(
+    fecha_corte: Optional[datetime] = None,
+    tam_lote: int = FACTURACION_TAM_LOTE,
+    sesiones: int = FACTURACION_SESIONES
+) -> dict:
+    """
+    Cobrar todas las cuotas vencidas a `fecha_corte` (por defecto, ahora)
+
+    Devuelve el resumen de la corrida, incluido el rendimiento en pólizas
+    por segundo para dimensionar la ventana nocturna.
+    """
+    fecha_corte = fecha_corte or datetime.now()
+    resultado = ResultadoFacturacion()
+    cola: asyncio.Queue = asyncio.Queue(maxsize=sesiones * 2)
+
+    trabajadores = [
+        asyncio.create_task(_trabajador(cola, fecha_corte, resultado))
+        for _ in range(sesiones)
+    ]
+    try:
+        await _producir_bloques(cola, fecha_corte, tam_lote, sesiones)
+    finally:
+        for _ in trabajadores:
+            await cola.put(None)
+        await asyncio.gather(*trabajadores)
+
+    resultado.segundos = time.perf_counter() - resultado.inicio
+    resumen = resultado.resumen()
+    print(
+        f"{'❌' if resumen['bloques_fallidos'] else '✅'} Facturación: {resumen['cuotas_cobradas']} cuotas cobradas de "
+        f"{resumen['polizas_evaluadas']} pólizas vencidas en {resumen['segundos']}s "
+        f"({resumen['polizas_por_segundo']} pólizas/s)"
+    )
+    if resumen["bloques_fallidos"]:
+        print(
+            f"❌ Facturación incompleta: {resumen['bloques_fallidos']} bloques fallidos, "
+            f"{resumen['polizas_omitidas']} pólizas sin cobrar"
+        )
+    return resumen
+
+
+async def facturacion_programada(intervalo_horas: float = FACTURACION_INTERVALO_HORAS):
+    """Tarea de fondo que ejecuta la facturación cada `intervalo_horas`"""
+    while True:
+        try:
+            await ejecutar_facturacion()
+        except Exception as e:
+            print(f"⚠️  Error en la facturación programada: {e}")
+        await asyncio.sleep(intervalo_horas * 3600)
+
+
+async def _main(args):
+    fecha_corte = datetime.fromisoformat(args.fecha_corte) if args.fecha_corte else None
+    try:
+        resumen = await ejecutar_facturacion(fecha_corte, tam_lote=args.lote, sesiones=args.sesiones)
+    finally:
+        await database_sql.close_db_sql()
+    return 1 if resumen["bloques_fallidos"] else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cobrar en lote las cuotas mensuales vencidas")
+    parser.add_argument("--fecha-corte", help="Fecha de corte ISO (por defecto, ahora)")
+    parser.add_argument("--lote", type=int, default=FACTURACION_TAM_LOTE, help="Pólizas por bloque")
+    parser.add_argument("--sesiones", type=int, default=FACTURACION_SESIONES, help="Bloques en paralelo")
+    raise SystemExit(asyncio.run(_main(parser.parse_args())))
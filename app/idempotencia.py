@@ -0,0 +1,185 @@
+"""
+Claves de idempotencia para compras y pagos de cuotas
+
+Si el cliente reintenta `comprar-seguro` o `pagar-cuota` con el mismo header
+`Idempotency-Key`, recibe la respuesta guardada de la primera ejecución sin
+que se vuelva a cobrar ni se llame a `crud_sql`. La respuesta se guarda en la
+tabla `idempotencia` dentro de la misma transacción que el cobro, así que o
+se confirman los dos o ninguno. Se conserva IDEMPOTENCIA_TTL_HORAS y una
+caché en memoria evita ir a la base en los reintentos.
+
+Las peticiones concurrentes con la misma clave esperan, dentro del proceso, a
+que termine la primera. Entre procesos, la clave primaria hace fallar la
+segunda transacción, que responde 409 sin haber cobrado. Los errores (saldo
+insuficiente, 404) no se guardan: un reintento con la misma clave vuelve a
+ejecutarse.
+
+Uso en una ruta:
+    async with idempotencia.proteger(request, db_sql, datos) as peticion:
+        if peticion.respuesta is not None:
+            return peticion.respuesta
+        async with crud_sql.unidad_de_trabajo(db_sql):
+            ...
+            resultado = {...}
+            await peticion.guardar(resultado)
+    return resultado
+"""
+from fastapi import HTTPException, Request, Response
+from pydantic import BaseModel
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import database_sql
+from app.models_sql import IdempotenciaSQL
+from app.respuestas import a_json
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import os
+
+HEADER_IDEMPOTENCIA = "Idempotency-Key"
+HEADER_REPETIDA = "Idempotent-Replayed"
+
+# Configuración (desde variables de entorno)
+IDEMPOTENCIA_TTL_HORAS = float(os.getenv("IDEMPOTENCIA_TTL_HORAS", "24"))
+IDEMPOTENCIA_CACHE_MAX = int(os.getenv("IDEMPOTENCIA_CACHE_MAX", "10000"))
+IDEMPOTENCIA_PURGA_HORAS = float(os.getenv("IDEMPOTENCIA_PURGA_HORAS", "1"))
+
+LARGO_MAXIMO_CLAVE = 100
+
+_tabla = IdempotenciaSQL.__table__
+
+# clave -> (expira, huella, cuerpo JSON); las más viejas salen primero
+_cache: "OrderedDict[str, Tuple[datetime, str, bytes]]" = OrderedDict()
+# clave -> futuro que se resuelve cuando termina la petición que la está usando
+_en_curso: Dict[str, asyncio.Future] = {}
+
+
+def _huella(request: Request, datos: BaseModel) -> str:
+    """Identifica la petición: la misma clave con otro cuerpo o ruta es un error del cliente"""
+    contenido = f"{request.method} {request.url.path} {datos.model_dump_json()}"
+    return hashlib.sha256(contenido.encode()).hexdigest()
+
+
+def _recordar(clave: str, guardada: Tuple[datetime, str, bytes]):
+    _cache[clave] = guardada
+    _cache.move_to_end(clave)
+    while len(_cache) > IDEMPOTENCIA_CACHE_MAX:
+        _cache.popitem(last=False)
+
+
+async def _buscar(db: AsyncSession, clave: str) -> Optional[Tuple[datetime, str, bytes]]:
+    """Respuesta vigente para la clave: primero la caché, después la tabla"""
+    guardada = _cache.get(clave)
+    if guardada is None:
+        fila = (await db.execute(
+            select(_tabla.c.expira, _tabla.c.huella, _tabla.c.respuesta).where(_tabla.c.clave == clave)
+        )).first()
+        if fila is None:
+            return None
+        guardada = (fila.expira, fila.huella, fila.respuesta.encode())
+        _recordar(clave, guardada)
+    if guardada[0] <= datetime.now():
+        _cache.pop(clave, None)
+        return None
+    return guardada
+
+
+class PeticionIdempotente:
+    """Estado de una petición protegida por `proteger`"""
+
+    def __init__(self, db: AsyncSession, clave: Optional[str], huella: Optional[str]):
+        self._db = db
+        self.clave = clave
+        self.huella = huella
+        # Respuesta guardada de un intento anterior (None = ejecutar la operación)
+        self.respuesta: Optional[Response] = None
+        self._guardada: Optional[Tuple[datetime, str, bytes]] = None
+
+    async def guardar(self, contenido: dict):
+        """Guardar la respuesta en la transacción en curso (llamar dentro de la unidad de trabajo)"""
+        if self.clave is None:
+            return
+        ahora = datetime.now()
+        guardada = (ahora + timedelta(hours=IDEMPOTENCIA_TTL_HORAS), self.huella, a_json(contenido))
+        # Una fila vencida con la misma clave se reemplaza
+        await self._db.execute(delete(_tabla).where(_tabla.c.clave == self.clave, _tabla.c.expira <= ahora))
+        try:
+            await self._db.execute(insert(_tabla).values(
+                clave=self.clave, huella=self.huella, respuesta=guardada[2].decode(), expira=guardada[0]
+            ))
+        except IntegrityError:
+            # Otro proceso confirmó la misma clave: esta transacción se deshace sin cobrar
+            raise HTTPException(
+                status_code=409,
+                detail=f"Ya hay una petición con este {HEADER_IDEMPOTENCIA}; reintenta para obtener su respuesta"
+            )
+        self._guardada = guardada
+
+
+@asynccontextmanager
+async def proteger(request: Request, db: AsyncSession, datos: BaseModel) -> AsyncIterator[PeticionIdempotente]:
+    """
+    Ejecutar una operación de cobro a lo sumo una vez por `Idempotency-Key`
+
+    Sin el header no hace nada. Con una clave ya usada devuelve la respuesta
+    guardada en `peticion.respuesta`. Si la clave está en curso, espera a que
+    termine la otra petición.
+    """
+    clave = request.headers.get(HEADER_IDEMPOTENCIA)
+    if not clave:
+        yield PeticionIdempotente(db, None, None)
+        return
+    if len(clave) > LARGO_MAXIMO_CLAVE:
+        raise HTTPException(status_code=400, detail=f"{HEADER_IDEMPOTENCIA} admite hasta {LARGO_MAXIMO_CLAVE} caracteres")
+
+    peticion = PeticionIdempotente(db, clave, _huella(request, datos))
+    while True:
+        guardada = await _buscar(db, clave)
+        if guardada is not None:
+            if guardada[1] != peticion.huella:
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"El {HEADER_IDEMPOTENCIA} ya se usó con otra petición"
+                )
+            peticion.respuesta = Response(guardada[2], media_type="application/json", headers={HEADER_REPETIDA: "true"})
+            yield peticion
+            return
+        en_curso = _en_curso.get(clave)
+        if en_curso is None:
+            break
+        await en_curso
+
+    futuro = asyncio.get_running_loop().create_future()
+    _en_curso[clave] = futuro
+    try:
+        yield peticion
+        # Llegar aquí sin excepción significa que la unidad de trabajo ya confirmó
+        if peticion._guardada is not None:
+            _recordar(clave, peticion._guardada)
+    finally:
+        del _en_curso[clave]
+        futuro.set_result(None)
+
+
+async def purgar_vencidas() -> int:
+    """Borrar las claves vencidas; devuelve cuántas se borraron"""
+    async with database_sql.sesion_escritura() as db:
+        resultado = await db.execute(delete(_tabla).where(_tabla.c.expira <= datetime.now()))
+        await db.commit()
+    return resultado.rowcount
+
+
+async def purga_programada(intervalo_horas: float = IDEMPOTENCIA_PURGA_HORAS):
+    """Tarea de fondo que purga las claves vencidas cada `intervalo_horas`"""
+    while True:
+        try:
+            borradas = await purgar_vencidas()
+            if borradas:
+                print(f"🧹 Claves de idempotencia vencidas borradas: {borradas}")
+        except Exception as e:
+            print(f"⚠️  Error al purgar claves de idempotencia: {e}")
+        await asyncio.sleep(intervalo_horas * 3600)
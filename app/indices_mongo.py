@@ -0,0 +1,159 @@
+"""
+Índices declarados de MongoDB: se crean al arrancar y desde la línea de comandos
+
+Las consultas del catálogo filtran por `id` (`find_one({"id": ..., "activo": True})`,
+`$in` de la caché) y por `{activo, tipo}`; el listado ordena por
+`(fecha_creacion, id)`. Sin estos índices cada búsqueda recorre la colección.
+
+`asegurar` crea los que falten (create_index es idempotente) y reporta la
+deriva: índices declarados que faltan, que existen con otras opciones o que
+existen en la base sin estar declarados. No borra nada salvo que se pida.
+
+Uso desde la línea de comandos:
+    python -m app.indices_mongo              # crear los que falten y reportar
+    python -m app.indices_mongo --revisar    # solo reportar (sale con 1 si hay deriva)
+    python -m app.indices_mongo --reparar    # además recrear los distintos y borrar los sobrantes
+"""
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+from typing import Dict, List, Tuple
+import argparse
+import asyncio
+
+
+class IndiceMongo:
+    """Índice declarado: claves y si es único (el nombre es el que genera MongoDB)"""
+
+    def __init__(self, claves: List[Tuple[str, int]], unico: bool = False):
+        self.claves = claves
+        self.unico = unico
+        self.nombre = "_".join(f"{campo}_{direccion}" for campo, direccion in claves)
+
+    def modelo(self) -> IndexModel:
+        return IndexModel(self.claves, name=self.nombre, unique=self.unico)
+
+    def coincide(self, existente: dict) -> bool:
+        return list(existente["key"].items()) == self.claves and bool(existente.get("unique")) == self.unico
+
+
+# Índices por colección
+INDICES: Dict[str, List[IndiceMongo]] = {
+    "seguros": [
+        # El `id` propio de la app (el `_id` de MongoDB no se usa para buscar)
+        IndiceMongo([("id", 1)], unico=True),
+        # find({"activo": True, "tipo": ...})
+        IndiceMongo([("activo", 1), ("tipo", 1)]),
+        # Orden y paginación por cursor del catálogo
+        IndiceMongo([("activo", 1), ("fecha_creacion", 1), ("id", 1)]),
+    ],
+}
+
+
+class Deriva:
+    """Diferencia entre un índice declarado y lo que hay en la base"""
+
+    def __init__(self, coleccion: str, nombre: str, tipo: str, detalle: str = ""):
+        self.coleccion = coleccion
+        self.nombre = nombre
+        self.tipo = tipo  # "falta", "distinto", "sobrante" o "error"
+        self.detalle = detalle
+
+    def __str__(self):
+        return f"{self.coleccion}.{self.nombre}: {self.tipo}" + (f" ({self.detalle})" if self.detalle else "")
+
+
+async def _existentes(db: AsyncIOMotorDatabase, coleccion: str) -> Dict[str, dict]:
+    return {indice["name"]: indice async for indice in db[coleccion].list_indexes()}
+
+
+async def revisar(db: AsyncIOMotorDatabase) -> List[Deriva]:
+    """Comparar los índices declarados con los de la base (sin modificar nada)"""
+    derivas = []
+    for coleccion, declarados in INDICES.items():
+        existentes = await _existentes(db, coleccion)
+        for indice in declarados:
+            existente = existentes.get(indice.nombre)
+            if existente is None:
+                derivas.append(Deriva(coleccion, indice.nombre, "falta"))
+            elif not indice.coincide(existente):
+                derivas.append(Deriva(coleccion, indice.nombre, "distinto",
+                                      f"en la base: {dict(existente['key'])}, unique={bool(existente.get('unique'))}"))
+        nombres = {indice.nombre for indice in declarados}
+        for nombre in existentes:
+            if nombre != "_id_" and nombre not in nombres:
+                derivas.append(Deriva(coleccion, nombre, "sobrante"))
+    return derivas
+
+
+async def asegurar(db: AsyncIOMotorDatabase, reparar: bool = False) -> List[Deriva]:
+    """
+    Crear los índices que falten y devolver la deriva que queda
+
+    Con `reparar=True` también recrea los índices distintos y borra los
+    sobrantes. Un índice que no se puede crear (p. ej. `id` duplicados para
+    el índice único) se reporta como "error" en lugar de interrumpir el arranque.
+    """
+    pendientes = []
+    for deriva in await revisar(db):
+        declarados = {indice.nombre: indice for indice in INDICES[deriva.coleccion]}
+        coleccion = db[deriva.coleccion]
+        try:
+            if deriva.tipo == "falta":
+                await coleccion.create_indexes([declarados[deriva.nombre].modelo()])
+                print(f"✅ Índice creado: {deriva.coleccion}.{deriva.nombre}")
+                continue
+            if reparar and deriva.tipo == "distinto":
+                await coleccion.drop_index(deriva.nombre)
+                await coleccion.create_indexes([declarados[deriva.nombre].modelo()])
+                print(f"✅ Índice recreado: {deriva.coleccion}.{deriva.nombre}")
+                continue
+            if reparar and deriva.tipo == "sobrante":
+                await coleccion.drop_index(deriva.nombre)
+                print(f"🗑️  Índice borrado: {deriva.coleccion}.{deriva.nombre}")
+                continue
+        except OperationFailure as e:
+            deriva = Deriva(deriva.coleccion, deriva.nombre, "error", e.details.get("errmsg", str(e)) if e.details else str(e))
+        pendientes.append(deriva)
+    for deriva in pendientes:
+        print(f"⚠️  Deriva de índices: {deriva}")
+    return pendientes
+
+
+async def estadisticas_uso(db: AsyncIOMotorDatabase, coleccion: str) -> List[dict]:
+    """Uso de cada índice desde que arrancó el servidor (`$indexStats`)"""
+    estadisticas = []
+    async for fila in db[coleccion].aggregate([{"$indexStats": {}}]):
+        estadisticas.append({
+            "nombre": fila["name"],
+            "operaciones": fila["accesses"]["ops"],
+            "desde": fila["accesses"]["since"],
+        })
+    return sorted(estadisticas, key=lambda e: e["operaciones"], reverse=True)
+
+
+async def _main(args):
+    from app import database
+    if database.BACKEND_ALMACENAMIENTO == "sqlite":
+        print("ℹ️  Con BACKEND_ALMACENAMIENTO=sqlite no hay índices de MongoDB (los documentos se buscan por clave primaria)")
+        return 0
+    await database.connect_to_mongo()
+    try:
+        db = await database.get_db()
+        derivas = await revisar(db) if args.revisar else await asegurar(db, reparar=args.reparar)
+        if args.revisar:
+            for deriva in derivas:
+                print(f"⚠️  Deriva de índices: {deriva}")
+        if not derivas:
+            print("✅ Índices de MongoDB al día")
+        return 1 if derivas else 0
+    finally:
+        await database.close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crear y revisar los índices declarados de MongoDB")
+    modo = parser.add_mutually_exclusive_group()
+    modo.add_argument("--revisar", action="store_true", help="Solo reportar la deriva, sin crear nada")
+    modo.add_argument("--reparar", action="store_true", help="Recrear índices distintos y borrar los sobrantes")
+    raise SystemExit(asyncio.run(_main(parser.parse_args())))
@@ -0,0 +1,316 @@
+"""
+Métricas en formato de texto de Prometheus (`GET /metrics`)
+
+Se recolectan:
+- Latencia y cantidad de respuestas por ruta (middleware HTTP)
+- Pools de SQLAlchemy: conexiones en uso, overflow y tiempo de espera del checkout
+- Comandos de MongoDB: latencia por colección y comando (pymongo command monitoring)
+
+Registrar una observación es sumar a un contador bajo un lock, así que se puede
+dejar activo con carga completa. Los gauges de los pools se leen recién al
+momento del scrape.
+"""
+from pymongo import monitoring
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import bisect
+import os
+import threading
+import time
+
+# Configuración (desde variables de entorno)
+METRICAS_HABILITADAS = os.getenv("METRICAS_HABILITADAS", "1") != "0"
+
+BUCKETS_HTTP = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_POOL = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+BUCKETS_MONGO = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+Etiquetas = Tuple[str, ...]
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formato_etiquetas(nombres: Iterable[str], valores: Iterable[str], extra: str = "") -> str:
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Iterable[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+
+    def _cabecera(self) -> List[str]:
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+
+
+class Contador(_Metrica):
+    """Contador monótono con etiquetas"""
+    tipo = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._valores: Dict[Etiquetas, float] = {}
+
+    def inc(self, *valores: str, cantidad: float = 1):
+        with self._lock:
+            self._valores[valores] = self._valores.get(valores, 0) + cantidad
+
+    def exponer(self) -> List[str]:
+        with self._lock:
+            valores = list(self._valores.items())
+        return self._cabecera() + [
+            f"{self.nombre}{_formato_etiquetas(self.etiquetas, clave)} {_numero(v)}" for clave, v in valores
+        ]
+
+
+class Gauge(_Metrica):
+    """Valor instantáneo; `funcion` permite calcularlo al momento del scrape"""
+    tipo = "gauge"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Iterable[str] = (),
+                 funcion: Optional[Callable[[], Dict[Etiquetas, float]]] = None):
+        super().__init__(nombre, ayuda, etiquetas)
+        self._valores: Dict[Etiquetas, float] = {}
+        self._funcion = funcion
+
+    def set(self, valor: float, *valores: str):
+        with self._lock:
+            self._valores[valores] = valor
+
+    def exponer(self) -> List[str]:
+        if self._funcion is not None:
+            valores = list(self._funcion().items())
+        else:
+            with self._lock:
+                valores = list(self._valores.items())
+        return self._cabecera() + [
+            f"{self.nombre}{_formato_etiquetas(self.etiquetas, clave)} {_numero(v)}" for clave, v in valores
+        ]
+
+
+class Histograma(_Metrica):
+    """Histograma con buckets fijos; guarda conteos por bucket, suma y total"""
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Iterable[str] = (), buckets=BUCKETS_HTTP):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Etiquetas, list] = {}
+
+    def observar(self, valor: float, *valores: str):
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                # [conteos por bucket (+Inf al final), suma, total]
+                serie = self._series[valores] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def exponer(self) -> List[str]:
+        with self._lock:
+            series = [(clave, list(s[0]), s[1], s[2]) for clave, s in self._series.items()]
+        lineas = self._cabecera()
+        limites = self.buckets + (float("inf"),)
+        for clave, conteos, suma, total in series:
+            acumulado = 0
+            for limite, conteo in zip(limites, conteos):
+                acumulado += conteo
+                le = f'le="{_numero(limite)}"'
+                lineas.append(f"{self.nombre}_bucket{_formato_etiquetas(self.etiquetas, clave, le)} {acumulado}")
+            etiquetas = _formato_etiquetas(self.etiquetas, clave)
+            lineas.append(f"{self.nombre}_sum{etiquetas} {_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{etiquetas} {total}")
+        return lineas
+
+
+class Registro:
+    """Conjunto de métricas que se exponen juntas en /metrics"""
+
+    def __init__(self):
+        self._metricas: List[_Metrica] = []
+
+    def registrar(self, metrica: _Metrica) -> _Metrica:
+        self._metricas.append(metrica)
+        return metrica
+
+    def exponer(self) -> str:
+        lineas: List[str] = []
+        for metrica in self._metricas:
+            lineas.extend(metrica.exponer())
+        return "\n".join(lineas) + "\n"
+
+
+registro = Registro()
+
+# ==================== HTTP ====================
+
+http_duracion = registro.registrar(Histograma(
+    "http_request_duration_seconds", "Latencia de las peticiones HTTP por ruta",
+    ("method", "route"), BUCKETS_HTTP
+))
+http_respuestas = registro.registrar(Contador(
+    "http_responses_total", "Respuestas HTTP por ruta y código de estado",
+    ("method", "route", "status")
+))
+
+
+def plantilla_ruta(request) -> str:
+    """Plantilla de la ruta (`/api/v1/usuarios/{usuario_id}`) para no crear una serie por id"""
+    ruta = request.scope.get("route")
+    if ruta is None:
+        return "sin_ruta"
+    plantilla = getattr(ruta, "path_format", None) or ruta.path
+    # FastAPI no copia las rutas de un router incluido: su plantilla no trae el prefijo
+    # (`/api/v1`). El prefijo son los segmentos de la URL que sobran delante de la plantilla
+    if ":path}" in plantilla:
+        return plantilla
+    segmentos = request.scope["path"].split("/")
+    sobrantes = len(segmentos) - plantilla.count("/") - 1
+    if sobrantes <= 0:
+        return plantilla
+    return "/".join(segmentos[:sobrantes + 1]) + plantilla
+
+
+def observar_peticion(request, status: int, duracion: float):
+    ruta = plantilla_ruta(request)
+    http_duracion.observar(duracion, request.method, ruta)
+    http_respuestas.inc(request.method, ruta, str(status))
+
+
+# ==================== POOLS SQLALCHEMY ====================
+
+_engines: Dict[str, object] = {}
+
+pool_checkouts = registro.registrar(Contador(
+    "sqlalchemy_pool_checkouts_total", "Conexiones entregadas por el pool", ("pool",)
+))
+pool_conexiones_nuevas = registro.registrar(Contador(
+    "sqlalchemy_pool_connects_total", "Conexiones nuevas abiertas por el pool", ("pool",)
+))
+pool_espera = registro.registrar(Histograma(
+    "sqlalchemy_pool_wait_seconds", "Tiempo esperando una conexión libre del pool (sin abrir conexiones nuevas)",
+    ("pool",), BUCKETS_POOL
+))
+
+
+def _estado_pools(atributo: str) -> Callable[[], Dict[Etiquetas, float]]:
+    def leer():
+        valores = {}
+        for nombre, engine in _engines.items():
+            pool = engine.pool
+            metodo = getattr(pool, atributo, None)
+            if metodo is not None:
+                valores[(nombre,)] = metodo()
+        return valores
+    return leer
+
+
+registro.registrar(Gauge(
+    "sqlalchemy_pool_checked_out", "Conexiones en uso", ("pool",), _estado_pools("checkedout")
+))
+registro.registrar(Gauge(
+    "sqlalchemy_pool_overflow", "Conexiones por encima de pool_size (negativo: lugar libre en el pool)",
+    ("pool",), _estado_pools("overflow")
+))
+registro.registrar(Gauge(
+    "sqlalchemy_pool_size", "Tamaño configurado del pool", ("pool",), _estado_pools("size")
+))
+
+
+class PoolMedido(AsyncAdaptedQueuePool):
+    """
+    Pool que mide cuánto espera cada checkout por una conexión libre
+
+    Abrir una conexión nueva (overflow) no es espera: su duración se descuenta
+    y se ve aparte en `sqlalchemy_pool_connects_total`. Un checkout que falla
+    por timeout cuenta entero.
+    """
+
+    def _create_connection(self):
+        inicio = time.perf_counter()
+        registro = super()._create_connection()
+        registro._segundos_apertura = time.perf_counter() - inicio
+        return registro
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        apertura = 0.0
+        try:
+            registro = super()._do_get()
+            apertura = getattr(registro, "_segundos_apertura", 0.0)
+            registro._segundos_apertura = 0.0
+            return registro
+        finally:
+            pool_espera.observar(
+                max(0.0, time.perf_counter() - inicio - apertura), getattr(self, "_nombre_metricas", "sql")
+            )
+
+
+def instrumentar_engine(engine, nombre: str):
+    """Registrar el engine para los gauges y escuchar los eventos de su pool"""
+    _engines[nombre] = engine
+    pool = engine.sync_engine.pool
+    pool._nombre_metricas = nombre
+
+    @event.listens_for(pool, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        pool_checkouts.inc(nombre)
+
+    @event.listens_for(pool, "connect")
+    def _connect(dbapi_connection, connection_record):
+        pool_conexiones_nuevas.inc(nombre)
+
+
+# ==================== MONGODB ====================
+
+mongo_duracion = registro.registrar(Histograma(
+    "mongodb_command_duration_seconds", "Latencia de los comandos de MongoDB por colección",
+    ("collection", "command"), BUCKETS_MONGO
+))
+mongo_fallidos = registro.registrar(Contador(
+    "mongodb_command_failures_total", "Comandos de MongoDB fallidos", ("collection", "command")
+))
+
+
+class MonitorMongo(monitoring.CommandListener):
+    """Listener de pymongo; los eventos de éxito/fallo no traen la colección, se guarda al iniciar"""
+
+    def __init__(self):
+        self._colecciones: Dict[Tuple, str] = {}
+
+    def started(self, event):
+        comando = event.command
+        coleccion = comando.get("collection") if event.command_name == "getMore" else comando.get(event.command_name)
+        self._colecciones[(event.connection_id, event.request_id)] = (
+            coleccion if isinstance(coleccion, str) else ""
+        )
+
+    def succeeded(self, event):
+        coleccion = self._colecciones.pop((event.connection_id, event.request_id), "")
+        mongo_duracion.observar(event.duration_micros / 1_000_000, coleccion, event.command_name)
+
+    def failed(self, event):
+        coleccion = self._colecciones.pop((event.connection_id, event.request_id), "")
+        mongo_duracion.observar(event.duration_micros / 1_000_000, coleccion, event.command_name)
+        mongo_fallidos.inc(coleccion, event.command_name)
+
+
+monitor_mongo = MonitorMongo()
@@ -0,0 +1,192 @@
+"""
+Migraciones versionadas del esquema SQL
+
+Cada migración es una lista ordenada de pasos DDL. Las versiones aplicadas
+quedan registradas en la tabla `schema_migraciones`, así cada instancia
+aplica solo las que le faltan, en orden y una sola vez. En MySQL un
+GET_LOCK evita que dos procesos migren a la vez; en SQLite lo hace la cola
+de escritura.
+
+Los pasos son idempotentes (crean la tabla o el índice solo si falta), porque
+en MySQL el DDL confirma solo y una migración cortada a la mitad se vuelve a
+correr entera. En MySQL los índices se crean con DDL online de InnoDB
+(`ALGORITHM=INPLACE, LOCK=NONE`): la tabla sigue aceptando lecturas y
+escrituras mientras se construye el índice.
+
+`Base.metadata.create_all` se usa solo con una base vacía (desarrollo,
+benchmarks): crea el esquema completo y marca todas las migraciones como
+aplicadas.
+
+Uso desde la línea de comandos:
+    python -m app.migraciones            # aplicar las pendientes
+    python -m app.migraciones --estado   # listar aplicadas y pendientes
+"""
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, insert, inspect, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app import database_sql
+from app.database_sql import Base
+from app import models_sql  # noqa: F401  (registra los modelos en Base.metadata)
+from typing import Awaitable, Callable, Dict, List
+import argparse
+import asyncio
+import time
+
+# Segundos que un proceso espera a que otro termine de migrar (MySQL)
+MIGRACIONES_ESPERA_LOCK = 300
+_NOMBRE_LOCK = "schema_migraciones"
+
+_metadata = MetaData()
+
+schema_migraciones = Table(
+    "schema_migraciones", _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("nombre", String(100), nullable=False),
+    Column("aplicada", DateTime, server_default=func.now()),
+)
+
+Paso = Callable[[AsyncConnection], Awaitable[None]]
+
+
+class Migracion:
+    def __init__(self, version: int, nombre: str, *pasos: Paso):
+        self.version = version
+        self.nombre = nombre
+        self.pasos = pasos
+
+
+# ==================== PASOS ====================
+
+def crear_tablas(*nombres: str) -> Paso:
+    """Crear las tablas de los modelos que todavía no existan"""
+    async def paso(conn: AsyncConnection):
+        tablas = [Base.metadata.tables[nombre] for nombre in nombres]
+        await conn.run_sync(lambda c: Base.metadata.create_all(c, tables=tablas, checkfirst=True))
+    return paso
+
+
+def crear_indice(tabla: str, nombre: str, *columnas: str) -> Paso:
+    """Crear un índice si no existe (online en MySQL)"""
+    async def paso(conn: AsyncConnection):
+        existentes = await conn.run_sync(lambda c: {i["name"] for i in inspect(c).get_indexes(tabla)})
+        if nombre in existentes:
+            return
+        lista = ", ".join(columnas)
+        if conn.dialect.name == "mysql":
+            await conn.execute(text(f"ALTER TABLE {tabla} ADD INDEX {nombre} ({lista}), ALGORITHM=INPLACE, LOCK=NONE"))
+        else:
+            await conn.execute(text(f"CREATE INDEX {nombre} ON {tabla} ({lista})"))
+    return paso
+
+
+# ==================== MIGRACIONES ====================
+
+MIGRACIONES: List[Migracion] = [
+    # Tablas que antes creaba create_all en cada arranque (bases existentes las tienen)
+    Migracion(1, "esquema_inicial",
+              crear_tablas("usuarios", "seguros", "polizas", "pagos", "auditoria", "resumen_cuentas")),
+    Migracion(2, "idempotencia", crear_tablas("idempotencia")),
+    # Índices compuestos de las consultas más frecuentes
+    Migracion(3, "indices_compuestos",
+              # pólizas de un usuario ordenadas por fecha (dashboard, /polizas, próximos pagos)
+              crear_indice("polizas", "idx_polizas_usuario_fecha", "usuario_id", "fecha_inicio"),
+              # pólizas activas de un usuario (resúmenes, facturación)
+              crear_indice("polizas", "idx_polizas_usuario_estado", "usuario_id", "estado"),
+              # historial de pagos de una póliza
+              crear_indice("pagos", "idx_pagos_poliza_fecha", "poliza_id", "fecha_pago"),
+              # auditoría por tabla, más reciente primero
+              crear_indice("auditoria", "idx_auditoria_tabla_timestamp", "tabla_afectada", "timestamp")),
+    # Totales por usuario de los meses de pagos archivados (los usan los resúmenes)
+    Migracion(4, "pagos_archivados", crear_tablas("pagos_archivados")),
+    # Orden estable de la paginación por cursor de /usuarios/ (create_all no lo agrega a tablas existentes)
+    Migracion(5, "indice_usuarios_paginacion",
+              crear_indice("usuarios", "idx_activo_fecha_id", "activo", "fecha_registro", "id")),
+]
+
+assert all(a.version < b.version for a, b in zip(MIGRACIONES, MIGRACIONES[1:])), "Versiones fuera de orden"
+
+
+# ==================== EJECUCIÓN ====================
+
+async def _bloquear(conn: AsyncConnection):
+    if conn.dialect.name == "mysql":
+        obtenido = (await conn.execute(
+            text("SELECT GET_LOCK(:nombre, :espera)"), {"nombre": _NOMBRE_LOCK, "espera": MIGRACIONES_ESPERA_LOCK}
+        )).scalar()
+        if obtenido != 1:
+            raise RuntimeError(f"Otro proceso está migrando el esquema desde hace más de {MIGRACIONES_ESPERA_LOCK}s")
+
+
+async def _liberar(conn: AsyncConnection):
+    if conn.dialect.name == "mysql":
+        await conn.execute(text("SELECT RELEASE_LOCK(:nombre)"), {"nombre": _NOMBRE_LOCK})
+
+
+async def _aplicadas(conn: AsyncConnection) -> Dict[int, str]:
+    filas = await conn.execute(select(schema_migraciones.c.version, schema_migraciones.c.nombre))
+    return {fila.version: fila.nombre for fila in filas}
+
+
+async def migrar(engine_destino=None) -> List[Migracion]:
+    """Aplicar las migraciones pendientes; devuelve las que se aplicaron"""
+    engine_destino = engine_destino or database_sql.engine
+    aplicadas_ahora = []
+    async with database_sql.turno_escritura():
+        async with engine_destino.connect() as conn:
+            await _bloquear(conn)
+            try:
+                tablas = await conn.run_sync(lambda c: set(inspect(c).get_table_names()))
+                await conn.run_sync(_metadata.create_all)
+
+                # Base vacía: esquema completo de una vez y todas las migraciones marcadas
+                if not tablas & set(Base.metadata.tables):
+                    await conn.run_sync(Base.metadata.create_all)
+                    await conn.execute(insert(schema_migraciones), [
+                        {"version": m.version, "nombre": m.nombre} for m in MIGRACIONES
+                    ])
+                    await conn.commit()
+                    print(f"✅ Esquema creado desde cero (migraciones 1-{MIGRACIONES[-1].version} marcadas)")
+                    return list(MIGRACIONES)
+
+                aplicadas = await _aplicadas(conn)
+                await conn.commit()
+                for migracion in MIGRACIONES:
+                    if migracion.version in aplicadas:
+                        continue
+                    inicio = time.perf_counter()
+                    for paso in migracion.pasos:
+                        await paso(conn)
+                    await conn.execute(insert(schema_migraciones).values(version=migracion.version, nombre=migracion.nombre))
+                    await conn.commit()
+                    aplicadas_ahora.append(migracion)
+                    print(f"✅ Migración {migracion.version:03d} {migracion.nombre} aplicada "
+                          f"en {(time.perf_counter() - inicio) * 1000:.0f} ms")
+            finally:
+                await _liberar(conn)
+    return aplicadas_ahora
+
+
+async def estado(engine_destino=None) -> Dict[int, bool]:
+    """Versión -> aplicada o no"""
+    engine_destino = engine_destino or database_sql.engine
+    async with engine_destino.connect() as conn:
+        tablas = await conn.run_sync(lambda c: set(inspect(c).get_table_names()))
+        aplicadas = await _aplicadas(conn) if "schema_migraciones" in tablas else {}
+    return {migracion.version: migracion.version in aplicadas for migracion in MIGRACIONES}
+
+
+async def _main(args):
+    try:
+        if args.estado:
+            nombres = {m.version: m.nombre for m in MIGRACIONES}
+            for version, aplicada in (await estado()).items():
+                print(f"{'✅' if aplicada else '⏳'} {version:03d} {nombres[version]}")
+        elif not await migrar():
+            print("✅ Esquema al día, no hay migraciones pendientes")
+    finally:
+        await database_sql.close_db_sql()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aplicar las migraciones versionadas del esquema SQL")
+    parser.add_argument("--estado", action="store_true", help="Listar migraciones aplicadas y pendientes")
+    asyncio.run(_main(parser.parse_args()))
@@ -2,7 +2,7 @@
 Modelos SQLAlchemy para MySQL
 Define las tablas y relaciones del sistema de seguros
 """
-from sqlalchemy import Column, String, Numeric, Integer, Boolean, DateTime, Text, ForeignKey, Enum as SQLEnum, JSON
+from sqlalchemy import Column, String, Numeric, Integer, Boolean, DateTime, Text, ForeignKey, Index, Enum as SQLEnum, JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database_sql import Base
@@ -40,6 +40,12 @@ class UsuarioSQL(Base):
     polizas = relationship("PolizaSQL", back_populates="usuario", cascade="all, delete-orphan")
     pagos = relationship("PagoSQL", back_populates="usuario", cascade="all, delete-orphan")
     auditorias = relationship("AuditoriaSQL", back_populates="usuario")
+    resumen = relationship("ResumenCuentaSQL", back_populates="usuario", uselist=False, cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        # Orden estable para la paginación por cursor de /usuarios/
+        Index("idx_activo_fecha_id", "activo", "fecha_registro", "id"),
+    )
     
     def __repr__(self):
         return f"<Usuario(id={self.id}, nombre={self.nombre}, email={self.email})>"
@@ -91,6 +97,12 @@ class PolizaSQL(Base):
     seguro = relationship("SeguroSQL", back_populates="polizas")
     pagos = relationship("PagoSQL", back_populates="poliza", cascade="all, delete-orphan")
     
+    # Índices compuestos (migración 003)
+    __table_args__ = (
+        Index("idx_polizas_usuario_fecha", "usuario_id", "fecha_inicio"),
+        Index("idx_polizas_usuario_estado", "usuario_id", "estado"),
+    )
+    
     def __repr__(self):
         return f"<Poliza(id={self.id}, usuario_id={self.usuario_id}, estado={self.estado})>"
 
@@ -105,7 +117,7 @@ class PagoSQL(Base):
     poliza_id = Column(String(36), ForeignKey("polizas.id", ondelete="CASCADE"), nullable=False, index=True)
     usuario_id = Column(String(36), ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False, index=True)
     monto = Column(Numeric(10, 2), nullable=False)
-    fecha_pago = Column(DateTime, server_default=func.now(), index=True)
+    fecha_pago = Column(DateTime, server_default=func.now(), nullable=False, index=True)
     metodo_pago = Column(String(50), default="saldo")
     estado = Column(SQLEnum(EstadoPago), default=EstadoPago.COMPLETADO, index=True)
     numero_cuota = Column(Integer, nullable=False)
@@ -114,6 +126,10 @@ class PagoSQL(Base):
     poliza = relationship("PolizaSQL", back_populates="pagos")
     usuario = relationship("UsuarioSQL", back_populates="pagos")
     
+    __table_args__ = (
+        Index("idx_pagos_poliza_fecha", "poliza_id", "fecha_pago"),
+    )
+    
     def __repr__(self):
         return f"<Pago(id={self.id}, poliza_id={self.poliza_id}, monto={self.monto})>"
 
@@ -132,10 +148,68 @@ class AuditoriaSQL(Base):
     datos_anteriores = Column(JSON)
     datos_nuevos = Column(JSON)
     ip_address = Column(String(45))
-    timestamp = Column(DateTime, server_default=func.now(), index=True)
+    timestamp = Column(DateTime, server_default=func.now(), nullable=False, index=True)
     
     # Relaciones
     usuario = relationship("UsuarioSQL", back_populates="auditorias")
     
+    __table_args__ = (
+        Index("idx_auditoria_tabla_timestamp", "tabla_afectada", "timestamp"),
+    )
+    
     def __repr__(self):
         return f"<Auditoria(id={self.id}, accion={self.accion}, tabla={self.tabla_afectada})>"
+
+
+# ============================================
+# Modelo: Resumen de cuenta
+# ============================================
+class ResumenCuentaSQL(Base):
+    """Totales por usuario, mantenidos en la misma transacción que compras y pagos"""
+    __tablename__ = "resumen_cuentas"
+    
+    usuario_id = Column(String(36), ForeignKey("usuarios.id", ondelete="CASCADE"), primary_key=True)
+    polizas_activas = Column(Integer, nullable=False, default=0)
+    total_pagado = Column(Numeric(12, 2), nullable=False, default=0)
+    cuotas_pendientes = Column(Integer, nullable=False, default=0)
+    proximo_monto = Column(Numeric(10, 2), nullable=False, default=0)
+    actualizado = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    
+    # Relaciones
+    usuario = relationship("UsuarioSQL", back_populates="resumen")
+    
+    def __repr__(self):
+        return f"<ResumenCuenta(usuario_id={self.usuario_id}, polizas_activas={self.polizas_activas})>"
+
+
+# ============================================
+# Modelo: Claves de idempotencia
+# ============================================
+class IdempotenciaSQL(Base):
+    """Respuesta guardada de una compra/pago por `Idempotency-Key` (se purga al vencer)"""
+    __tablename__ = "idempotencia"
+    
+    clave = Column(String(100), primary_key=True)
+    huella = Column(String(64), nullable=False)  # sha256 de método, ruta y cuerpo de la petición
+    respuesta = Column(Text, nullable=False)
+    creado = Column(DateTime, server_default=func.now())
+    expira = Column(DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f"<Idempotencia(clave={self.clave}, expira={self.expira})>"
+
+
+# ============================================
+# Modelo: Totales de pagos archivados
+# ============================================
+class PagoArchivadoSQL(Base):
+    """Pagos completados de un usuario en un mes ya archivado (ver `app.particiones`)"""
+    __tablename__ = "pagos_archivados"
+    
+    usuario_id = Column(String(36), ForeignKey("usuarios.id", ondelete="CASCADE"), primary_key=True)
+    hasta = Column(DateTime, primary_key=True)  # fin (exclusivo) del mes archivado
+    total = Column(Numeric(12, 2), nullable=False, default=0)
+    pagos = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<PagoArchivado(usuario_id={self.usuario_id}, hasta={self.hasta}, total={self.total})>"
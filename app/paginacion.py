@@ -0,0 +1,38 @@
+"""
+Paginación por cursor (keyset)
+
+El cursor es un token opaco que codifica la clave de orden del último
+elemento de la página, p. ej. `(fecha_registro, id)`. La siguiente página se
+pide con `WHERE clave > cursor`, que usa el índice en lugar de recorrer y
+descartar todas las filas anteriores como hace `OFFSET`.
+"""
+from datetime import datetime
+from typing import Any, Tuple
+import base64
+import json
+
+# Header con el cursor de la siguiente página
+HEADER_SIGUIENTE_CURSOR = "X-Siguiente-Cursor"
+
+
+def codificar_cursor(fecha: datetime, id: str) -> str:
+    """Crear el token opaco para la clave `(fecha, id)`"""
+    crudo = json.dumps([fecha.isoformat() if fecha else None, id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Recuperar la clave `(fecha, id)`; lanza ValueError si el token no es válido"""
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        fecha, id = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return (datetime.fromisoformat(fecha) if fecha else datetime.min), str(id)
+    except Exception as e:
+        raise ValueError("Cursor de paginación inválido") from e
+
+
+def cursor_siguiente(pagina: list, limit: int, clave: Any) -> str:
+    """Cursor de la página siguiente, o cadena vacía si esta fue la última"""
+    if not pagina or len(pagina) < limit:
+        return ""
+    return codificar_cursor(*clave(pagina[-1]))
@@ -0,0 +1,388 @@
+"""
+Particionado mensual de `pagos` y `auditoria` y archivado de los meses cerrados
+
+Las dos tablas solo reciben inserciones y crecen sin límite. En MySQL se
+particionan por rango mensual de la fecha (`fecha_pago`, `timestamp`): una
+partición `pAAAAMM` por mes más `pfuturo` para lo que todavía no tiene la
+suya. Las consultas con cota de fecha (la ventana caliente del historial, ver
+`inicio_ventana_caliente`) leen solo las particiones de ese rango, y sacar un
+mes de la base es un DROP PARTITION instantáneo en lugar de un DELETE fila
+por fila.
+
+MySQL exige que la columna de partición esté en la clave primaria y no admite
+claves foráneas en tablas particionadas. `particionar` cambia la clave
+primaria a `(id, fecha)` y quita las claves foráneas de estas dos tablas; las
+relaciones del ORM no cambian. Es un ALTER que copia la tabla entera y
+bloquea sus escrituras mientras dura, así que no forma parte de las
+migraciones del arranque: se corre una vez a mano, en una ventana de
+mantenimiento. Hasta entonces todo funciona igual, sin particiones nativas.
+
+En SQLite no hay particiones: cada mes es un rango sobre el índice de la
+fecha y archivarlo borra ese rango dentro del turno de escritura.
+
+Archivar exporta cada mes más viejo que la retención a
+`ARCHIVO_DIR/<tabla>/<tabla>_AAAAMM.ndjson.gz`, comprueba que el archivo tenga
+todas las filas del mes y recién entonces lo elimina de la base. De los pagos
+queda antes el total por usuario del mes en `pagos_archivados`, para que
+reconstruir o verificar los resúmenes de cuenta siga dando lo mismo.
+
+Uso desde la línea de comandos:
+    python -m app.particiones estado
+    python -m app.particiones particionar           # una sola vez por base (MySQL)
+    python -m app.particiones preparar              # particiones de los próximos meses
+    python -m app.particiones archivar [--simular]  # exportar y eliminar los meses vencidos
+"""
+from sqlalchemy import Table, delete, func, insert, inspect, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app import database_sql, exportacion
+from app.models_sql import PagoSQL, PagoArchivadoSQL, AuditoriaSQL, EstadoPago
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+import argparse
+import asyncio
+import gzip
+import os
+import time
+
+# Configuración (desde variables de entorno)
+ARCHIVO_DIR = Path(os.getenv("ARCHIVO_DIR", "archivo"))
+# Meses cerrados que se conservan en la base (0 = no archivar nunca)
+RETENCION_PAGOS_MESES = int(os.getenv("RETENCION_PAGOS_MESES", "24"))
+RETENCION_AUDITORIA_MESES = int(os.getenv("RETENCION_AUDITORIA_MESES", "12"))
+# Particiones que se crean por adelantado (MySQL)
+PARTICIONES_ADELANTE = int(os.getenv("PARTICIONES_ADELANTE", "3"))
+# Meses (contando el actual) que leen por defecto las consultas de historial
+HISTORIAL_MESES_CALIENTES = int(os.getenv("HISTORIAL_MESES_CALIENTES", "12"))
+
+PARTICION_FUTURO = "pfuturo"
+
+
+def inicio_de_mes(fecha: datetime, meses_atras: int = 0) -> datetime:
+    """Primer instante del mes de `fecha` desplazado `meses_atras` (negativo = hacia adelante)"""
+    indice = fecha.year * 12 + fecha.month - 1 - meses_atras
+    return datetime(indice // 12, indice % 12 + 1, 1)
+
+
+def inicio_ventana_caliente(meses: int = HISTORIAL_MESES_CALIENTES) -> datetime:
+    """Cota inferior del historial reciente: el mes actual y los `meses - 1` anteriores"""
+    return inicio_de_mes(datetime.now(), meses - 1)
+
+
+class TablaParticionada:
+    """Tabla particionada por mes: columna de fecha, retención y exportación"""
+
+    def __init__(
+        self,
+        tabla: Table,
+        columna: str,
+        retencion_meses: int,
+        exportar: Callable[..., AsyncIterator[bytes]],
+        antes_de_eliminar: Optional[Callable[["Particion"], Awaitable[None]]] = None
+    ):
+        self.tabla = tabla
+        self.nombre = tabla.name
+        self.columna = tabla.c[columna]
+        self.retencion_meses = retencion_meses
+        self.exportar = exportar
+        # Lo que hay que conservar de un mes antes de sacarlo de la base
+        self.antes_de_eliminar = antes_de_eliminar
+
+    def corte(self) -> datetime:
+        """Los meses que terminan antes de esta fecha se archivan"""
+        return inicio_de_mes(datetime.now(), self.retencion_meses)
+
+
+class Particion:
+    """Rango de un mes `[desde, hasta)`; `nativa` si es una partición de MySQL"""
+
+    def __init__(self, nombre: str, desde: Optional[datetime], hasta: Optional[datetime], nativa: bool):
+        self.nombre = nombre
+        self.desde = desde  # None: la primera partición nativa (sin cota inferior)
+        self.hasta = hasta  # None: `pfuturo`
+        self.nativa = nativa
+
+
+# ==================== PARTICIONES ====================
+
+def _definicion_meses(desde: datetime, hasta: datetime) -> List[str]:
+    """Cláusulas PARTITION de los meses `desde`..`hasta` (inclusive)"""
+    partes = []
+    mes = desde
+    while mes <= hasta:
+        siguiente = inicio_de_mes(mes, -1)
+        partes.append(f"PARTITION p{mes:%Y%m} VALUES LESS THAN ('{siguiente:%Y-%m-%d}')")
+        mes = siguiente
+    return partes
+
+
+async def _particiones_mysql(conn: AsyncConnection, tabla: TablaParticionada) -> List[Particion]:
+    filas = await conn.execute(text(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :tabla AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION"
+    ), {"tabla": tabla.nombre})
+    particiones = []
+    desde = None
+    for nombre, descripcion in filas:
+        hasta = None if descripcion == "MAXVALUE" else datetime.fromisoformat(descripcion.strip("'"))
+        particiones.append(Particion(nombre, desde, hasta, nativa=True))
+        desde = hasta
+    return particiones
+
+
+async def listar(conn: AsyncConnection, tabla: TablaParticionada) -> List[Particion]:
+    """Particiones de la tabla; sin particiones nativas, un rango por mes con datos hasta el actual"""
+    if conn.dialect.name == "mysql":
+        particiones = await _particiones_mysql(conn, tabla)
+        if particiones:
+            return particiones
+    minimo = (await conn.execute(select(func.min(tabla.columna)))).scalar()
+    if minimo is None:
+        return []
+    particiones = []
+    mes = inicio_de_mes(minimo)
+    actual = inicio_de_mes(datetime.now())
+    while mes <= actual:
+        siguiente = inicio_de_mes(mes, -1)
+        particiones.append(Particion(f"p{mes:%Y%m}", mes, siguiente, nativa=False))
+        mes = siguiente
+    return particiones
+
+
+async def particionar(conn: AsyncConnection, tabla: TablaParticionada):
+    """
+    Convertir la tabla en particionada por mes (MySQL; no hace nada si ya lo está)
+
+    Quita las claves foráneas, hace la fecha NOT NULL y parte de la clave
+    primaria, y crea una partición por mes desde la fila más vieja hasta
+    PARTICIONES_ADELANTE meses adelante.
+    """
+    if conn.dialect.name != "mysql" or await _particiones_mysql(conn, tabla):
+        return
+    nombre, columna = tabla.nombre, tabla.columna.name
+    foraneas = await conn.run_sync(lambda c: inspect(c).get_foreign_keys(nombre))
+    for foranea in foraneas:
+        await conn.execute(text(f"ALTER TABLE {nombre} DROP FOREIGN KEY {foranea['name']}"))
+    await conn.execute(text(f"UPDATE {nombre} SET `{columna}` = CURRENT_TIMESTAMP WHERE `{columna}` IS NULL"))
+    await conn.execute(text(
+        f"ALTER TABLE {nombre} MODIFY `{columna}` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+        f"DROP PRIMARY KEY, ADD PRIMARY KEY (id, `{columna}`)"
+    ))
+    ahora = datetime.now()
+    minimo = (await conn.execute(select(func.min(tabla.columna)))).scalar()
+    meses = _definicion_meses(inicio_de_mes(minimo or ahora), inicio_de_mes(ahora, -PARTICIONES_ADELANTE))
+    meses.append(f"PARTITION {PARTICION_FUTURO} VALUES LESS THAN (MAXVALUE)")
+    await conn.execute(text(f"ALTER TABLE {nombre} PARTITION BY RANGE COLUMNS(`{columna}`) ({', '.join(meses)})"))
+
+
+async def particionar_tablas(engine_destino=None):
+    """Particionar todas las tablas de `TABLAS` que todavía no lo estén (MySQL)"""
+    engine_destino = engine_destino or database_sql.engine
+    if engine_destino.dialect.name != "mysql":
+        print("ℹ️  Solo MySQL tiene particiones nativas; en SQLite los meses son rangos de fechas")
+        return
+    async with database_sql.turno_escritura():
+        async with engine_destino.connect() as conn:
+            for tabla in TABLAS.values():
+                if await _particiones_mysql(conn, tabla):
+                    print(f"✅ {tabla.nombre} ya está particionada")
+                    continue
+                inicio = time.perf_counter()
+                await particionar(conn, tabla)
+                await conn.commit()
+                print(f"✅ {tabla.nombre} particionada por mes en {time.perf_counter() - inicio:.1f} s")
+
+
+async def preparar(engine_destino=None) -> Dict[str, List[str]]:
+    """
+    Crear las particiones de los próximos PARTICIONES_ADELANTE meses
+
+    Parte `pfuturo` (normalmente vacía) con REORGANIZE PARTITION. En SQLite o
+    con tablas sin particionar no hace nada. Devuelve las creadas por tabla.
+    """
+    engine_destino = engine_destino or database_sql.engine
+    creadas: Dict[str, List[str]] = {}
+    if engine_destino.dialect.name != "mysql":
+        return creadas
+    async with engine_destino.connect() as conn:
+        for tabla in TABLAS.values():
+            particiones = await _particiones_mysql(conn, tabla)
+            ultimo = max((p.hasta for p in particiones if p.hasta is not None), default=None)
+            if ultimo is None:
+                continue
+            meses = _definicion_meses(ultimo, inicio_de_mes(datetime.now(), -PARTICIONES_ADELANTE))
+            if not meses:
+                continue
+            meses.append(f"PARTITION {PARTICION_FUTURO} VALUES LESS THAN (MAXVALUE)")
+            await conn.execute(text(
+                f"ALTER TABLE {tabla.nombre} REORGANIZE PARTITION {PARTICION_FUTURO} INTO ({', '.join(meses)})"
+            ))
+            creadas[tabla.nombre] = [parte.split()[1] for parte in meses[:-1]]
+            print(f"✅ Particiones creadas en {tabla.nombre}: {', '.join(creadas[tabla.nombre])}")
+    return creadas
+
+
+# ==================== ARCHIVADO ====================
+
+def _rango(tabla: TablaParticionada, particion: Particion):
+    condiciones = [tabla.columna < particion.hasta]
+    if particion.desde is not None:
+        condiciones.append(tabla.columna >= particion.desde)
+    return condiciones
+
+
+async def _contar(conn: AsyncConnection, tabla: TablaParticionada, particion: Particion) -> int:
+    return (await conn.execute(select(func.count()).select_from(tabla.tabla).where(*_rango(tabla, particion)))).scalar()
+
+
+def ruta_archivo(tabla: TablaParticionada, particion: Particion) -> Path:
+    return ARCHIVO_DIR / tabla.nombre / f"{tabla.nombre}_{particion.nombre[1:]}.ndjson.gz"
+
+
+async def _exportar(tabla: TablaParticionada, particion: Particion) -> int:
+    """Escribir el mes a su archivo NDJSON comprimido; devuelve las filas escritas"""
+    destino = ruta_archivo(tabla, particion)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    temporal = destino.with_name(destino.name + ".tmp")
+    filas = 0
+    # Se lee del primario: en la réplica podrían faltar las últimas filas del mes
+    with gzip.open(temporal, "wb") as archivo:
+        async for bloque in tabla.exportar("ndjson", particion.desde, particion.hasta, primario=True):
+            archivo.write(bloque)
+            filas += bloque.count(b"\n")
+    os.replace(temporal, destino)
+    return filas
+
+
+async def _guardar_totales_pagos(particion: Particion):
+    """
+    Guardar en `pagos_archivados` lo pagado por cada usuario en el mes
+
+    Los resúmenes de cuenta suman estos totales en lugar de los pagos ya
+    archivados (ver `crud_sql.calcular_resumenes_sql`). Reemplaza los del
+    mismo mes, así que repetir el archivado no suma dos veces.
+    """
+    _pagos = PagoSQL.__table__
+    _archivados = PagoArchivadoSQL.__table__
+    async with database_sql.sesion_escritura() as db:
+        totales = await db.execute(
+            select(_pagos.c.usuario_id, func.sum(_pagos.c.monto), func.count())
+            .where(*_rango(TABLAS["pagos"], particion), _pagos.c.estado == EstadoPago.COMPLETADO)
+            .group_by(_pagos.c.usuario_id)
+        )
+        filas = [
+            {"usuario_id": usuario_id, "hasta": particion.hasta, "total": total, "pagos": cantidad}
+            for usuario_id, total, cantidad in totales.all()
+        ]
+        await db.execute(delete(_archivados).where(_archivados.c.hasta == particion.hasta))
+        if filas:
+            await db.execute(insert(_archivados), filas)
+        await db.commit()
+
+
+async def _eliminar(tabla: TablaParticionada, particion: Particion):
+    if particion.nativa:
+        async with database_sql.engine.connect() as conn:
+            await conn.execute(text(f"ALTER TABLE {tabla.nombre} DROP PARTITION {particion.nombre}"))
+        return
+    async with database_sql.sesion_escritura() as db:
+        await db.execute(delete(tabla.tabla).where(*_rango(tabla, particion)))
+        await db.commit()
+
+
+async def archivar(simular: bool = False) -> Dict[str, List[Path]]:
+    """
+    Exportar y eliminar los meses más viejos que la retención de cada tabla
+
+    Un mes se elimina solo si su archivo tiene tantas filas como la base; si
+    no coinciden se interrumpe sin tocar la base. Con `simular=True` solo
+    informa qué meses archivaría. Devuelve los archivos escritos por tabla.
+    """
+    archivados: Dict[str, List[Path]] = {}
+    for tabla in TABLAS.values():
+        if tabla.retencion_meses <= 0:
+            continue
+        corte = tabla.corte()
+        async with database_sql.engine.connect() as conn:
+            vencidas = [p for p in await listar(conn, tabla) if p.hasta is not None and p.hasta <= corte]
+        for particion in vencidas:
+            destino = ruta_archivo(tabla, particion)
+            async with database_sql.engine.connect() as conn:
+                esperadas = await _contar(conn, tabla, particion)
+            if not esperadas and not particion.nativa:
+                continue
+            if simular:
+                print(f"🔎 {tabla.nombre}.{particion.nombre}: {esperadas} filas -> {destino}")
+                continue
+            escritas = await _exportar(tabla, particion) if esperadas else 0
+            if escritas != esperadas:
+                raise RuntimeError(
+                    f"{tabla.nombre}.{particion.nombre}: el archivo tiene {escritas} filas y la base {esperadas}; "
+                    f"no se eliminó nada"
+                )
+            if tabla.antes_de_eliminar is not None:
+                await tabla.antes_de_eliminar(particion)
+            await _eliminar(tabla, particion)
+            if escritas:
+                archivados.setdefault(tabla.nombre, []).append(destino)
+            print(f"📦 {tabla.nombre}.{particion.nombre}: {escritas} filas archivadas"
+                  + (f" en {destino}" if escritas else ""))
+    return archivados
+
+
+TABLAS: Dict[str, TablaParticionada] = {
+    "pagos": TablaParticionada(
+        PagoSQL.__table__, "fecha_pago", RETENCION_PAGOS_MESES, exportacion.exportar_pagos,
+        antes_de_eliminar=_guardar_totales_pagos
+    ),
+    "auditoria": TablaParticionada(AuditoriaSQL.__table__, "timestamp", RETENCION_AUDITORIA_MESES, exportacion.exportar_auditoria),
+}
+
+
+async def estado() -> Dict[str, List[dict]]:
+    """Particiones de cada tabla con sus filas y si ya pasaron la retención"""
+    resultado: Dict[str, List[dict]] = {}
+    async with database_sql.engine.connect() as conn:
+        for tabla in TABLAS.values():
+            corte = tabla.corte()
+            resultado[tabla.nombre] = [
+                {
+                    "particion": particion.nombre,
+                    "nativa": particion.nativa,
+                    "desde": particion.desde,
+                    "hasta": particion.hasta,
+                    "filas": await _contar(conn, tabla, particion) if particion.hasta else None,
+                    "archivable": tabla.retencion_meses > 0 and particion.hasta is not None and particion.hasta <= corte,
+                }
+                for particion in await listar(conn, tabla)
+            ]
+    return resultado
+
+
+async def _main(args):
+    try:
+        if args.comando == "particionar":
+            await particionar_tablas()
+        elif args.comando == "preparar":
+            if not await preparar():
+                print("✅ Particiones al día")
+        elif args.comando == "archivar":
+            if not await archivar(simular=args.simular) and not args.simular:
+                print("✅ No hay meses para archivar")
+        else:
+            for nombre, particiones in (await estado()).items():
+                print(f"📊 {nombre} (retención: {TABLAS[nombre].retencion_meses} meses)")
+                for p in particiones:
+                    filas = "-" if p["filas"] is None else p["filas"]
+                    print(f"   {'📦' if p['archivable'] else '✅'} {p['particion']:<10} filas: {filas}"
+                          f"{'' if p['nativa'] else '  (rango, sin partición nativa)'}")
+    finally:
+        await database_sql.close_db_sql()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Particiones mensuales y archivado de pagos y auditoría")
+    parser.add_argument("comando", nargs="?", default="estado", choices=["estado", "particionar", "preparar", "archivar"])
+    parser.add_argument("--simular", action="store_true", help="Con `archivar`: solo listar los meses que se archivarían")
+    asyncio.run(_main(parser.parse_args()))
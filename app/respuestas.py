@@ -0,0 +1,63 @@
+"""
+Serialización rápida de respuestas
+
+`RespuestaJSON` codifica con orjson (si está instalado) y es la clase de
+respuesta por defecto de la app. Las rutas que ya arman datos confiables
+(filas de SQLAlchemy, documentos del catálogo en caché) devuelven una
+`RespuestaJSON` directamente: FastAPI no vuelve a validar contra el
+`response_model` ni pasa el contenido por `jsonable_encoder`. El
+`response_model` se mantiene para la documentación de OpenAPI.
+"""
+from fastapi.responses import JSONResponse
+from app import schemas
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Mapping
+import enum
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - sin orjson se usa json de la stdlib
+    orjson = None
+
+# Campos públicos de cada schema: se copian tal cual, sin construir el modelo
+CAMPOS_USUARIO = tuple(schemas.Usuario.model_fields)
+CAMPOS_SEGURO = tuple(schemas.Seguro.model_fields)
+
+
+def _por_defecto(valor: Any):
+    """Tipos que ni orjson ni json serializan solos"""
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, enum.Enum):
+        return valor.value
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+
+def a_json(contenido: Any) -> bytes:
+    """Codificar a bytes JSON (orjson si está disponible)"""
+    if orjson is not None:
+        return orjson.dumps(contenido, default=_por_defecto, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(contenido, default=_por_defecto, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class RespuestaJSON(JSONResponse):
+    """JSONResponse codificada con orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return a_json(content)
+
+
+def usuario_a_dict(usuario: Any) -> dict:
+    """Usuario ORM (o fila) con los campos de `schemas.Usuario`"""
+    if isinstance(usuario, Mapping):
+        return {campo: usuario[campo] for campo in CAMPOS_USUARIO}
+    return {campo: getattr(usuario, campo) for campo in CAMPOS_USUARIO}
+
+
+def seguro_publico(documento: dict) -> dict:
+    """Documento del catálogo con los campos de `schemas.Seguro` (sin `_id` ni extras)"""
+    return {campo: documento.get(campo) for campo in CAMPOS_SEGURO}
@@ -0,0 +1,106 @@
+"""
+Reconstrucción y verificación de los resúmenes de cuenta (`resumen_cuentas`)
+
+Los resúmenes se mantienen de forma incremental en `crud_sql`; este módulo
+los recalcula desde el historial completo de pólizas y pagos, por bloques
+de usuarios, para cargarlos por primera vez o detectar diferencias.
+
+Uso desde la línea de comandos:
+    python -m app.resumen_cuentas --reconstruir
+    python -m app.resumen_cuentas --verificar
+"""
+from sqlalchemy import select
+from app import database_sql, crud_sql
+from app.models_sql import UsuarioSQL, ResumenCuentaSQL
+from decimal import Decimal
+from typing import AsyncIterator, List
+import argparse
+import asyncio
+
+RESUMEN_TAM_LOTE = 1000
+
+CAMPOS = ("polizas_activas", "total_pagado", "cuotas_pendientes", "proximo_monto")
+
+
+async def _bloques_usuarios(tam_lote: int) -> AsyncIterator[List[str]]:
+    """Recorrer los IDs de usuario por bloques (paginación por cursor sobre id)"""
+    ultimo = ""
+    while True:
+        async with database_sql.AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(UsuarioSQL.id).where(UsuarioSQL.id > ultimo).order_by(UsuarioSQL.id).limit(tam_lote)
+            )
+            ids = result.scalars().all()
+        if not ids:
+            return
+        yield ids
+        ultimo = ids[-1]
+
+
+async def reconstruir_resumenes(tam_lote: int = RESUMEN_TAM_LOTE) -> int:
+    """Recalcular y guardar el resumen de todos los usuarios; devuelve cuántos se escribieron"""
+    total = 0
+    async for ids in _bloques_usuarios(tam_lote):
+        async with database_sql.sesion_escritura() as db:
+            async with crud_sql.unidad_de_trabajo(db):
+                # Bloquear primero: una compra o pago que confirme después del cálculo
+                # se perdería al reemplazar la fila
+                await crud_sql.bloquear_resumenes_sql(db, ids)
+                await crud_sql.guardar_resumenes_sql(db, await crud_sql.calcular_resumenes_sql(db, ids))
+        total += len(ids)
+    return total
+
+
+async def verificar_resumenes(tam_lote: int = RESUMEN_TAM_LOTE) -> List[dict]:
+    """Comparar los resúmenes guardados con el historial; devuelve las diferencias"""
+    diferencias = []
+    async for ids in _bloques_usuarios(tam_lote):
+        async with database_sql.AsyncSessionLocal() as db:
+            esperados = await crud_sql.calcular_resumenes_sql(db, ids)
+            result = await db.execute(
+                select(ResumenCuentaSQL).where(ResumenCuentaSQL.usuario_id.in_(ids))
+            )
+            guardados = {r.usuario_id: r for r in result.scalars().all()}
+        for usuario_id, esperado in esperados.items():
+            guardado = guardados.get(usuario_id)
+            if guardado is None:
+                diferencias.append({"usuario_id": usuario_id, "campo": "resumen", "guardado": None, "esperado": "faltante"})
+                continue
+            for campo in CAMPOS:
+                valor = getattr(guardado, campo)
+                if Decimal(str(valor)) != Decimal(str(esperado[campo])):
+                    diferencias.append({
+                        "usuario_id": usuario_id,
+                        "campo": campo,
+                        "guardado": float(valor),
+                        "esperado": float(esperado[campo])
+                    })
+    return diferencias
+
+
+async def _main(args):
+    try:
+        if args.reconstruir:
+            total = await reconstruir_resumenes(args.lote)
+            print(f"✅ Resúmenes reconstruidos: {total} usuarios")
+        else:
+            diferencias = await verificar_resumenes(args.lote)
+            for d in diferencias:
+                print(f"   • {d['usuario_id']} {d['campo']}: guardado={d['guardado']} esperado={d['esperado']}")
+            if diferencias:
+                print(f"❌ {len(diferencias)} diferencias encontradas")
+            else:
+                print("✅ Todos los resúmenes coinciden con el historial")
+            return 1 if diferencias else 0
+    finally:
+        await database_sql.close_db_sql()
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstruir o verificar los resúmenes de cuenta")
+    grupo = parser.add_mutually_exclusive_group(required=True)
+    grupo.add_argument("--reconstruir", action="store_true", help="Recalcular todos los resúmenes")
+    grupo.add_argument("--verificar", action="store_true", help="Comparar los resúmenes con el historial")
+    parser.add_argument("--lote", type=int, default=RESUMEN_TAM_LOTE, help="Usuarios por bloque")
+    raise SystemExit(asyncio.run(_main(parser.parse_args())))
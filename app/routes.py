@@ -1,30 +1,90 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Optional
+from typing import Callable, List, Optional
+from datetime import datetime
+import asyncio
+import os
 from . import crud, models, schemas, database
-from . import crud_sql, database_sql
+from . import crud_sql, database_sql, auditoria_async, paginacion, exportacion, idempotencia
+from .respuestas import RespuestaJSON, usuario_a_dict, seguro_publico
+from .catalogo_cache import catalogo_cache, resolver_seguros, clave_seguro
 
 router = APIRouter()
 
+# Cache-Control de las respuestas del catálogo (se revalidan con ETag / If-None-Match)
+CATALOGO_CACHE_CONTROL = os.getenv("CATALOGO_CACHE_CONTROL", "public, max-age=30, must-revalidate")
+
+
+def _leer_cursor(cursor: Optional[str]):
+    """Decodificar el parámetro `cursor` o responder 400"""
+    if not cursor:
+        return None
+    try:
+        return paginacion.decodificar_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _etag_coincide(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparación débil de If-None-Match (lista separada por comas, `*`, prefijo W/)"""
+    if not if_none_match:
+        return False
+    candidatos = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidatos or etag in (c[2:] if c.startswith("W/") else c for c in candidatos)
+
+
+async def _respuesta_catalogo(request: Request, db: AsyncIOMotorDatabase, clave, construir: Callable) -> Response:
+    """
+    Respuesta del catálogo con ETag y Cache-Control
+
+    Si el cliente ya tiene la versión vigente responde 304 sin cuerpo; si no,
+    usa el cuerpo ya serializado para esta copia del catálogo.
+    """
+    etag = await catalogo_cache.etag_vigente(db)
+    headers = {"ETag": etag, "Cache-Control": CATALOGO_CACHE_CONTROL}
+    if _etag_coincide(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    cuerpo, extra = catalogo_cache.representacion(clave, construir)
+    return Response(cuerpo, media_type="application/json", headers={**extra, **headers})
+
+
 # Routes para Seguros
 @router.get("/seguros/", response_model=List[schemas.Seguro])
 async def listar_seguros(
+    request: Request,
     skip: int = 0,
     limit: int = 10,
+    cursor: Optional[str] = None,
     db: AsyncIOMotorDatabase = Depends(database.get_db)
 ):
-    """Obtener todos los seguros disponibles"""
-    return await crud.obtener_seguros(db, skip=skip, limit=limit)
+    """
+    Obtener todos los seguros disponibles
+
+    Acepta `skip`/`limit` o un `cursor` opaco; el cursor de la siguiente
+    página viene en el header `X-Siguiente-Cursor`. Soporta GET condicional.
+    """
+    despues_de = _leer_cursor(cursor)
+    
+    def construir():
+        # Documentos del catálogo ya validados al crearse: se serializan sin pasar por el modelo
+        seguros = catalogo_cache.pagina(skip, limit, despues_de)
+        siguiente = paginacion.cursor_siguiente(seguros, limit, clave_seguro)
+        headers = {paginacion.HEADER_SIGUIENTE_CURSOR: siguiente} if siguiente else {}
+        return [seguro_publico(s) for s in seguros], headers
+    
+    return await _respuesta_catalogo(request, db, ("listar", skip, limit, cursor), construir)
 
 @router.get("/seguros/economicos/{tipo}", response_model=List[schemas.Seguro])
-async def listar_seguros_por_tipo(tipo: str, db: AsyncIOMotorDatabase = Depends(database.get_db)):
-    """Obtener seguros por tipo (basico, estandar, premium)"""
+async def listar_seguros_por_tipo(request: Request, tipo: str, db: AsyncIOMotorDatabase = Depends(database.get_db)):
+    """Obtener seguros por tipo (basico, estandar, premium); soporta GET condicional"""
     if tipo not in ["basico", "estandar", "premium"]:
         raise HTTPException(status_code=400, detail="Tipo debe ser: basico, estandar o premium")
     
-    seguros = await crud.obtener_seguros_economicos(db, tipo=tipo)
-    return seguros
+    return await _respuesta_catalogo(
+        request, db, ("tipo", tipo), lambda: ([seguro_publico(s) for s in catalogo_cache.de_tipo(tipo)], {})
+    )
 
 @router.post("/seguros/economicos/", response_model=schemas.Seguro)
 async def crear_seguro_economico(seguro: schemas.SeguroCreate, db: AsyncIOMotorDatabase = Depends(database.get_db)):
@@ -47,66 +107,78 @@ async def crear_usuario(
     # Crear usuario en MySQL
     db_usuario = await crud_sql.crear_usuario_sql(db_sql, usuario)
     
-    # Convertir a schema Pydantic
-    return schemas.Usuario(
-        id=db_usuario.id,
-        nombre=db_usuario.nombre,
-        email=db_usuario.email,
-        telefono=db_usuario.telefono,
-        saldo=float(db_usuario.saldo),
-        activo=db_usuario.activo,
-        fecha_registro=db_usuario.fecha_registro
-    )
+    # Campos de schemas.Usuario directo del objeto ORM (sin validar dos veces)
+    return RespuestaJSON(usuario_a_dict(db_usuario))
 
 
 @router.get("/usuarios/", response_model=List[schemas.Usuario])
 async def listar_usuarios(
     skip: int = 0,
     limit: int = 100,
-    db_sql: AsyncSession = Depends(database_sql.get_db_sql)
+    cursor: Optional[str] = None,
+    db_sql: AsyncSession = Depends(database_sql.get_db_sql_read)
 ):
-    """Listar todos los usuarios desde MySQL"""
-    usuarios = await crud_sql.obtener_usuarios_sql(db_sql, skip=skip, limit=limit)
-    
-    return [
-        schemas.Usuario(
-            id=u.id,
-            nombre=u.nombre,
-            email=u.email,
-            telefono=u.telefono,
-            saldo=float(u.saldo),
-            activo=u.activo,
-            fecha_registro=u.fecha_registro
-        )
-        for u in usuarios
-    ]
+    """
+    Listar todos los usuarios desde MySQL
+
+    Acepta `skip`/`limit` o un `cursor` opaco; el cursor de la siguiente
+    página viene en el header `X-Siguiente-Cursor`.
+    """
+    # Filas (mappings) serializadas directamente, sin objetos ORM ni modelos Pydantic
+    usuarios = await crud_sql.obtener_usuarios_filas_sql(
+        db_sql, skip=skip, limit=limit, despues_de=_leer_cursor(cursor)
+    )
+    respuesta = RespuestaJSON([dict(u) for u in usuarios])
+    siguiente = paginacion.cursor_siguiente(usuarios, limit, lambda u: (u["fecha_registro"], u["id"]))
+    if siguiente:
+        respuesta.headers[paginacion.HEADER_SIGUIENTE_CURSOR] = siguiente
+    return respuesta
 
 
 @router.get("/usuarios/{usuario_id}", response_model=schemas.Usuario)
 async def obtener_usuario(
     usuario_id: str,
-    db_sql: AsyncSession = Depends(database_sql.get_db_sql)
+    db_sql: AsyncSession = Depends(database_sql.get_db_sql_read)
 ):
     """Obtener información de un usuario desde MySQL"""
     usuario = await crud_sql.obtener_usuario_sql(db_sql, usuario_id)
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
-    return schemas.Usuario(
-        id=usuario.id,
-        nombre=usuario.nombre,
-        email=usuario.email,
-        telefono=usuario.telefono,
-        saldo=float(usuario.saldo),
-        activo=usuario.activo,
-        fecha_registro=usuario.fecha_registro
-    )
+    return RespuestaJSON(usuario_a_dict(usuario))
+
+@router.get("/usuarios/{usuario_id}/resumen")
+async def obtener_resumen_usuario(
+    usuario_id: str,
+    db_sql: AsyncSession = Depends(database_sql.get_db_sql)
+):
+    """Totales de la cuenta del usuario (pólizas activas, total pagado, cuotas pendientes)"""
+    resumen = await crud_sql.obtener_resumen_sql(db_sql, usuario_id)
+    if not resumen:
+        # Usuario sin resumen todavía: calcularlo desde su historial y guardarlo
+        if not await crud_sql.obtener_usuario_sql(db_sql, usuario_id):
+            raise HTTPException(status_code=404, detail="Usuario no encontrado")
+        async with crud_sql.unidad_de_trabajo(db_sql):
+            await crud_sql.insertar_resumenes_sql(
+                db_sql, await crud_sql.calcular_resumenes_sql(db_sql, [usuario_id])
+            )
+        resumen = await crud_sql.obtener_resumen_sql(db_sql, usuario_id)
+    
+    return {
+        "usuario_id": usuario_id,
+        "polizas_activas": resumen.polizas_activas,
+        "total_pagado": float(resumen.total_pagado),
+        "cuotas_pendientes": resumen.cuotas_pendientes,
+        "proximo_monto": float(resumen.proximo_monto),
+        "actualizado": resumen.actualizado.isoformat() if resumen.actualizado else None
+    }
 
 # Routes para Compra y Pagos (SISTEMA HÍBRIDO: MySQL + MongoDB)
 @router.post("/usuarios/{usuario_id}/comprar-seguro")
 async def comprar_seguro(
     usuario_id: str, 
     compra: schemas.CompraSeguroRequest, 
+    request: Request,
     db_mongo: AsyncIOMotorDatabase = Depends(database.get_db),
     db_sql: AsyncSession = Depends(database_sql.get_db_sql)
 ):
@@ -114,110 +186,173 @@ async def comprar_seguro(
     Comprar un paquete de seguro (pago inicial)
     - Usuario y Póliza: MySQL
     - Seguro: MongoDB
+    - Con `Idempotency-Key`, un reintento devuelve la respuesta original sin volver a cobrar
     """
-    # 1. Obtener usuario de MySQL
-    usuario = await crud_sql.obtener_usuario_sql(db_sql, usuario_id)
-    if not usuario:
-        raise HTTPException(status_code=404, detail="Usuario no encontrado")
-    
-    # 2. Obtener seguro de MongoDB
-    seguro = await db_mongo.seguros.find_one({"id": compra.seguro_id, "activo": True})
-    if not seguro:
-        raise HTTPException(status_code=404, detail="Seguro no encontrado")
-    
-    # 3. Verificar saldo suficiente
-    if usuario.saldo < seguro["precio"]:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Saldo insuficiente. Necesitas ${seguro['precio']}, tienes ${usuario.saldo}"
-        )
-    
-    # 4. Descontar pago inicial del saldo
-    nuevo_saldo = float(usuario.saldo) - seguro["precio"]
-    await crud_sql.actualizar_saldo_usuario_sql(db_sql, usuario_id, nuevo_saldo)
-    
-    # 5. Crear póliza en MySQL
-    poliza = await crud_sql.crear_poliza_sql(
-        db_sql,
-        usuario_id=usuario_id,
-        seguro_id=compra.seguro_id,
-        monto_total=seguro["precio"],
-        cuota_mensual=seguro["cuota_mensual"],
-        duracion_meses=seguro["duracion_meses"]
-    )
+    async with idempotencia.proteger(request, db_sql, compra) as peticion:
+        if peticion.respuesta is not None:
+            return peticion.respuesta
+        
+        # 1. Obtener seguro del catálogo (caché en memoria de MongoDB)
+        seguro = await catalogo_cache.obtener(db_mongo, compra.seguro_id, solo_activos=True, perfil="precio")
+        if not seguro:
+            raise HTTPException(status_code=404, detail="Seguro no encontrado")
+        
+        # 2 y 3 (y la respuesta idempotente) se confirman juntos en una sola transacción
+        async with crud_sql.unidad_de_trabajo(db_sql):
+            # 2. Descontar pago inicial solo si el saldo alcanza (UPDATE condicional, devuelve el saldo resultante)
+            nuevo_saldo = await crud_sql.debitar_saldo_sql(db_sql, usuario_id, seguro["precio"])
+            if nuevo_saldo is None:
+                usuario = await crud_sql.obtener_usuario_sql(db_sql, usuario_id)
+                if not usuario:
+                    raise HTTPException(status_code=404, detail="Usuario no encontrado")
+                raise HTTPException(
+                    status_code=400, 
+                    detail=f"Saldo insuficiente. Necesitas ${seguro['precio']}, tienes ${usuario.saldo}"
+                )
+            
+            # 3. Crear póliza en MySQL
+            poliza = await crud_sql.crear_poliza_sql(
+                db_sql,
+                usuario_id=usuario_id,
+                seguro_id=compra.seguro_id,
+                monto_total=seguro["precio"],
+                cuota_mensual=seguro["cuota_mensual"],
+                duracion_meses=seguro["duracion_meses"]
+            )
+            
+            resultado = {
+                "mensaje": "Seguro comprado exitosamente",
+                "poliza_id": poliza.id,
+                "seguro_nombre": seguro["nombre"],
+                "monto_pagado": seguro["precio"],
+                "nuevo_saldo": nuevo_saldo,
+                "cuota_mensual": seguro["cuota_mensual"],
+                "cuotas_totales": seguro["duracion_meses"]
+            }
+            await peticion.guardar(resultado)
     
-    return {
-        "mensaje": "Seguro comprado exitosamente",
-        "poliza_id": poliza.id,
-        "seguro_nombre": seguro["nombre"],
-        "monto_pagado": seguro["precio"],
-        "nuevo_saldo": nuevo_saldo,
-        "cuota_mensual": seguro["cuota_mensual"],
-        "cuotas_totales": seguro["duracion_meses"]
-    }
+    return resultado
 
 @router.post("/polizas/{poliza_id}/pagar-cuota")
 async def pagar_cuota_mensual(
     poliza_id: str, 
     pago: schemas.PagoCuotaRequest,
+    request: Request,
     db_sql: AsyncSession = Depends(database_sql.get_db_sql)
 ):
     """
     Pagar la cuota mensual de una póliza
     - Póliza, Usuario, Pago: MySQL
+    - Con `Idempotency-Key`, un reintento devuelve la respuesta original sin volver a cobrar
     """
-    # 1. Obtener póliza con sus relaciones
-    poliza = await crud_sql.obtener_poliza_sql(db_sql, poliza_id)
-    if not poliza:
-        raise HTTPException(status_code=404, detail="Póliza no encontrada")
-    
-    # 2. Verificar si ya pagó todas las cuotas
-    if poliza.cuotas_pagadas >= poliza.cuotas_totales:
-        raise HTTPException(status_code=400, detail="Ya se pagaron todas las cuotas de esta póliza")
-    
-    # 3. Obtener usuario
-    usuario = await crud_sql.obtener_usuario_sql(db_sql, poliza.usuario_id)
-    
-    # 4. Verificar saldo suficiente
-    if usuario.saldo < poliza.cuota_mensual:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Saldo insuficiente. Necesitas ${poliza.cuota_mensual}, tienes ${usuario.saldo}"
-        )
-    
-    # 5. Descontar cuota del saldo
-    nuevo_saldo = float(usuario.saldo) - float(poliza.cuota_mensual)
-    await crud_sql.actualizar_saldo_usuario_sql(db_sql, poliza.usuario_id, nuevo_saldo)
-    
-    # 6. Registrar pago
-    numero_cuota = poliza.cuotas_pagadas + 1
-    pago_registro = await crud_sql.crear_pago_sql(
-        db_sql,
-        poliza_id=poliza_id,
-        usuario_id=poliza.usuario_id,
-        monto=float(poliza.cuota_mensual),
-        numero_cuota=numero_cuota
-    )
-    
-    # 7. Actualizar cuotas pagadas en póliza
-    poliza_actualizada = await crud_sql.actualizar_cuotas_poliza_sql(db_sql, poliza_id)
+    async with idempotencia.proteger(request, db_sql, pago) as peticion:
+        if peticion.respuesta is not None:
+            return peticion.respuesta
+        
+        # 1. Obtener póliza
+        poliza = await crud_sql.obtener_poliza_sql(db_sql, poliza_id)
+        if not poliza:
+            raise HTTPException(status_code=404, detail="Póliza no encontrada")
+        
+        # 2. Verificar si ya pagó todas las cuotas
+        if poliza.cuotas_pagadas >= poliza.cuotas_totales:
+            raise HTTPException(status_code=400, detail="Ya se pagaron todas las cuotas de esta póliza")
+        
+        # 3 a 5 (y la respuesta idempotente) se confirman juntos en una sola transacción
+        async with crud_sql.unidad_de_trabajo(db_sql):
+            # 3. Avanzar la cuota primero: el UPDATE guardado bloquea la póliza hasta el
+            #    commit, así dos pagos simultáneos (o uno y la facturación) no cobran la misma cuota
+            numero_cuota = poliza.cuotas_pagadas + 1
+            if not await crud_sql.actualizar_cuotas_poliza_sql(db_sql, poliza):
+                raise HTTPException(
+                    status_code=409,
+                    detail="La póliza se modificó mientras se pagaba la cuota; consulta su estado y reintenta"
+                )
+            
+            # 4. Descontar cuota solo si el saldo alcanza (UPDATE condicional, devuelve el saldo resultante)
+            nuevo_saldo = await crud_sql.debitar_saldo_sql(db_sql, poliza.usuario_id, float(poliza.cuota_mensual))
+            if nuevo_saldo is None:
+                usuario = await crud_sql.obtener_usuario_sql(db_sql, poliza.usuario_id)
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Saldo insuficiente. Necesitas ${poliza.cuota_mensual}, tienes ${usuario.saldo if usuario else 0}"
+                )
+            
+            # 5. Registrar pago
+            pago_registro = await crud_sql.crear_pago_sql(
+                db_sql,
+                poliza_id=poliza_id,
+                usuario_id=poliza.usuario_id,
+                monto=float(poliza.cuota_mensual),
+                numero_cuota=numero_cuota
+            )
+            
+            resultado = {
+                "mensaje": "Cuota pagada exitosamente",
+                "pago_id": pago_registro.id,
+                "numero_cuota": numero_cuota,
+                "monto_pagado": float(poliza.cuota_mensual),
+                "nuevo_saldo": nuevo_saldo,
+                "cuotas_pagadas": poliza.cuotas_pagadas,
+                "cuotas_totales": poliza.cuotas_totales,
+                "estado_poliza": poliza.estado.value
+            }
+            await peticion.guardar(resultado)
     
-    return {
-        "mensaje": "Cuota pagada exitosamente",
-        "pago_id": pago_registro.id,
-        "numero_cuota": numero_cuota,
-        "monto_pagado": float(poliza.cuota_mensual),
-        "nuevo_saldo": nuevo_saldo,
-        "cuotas_pagadas": poliza_actualizada.cuotas_pagadas,
-        "cuotas_totales": poliza_actualizada.cuotas_totales,
-        "estado_poliza": poliza_actualizada.estado.value
-    }
+    return resultado
+
+def _tiene_cuotas_pendientes(poliza) -> bool:
+    return poliza.estado.value == "activa" and poliza.cuotas_pagadas < poliza.cuotas_totales
+
+
+def _proximos_pagos(polizas, seguros: dict) -> List[dict]:
+    """Pólizas con cuotas pendientes y el nombre/tipo de su seguro"""
+    resultado = []
+    for poliza in polizas:
+        seguro = seguros.get(poliza.seguro_id)
+        
+        if seguro:
+            resultado.append({
+                "poliza_id": poliza.id,
+                "seguro_nombre": seguro["nombre"],
+                "seguro_tipo": seguro.get("tipo", ""),
+                "cuota_mensual": float(poliza.cuota_mensual),
+                "cuotas_pagadas": poliza.cuotas_pagadas,
+                "cuotas_totales": poliza.cuotas_totales,
+                "cuotas_pendientes": poliza.cuotas_totales - poliza.cuotas_pagadas,
+                "fecha_inicio": poliza.fecha_inicio.isoformat(),
+                "fecha_fin": poliza.fecha_fin.isoformat() if poliza.fecha_fin else None
+            })
+    return resultado
+
+
+def _polizas_con_seguro(polizas, seguros: dict) -> List[dict]:
+    """Pólizas (todas) con el nombre/tipo de su seguro"""
+    resultado = []
+    for poliza in polizas:
+        seguro = seguros.get(poliza.seguro_id)
+        
+        if seguro:
+            resultado.append({
+                "poliza_id": poliza.id,
+                "seguro_nombre": seguro["nombre"],
+                "seguro_tipo": seguro.get("tipo", ""),
+                "estado": poliza.estado.value,
+                "monto_total": float(poliza.monto_total),
+                "cuota_mensual": float(poliza.cuota_mensual),
+                "cuotas_pagadas": poliza.cuotas_pagadas,
+                "cuotas_totales": poliza.cuotas_totales,
+                "fecha_inicio": poliza.fecha_inicio.isoformat(),
+                "fecha_fin": poliza.fecha_fin.isoformat() if poliza.fecha_fin else None
+            })
+    return resultado
+
 
 @router.get("/usuarios/{usuario_id}/proximos-pagos")
 async def obtener_proximos_pagos(
     usuario_id: str,
     db_mongo: AsyncIOMotorDatabase = Depends(database.get_db),
-    db_sql: AsyncSession = Depends(database_sql.get_db_sql)
+    db_sql: AsyncSession = Depends(database_sql.get_db_sql_read)
 ):
     """
     Obtener las pólizas activas del usuario con pagos pendientes
@@ -227,90 +362,205 @@ async def obtener_proximos_pagos(
     # 1. Obtener pólizas del usuario desde MySQL
     polizas = await crud_sql.obtener_polizas_usuario_sql(db_sql, usuario_id)
     
-    resultado = []
-    for poliza in polizas:
-        # Solo incluir pólizas activas con cuotas pendientes
-        if poliza.estado.value == "activa" and poliza.cuotas_pagadas < poliza.cuotas_totales:
-            # 2. Obtener información del seguro desde MongoDB
-            seguro = await db_mongo.seguros.find_one({"id": poliza.seguro_id})
-            
-            if seguro:
-                cuotas_pendientes = poliza.cuotas_totales - poliza.cuotas_pagadas
-                resultado.append({
-                    "poliza_id": poliza.id,
-                    "seguro_nombre": seguro["nombre"],
-                    "seguro_tipo": seguro.get("tipo", ""),
-                    "cuota_mensual": float(poliza.cuota_mensual),
-                    "cuotas_pagadas": poliza.cuotas_pagadas,
-                    "cuotas_totales": poliza.cuotas_totales,
-                    "cuotas_pendientes": cuotas_pendientes,
-                    "fecha_inicio": poliza.fecha_inicio.isoformat(),
-                    "fecha_fin": poliza.fecha_fin.isoformat() if poliza.fecha_fin else None
-                })
+    # Solo incluir pólizas activas con cuotas pendientes
+    pendientes = [poliza for poliza in polizas if _tiene_cuotas_pendientes(poliza)]
     
-    return {
+    # 2. Obtener información de todos los seguros en una sola búsqueda
+    seguros = await resolver_seguros(db_mongo, pendientes)
+    resultado = _proximos_pagos(pendientes, seguros)
+    
+    return RespuestaJSON({
         "usuario_id": usuario_id,
         "total_polizas_activas": len(resultado),
         "proximos_pagos": resultado
-    }
+    })
 
 
 @router.get("/usuarios/{usuario_id}/polizas")
 async def obtener_polizas_usuario(
     usuario_id: str,
     db_mongo: AsyncIOMotorDatabase = Depends(database.get_db),
-    db_sql: AsyncSession = Depends(database_sql.get_db_sql)
+    db_sql: AsyncSession = Depends(database_sql.get_db_sql_read)
 ):
     """Obtener todas las pólizas de un usuario (activas, vencidas, canceladas)"""
     polizas = await crud_sql.obtener_polizas_usuario_sql(db_sql, usuario_id)
+    seguros = await resolver_seguros(db_mongo, polizas)
+    resultado = _polizas_con_seguro(polizas, seguros)
     
-    resultado = []
-    for poliza in polizas:
-        seguro = await db_mongo.seguros.find_one({"id": poliza.seguro_id})
-        
-        if seguro:
-            resultado.append({
-                "poliza_id": poliza.id,
-                "seguro_nombre": seguro["nombre"],
-                "seguro_tipo": seguro.get("tipo", ""),
-                "estado": poliza.estado.value,
-                "monto_total": float(poliza.monto_total),
-                "cuota_mensual": float(poliza.cuota_mensual),
-                "cuotas_pagadas": poliza.cuotas_pagadas,
-                "cuotas_totales": poliza.cuotas_totales,
-                "fecha_inicio": poliza.fecha_inicio.isoformat(),
-                "fecha_fin": poliza.fecha_fin.isoformat() if poliza.fecha_fin else None
-            })
-    
-    return {
+    return RespuestaJSON({
         "usuario_id": usuario_id,
         "total_polizas": len(resultado),
         "polizas": resultado
-    }
+    })
+
+
+@router.get("/usuarios/{usuario_id}/dashboard")
+async def obtener_dashboard(
+    usuario_id: str,
+    request: Request,
+    db_mongo: AsyncIOMotorDatabase = Depends(database.get_db)
+):
+    """
+    Todo lo que muestra el dashboard en una sola petición
+    - Usuario y pólizas: MySQL, una consulta cada uno y en paralelo (sesiones separadas)
+    - Catálogo activo y seguros de las pólizas: caché del catálogo (a lo sumo una consulta a MongoDB)
+    """
+    fabrica = database_sql.fabrica_lectura(request)
+
+    async def leer(consulta):
+        # Una AsyncSession no admite consultas concurrentes: cada lectura usa la suya
+        async with fabrica() as sesion:
+            return await consulta(sesion, usuario_id)
+
+    usuario, polizas, _ = await asyncio.gather(
+        leer(crud_sql.obtener_usuario_sql),
+        leer(crud_sql.obtener_polizas_usuario_sql),
+        catalogo_cache.etag_vigente(db_mongo),
+    )
+    if not usuario:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+
+    seguros = await resolver_seguros(db_mongo, polizas)
+    proximos_pagos = _proximos_pagos([p for p in polizas if _tiene_cuotas_pendientes(p)], seguros)
+    
+    return RespuestaJSON({
+        "usuario": usuario_a_dict(usuario),
+        "polizas": _polizas_con_seguro(polizas, seguros),
+        "proximos_pagos": proximos_pagos,
+        "seguros": [seguro_publico(seguro) for seguro in catalogo_cache.pagina()]
+    })
 
 
 @router.get("/polizas/{poliza_id}/pagos")
 async def obtener_historial_pagos(
     poliza_id: str,
-    db_sql: AsyncSession = Depends(database_sql.get_db_sql)
+    desde: Optional[datetime] = None,
+    db_sql: AsyncSession = Depends(database_sql.get_db_sql_read)
 ):
-    """Obtener historial de pagos de una póliza"""
-    pagos = await crud_sql.obtener_pagos_poliza_sql(db_sql, poliza_id)
+    """Obtener historial de pagos de una póliza (por defecto, los meses recientes; `desde` para ir más atrás)"""
+    pagos = await crud_sql.obtener_pagos_poliza_filas_sql(db_sql, poliza_id, desde)
     
-    return {
+    return RespuestaJSON({
         "poliza_id": poliza_id,
         "total_pagos": len(pagos),
-        "pagos": [
-            {
-                "pago_id": pago.id,
-                "monto": float(pago.monto),
-                "fecha_pago": pago.fecha_pago.isoformat(),
-                "numero_cuota": pago.numero_cuota,
-                "metodo_pago": pago.metodo_pago,
-                "estado": pago.estado.value
+        "pagos": [dict(pago) for pago in pagos]
+    })
+
+# Lecturas en lote: una consulta IN por tabla en lugar de una petición por ID
+@router.post("/usuarios/lote")
+async def obtener_usuarios_lote(
+    lote: schemas.LoteIdsRequest,
+    db_sql: AsyncSession = Depends(database_sql.get_db_sql_read)
+):
+    """Obtener varios usuarios por ID en una sola petición"""
+    usuarios = await crud_sql.obtener_usuarios_por_ids_sql(db_sql, lote.ids)
+    
+    return RespuestaJSON({
+        "usuarios": {u.id: usuario_a_dict(u) for u in usuarios.values()},
+        "no_encontrados": [i for i in dict.fromkeys(lote.ids) if i not in usuarios]
+    })
+
+
+@router.post("/polizas/lote")
+async def obtener_polizas_lote(
+    lote: schemas.LoteIdsRequest,
+    db_sql: AsyncSession = Depends(database_sql.get_db_sql_read)
+):
+    """Obtener varias pólizas por ID en una sola petición"""
+    polizas = await crud_sql.obtener_polizas_por_ids_sql(db_sql, lote.ids)
+    
+    return RespuestaJSON({
+        "polizas": {
+            poliza.id: {
+                "poliza_id": poliza.id,
+                "usuario_id": poliza.usuario_id,
+                "seguro_id": poliza.seguro_id,
+                "estado": poliza.estado.value,
+                "monto_total": float(poliza.monto_total),
+                "cuota_mensual": float(poliza.cuota_mensual),
+                "cuotas_pagadas": poliza.cuotas_pagadas,
+                "cuotas_totales": poliza.cuotas_totales,
+                "fecha_inicio": poliza.fecha_inicio.isoformat(),
+                "fecha_fin": poliza.fecha_fin.isoformat() if poliza.fecha_fin else None
             }
-            for pago in pagos
-        ]
-    }
+            for poliza in polizas.values()
+        },
+        "no_encontrados": [i for i in dict.fromkeys(lote.ids) if i not in polizas]
+    })
+
+
+@router.post("/polizas/pagos/lote")
+async def obtener_historial_pagos_lote(
+    lote: schemas.LoteIdsRequest,
+    desde: Optional[datetime] = None,
+    db_sql: AsyncSession = Depends(database_sql.get_db_sql_read)
+):
+    """Obtener el historial de pagos de varias pólizas en una sola petición"""
+    polizas = await crud_sql.obtener_polizas_por_ids_sql(db_sql, lote.ids)
+    pagos = await crud_sql.obtener_pagos_polizas_sql(db_sql, polizas.keys(), desde)
+    
+    return RespuestaJSON({
+        "pagos": {
+            poliza_id: [
+                {
+                    "pago_id": pago.id,
+                    "monto": float(pago.monto),
+                    "fecha_pago": pago.fecha_pago.isoformat(),
+                    "numero_cuota": pago.numero_cuota,
+                    "metodo_pago": pago.metodo_pago,
+                    "estado": pago.estado.value
+                }
+                for pago in pagos.get(poliza_id, [])
+            ]
+            for poliza_id in polizas
+        },
+        "no_encontrados": [i for i in dict.fromkeys(lote.ids) if i not in polizas]
+    })
+
+
+# Exportaciones en streaming (memoria constante sin importar el número de filas)
+def _respuesta_exportacion(contenido, nombre: str, formato: str) -> StreamingResponse:
+    if formato not in exportacion.FORMATOS:
+        raise HTTPException(status_code=400, detail="Formato debe ser: ndjson o csv")
+    return StreamingResponse(
+        contenido,
+        media_type=exportacion.FORMATOS[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nombre}.{formato}"'}
+    )
+
+
+@router.get("/exportar/pagos")
+async def exportar_pagos(
+    formato: str = "ndjson",
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    usuario_id: Optional[str] = None,
+    poliza_id: Optional[str] = None
+):
+    """Exportar pagos en NDJSON o CSV, filtrando por fechas, usuario y póliza"""
+    return _respuesta_exportacion(
+        exportacion.exportar_pagos(formato, desde, hasta, usuario_id, poliza_id), "pagos", formato
+    )
+
+
+@router.get("/exportar/auditoria")
+async def exportar_auditoria(
+    formato: str = "ndjson",
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    usuario_id: Optional[str] = None,
+    tabla: Optional[str] = None,
+    registro_id: Optional[str] = None
+):
+    """Exportar auditoría en NDJSON o CSV, filtrando por fechas, usuario, tabla y registro"""
+    return _respuesta_exportacion(
+        exportacion.exportar_auditoria(formato, desde, hasta, usuario_id, tabla, registro_id), "auditoria", formato
+    )
+
+
+@router.get("/auditoria/metricas")
+async def metricas_auditoria():
+    """Estado de la cola de auditoría (ocupación, lotes escritos, backpressure, lotes guardados en disco)"""
+    return auditoria_async.escritor.metricas()
 
 # Mantener todas las rutas anteriores...
\ No newline at end of file
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List
 from datetime import datetime
 
@@ -90,6 +90,9 @@ class PagoCuotaRequest(BaseModel):
     poliza_id: str
     metodo_pago: str = "saldo"
 
+class LoteIdsRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=500)
+
 # Respuestas detalladas
 class PolizaDetalle(Poliza):
     seguro: Seguro
@@ -0,0 +1,11 @@
+"""
+Benchmarks reproducibles de los caminos críticos de la API
+
+Levanta `main:app` en el mismo proceso (httpx + ASGITransport, sin red) con
+SQLite/aiosqlite en lugar de MySQL y un Mongo falso en memoria, y mide
+comprar-seguro, pagar-cuota, proximos-pagos y el catálogo.
+
+Uso:
+    python -m bench --concurrencia 16 --peticiones 2000 --salida resultados.json
+    python -m bench --comparar base.json resultados.json
+"""
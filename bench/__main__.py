@@ -0,0 +1,175 @@
+"""
+CLI del benchmark: `python -m bench --help`
+
+Las variables de entorno se fijan antes de importar la app para que
+`database_sql` cree el engine contra SQLite y sin eco de SQL.
+"""
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+# Deben coincidir con `bench.escenarios.ESCENARIOS` (no se importa antes de configurar el entorno)
+ESCENARIOS_DISPONIBLES = ["comprar-seguro", "pagar-cuota", "proximos-pagos", "catalogo", "catalogo-tipo"]
+
+
+def _configurar_entorno(archivo_db: str):
+    os.environ["SQL_DATABASE_URL"] = f"sqlite+aiosqlite:///{archivo_db}?timeout=30"
+    os.environ.pop("SQL_READ_DATABASE_URL", None)
+    os.environ.pop("MYSQL_READ_HOST", None)
+    os.environ.setdefault("SQL_ECHO", "0")
+    os.environ.setdefault("FACTURACION_INTERVALO_HORAS", "0")
+    sys.path.insert(0, str(RAIZ))
+
+
+def percentil(ordenadas: List[float], p: float) -> float:
+    """Percentil por rango más cercano sobre una lista ya ordenada"""
+    if not ordenadas:
+        return 0.0
+    indice = max(0, min(len(ordenadas) - 1, int(round(p / 100 * len(ordenadas) + 0.5)) - 1))
+    return ordenadas[indice]
+
+
+async def correr_escenario(cliente, peticion, datos, total: int, concurrencia: int, rng: random.Random) -> Dict:
+    """Hacer `total` peticiones con `concurrencia` trabajadores y resumir latencias"""
+    latencias: List[float] = []
+    estados: Dict[str, int] = {}
+    # Un generador con semilla propia por petición: mismas peticiones con la misma semilla
+    pendientes = iter([random.Random(rng.random()) for _ in range(total)])
+
+    async def trabajador():
+        for rng_peticion in pendientes:
+            inicio = time.perf_counter()
+            respuesta = await peticion(cliente, datos, rng_peticion)
+            latencias.append(time.perf_counter() - inicio)
+            clave = str(respuesta.status_code)
+            estados[clave] = estados.get(clave, 0) + 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+    duracion = time.perf_counter() - inicio
+
+    latencias.sort()
+    ms = lambda s: round(s * 1000, 3)
+    return {
+        "peticiones": total,
+        "errores": sum(n for estado, n in estados.items() if not estado.startswith("2")),
+        "estados": dict(sorted(estados.items())),
+        "p50_ms": ms(percentil(latencias, 50)),
+        "p95_ms": ms(percentil(latencias, 95)),
+        "p99_ms": ms(percentil(latencias, 99)),
+        "media_ms": ms(sum(latencias) / len(latencias)) if latencias else 0.0,
+        "max_ms": ms(latencias[-1]) if latencias else 0.0,
+        "rps": round(total / duracion, 2) if duracion else 0.0,
+        "duracion_s": round(duracion, 3),
+    }
+
+
+def _commit_actual() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return ""
+
+
+async def ejecutar(args) -> Dict:
+    import httpx
+    from main import app
+    from app.auditoria_async import escritor, AUDITORIA_MODO
+    from app import database_sql
+    from bench import escenarios
+
+    rng = random.Random(args.semilla)
+    await escenarios.preparar_bases()
+    if AUDITORIA_MODO != "estricto":
+        await escritor.iniciar()
+
+    resultados = {}
+    transporte = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+            print(f"⏳ Cargando {args.usuarios} usuarios...")
+            datos = await escenarios.cargar_datos(cliente, args.usuarios, rng)
+            for nombre in args.escenarios:
+                peticion = escenarios.ESCENARIOS[nombre]
+                if args.calentamiento:
+                    await correr_escenario(cliente, peticion, datos, args.calentamiento, args.concurrencia, rng)
+                resultado = await correr_escenario(cliente, peticion, datos, args.peticiones, args.concurrencia, rng)
+                resultados[nombre] = resultado
+                print(f"📊 {nombre:<16} p50={resultado['p50_ms']:>8.2f}ms  p95={resultado['p95_ms']:>8.2f}ms  "
+                      f"p99={resultado['p99_ms']:>8.2f}ms  rps={resultado['rps']:>9.2f}  errores={resultado['errores']}")
+    finally:
+        await escritor.detener()
+        await database_sql.close_db_sql()
+
+    return {
+        "version": 1,
+        "commit": _commit_actual(),
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {
+            "concurrencia": args.concurrencia,
+            "peticiones": args.peticiones,
+            "calentamiento": args.calentamiento,
+            "usuarios": args.usuarios,
+            "semilla": args.semilla,
+            "escenarios": args.escenarios,
+        },
+        "resultados": resultados,
+    }
+
+
+def comparar(base: str, nuevo: str):
+    """Imprimir la diferencia porcentual entre dos archivos de resultados"""
+    a = json.loads(Path(base).read_text())["resultados"]
+    b = json.loads(Path(nuevo).read_text())["resultados"]
+    print(f"{'escenario':<16} {'métrica':<8} {'base':>10} {'nuevo':>10} {'cambio':>9}")
+    for nombre in sorted(set(a) & set(b)):
+        for metrica in ("p50_ms", "p95_ms", "p99_ms", "rps"):
+            antes, despues = a[nombre][metrica], b[nombre][metrica]
+            cambio = (despues - antes) / antes * 100 if antes else 0.0
+            print(f"{nombre:<16} {metrica:<8} {antes:>10.2f} {despues:>10.2f} {cambio:>+8.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Benchmark de la API de seguros")
+    parser.add_argument("--concurrencia", type=int, default=10, help="Peticiones simultáneas")
+    parser.add_argument("--peticiones", type=int, default=500, help="Peticiones medidas por escenario")
+    parser.add_argument("--calentamiento", type=int, default=50, help="Peticiones previas sin medir")
+    parser.add_argument("--usuarios", type=int, default=200, help="Usuarios (con una póliza cada uno) a crear")
+    parser.add_argument("--semilla", type=int, default=1234)
+    parser.add_argument("--escenarios", nargs="+", choices=ESCENARIOS_DISPONIBLES, default=ESCENARIOS_DISPONIBLES)
+    parser.add_argument("--salida", help="Archivo JSON donde guardar los resultados")
+    parser.add_argument("--comparar", nargs=2, metavar=("BASE", "NUEVO"), help="Comparar dos resultados")
+    args = parser.parse_args()
+
+    if args.comparar:
+        comparar(*args.comparar)
+        return
+
+    with tempfile.TemporaryDirectory() as directorio:
+        _configurar_entorno(os.path.join(directorio, "bench.db"))
+        reporte = asyncio.run(ejecutar(args))
+
+    texto = json.dumps(reporte, indent=2, sort_keys=True, ensure_ascii=False)
+    if args.salida:
+        Path(args.salida).write_text(texto + "\n")
+        print(f"✅ Resultados guardados en {args.salida}")
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
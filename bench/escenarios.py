@@ -0,0 +1,107 @@
+"""
+Datos iniciales y escenarios del benchmark
+
+Cada escenario es una función que arma una petición a partir de los datos
+preparados y de un `random.Random` con semilla fija, así dos corridas con la
+misma configuración hacen exactamente las mismas peticiones.
+"""
+from sqlalchemy import update
+from app import crud, database, database_sql, schemas
+from app.models_sql import UsuarioSQL
+from bench.mongo_falso import ClienteFalso
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List
+import random
+
+PREFIJO = "/api/v1"
+
+# Saldo alto y pólizas largas para que las compras y pagos no fallen por negocio
+SALDO_INICIAL = 1_000_000
+DURACION_MESES = 600
+
+TIPOS = ("basico", "estandar", "premium")
+
+
+@dataclass
+class DatosBench:
+    usuarios: List[str] = field(default_factory=list)
+    seguros: List[str] = field(default_factory=list)
+    polizas: List[str] = field(default_factory=list)
+
+
+async def preparar_bases():
+    """Crear las tablas en SQLite y conectar el Mongo falso"""
+    database.db.client = ClienteFalso()
+    async with database_sql.engine.begin() as conn:
+        await conn.run_sync(database_sql.Base.metadata.drop_all)
+        await conn.run_sync(database_sql.Base.metadata.create_all)
+
+
+async def cargar_datos(cliente, usuarios: int, rng: random.Random) -> DatosBench:
+    """Crear catálogo, usuarios con saldo y una póliza por usuario a través de la API"""
+    datos = DatosBench()
+    db_mongo = await database.get_db()
+    for i, tipo in enumerate(TIPOS * 2):
+        seguro = await crud.crear_seguro_economico(db_mongo, schemas.SeguroCreate(
+            nombre=f"Seguro {tipo} {i}",
+            descripcion="Seguro de benchmark",
+            duracion_meses=DURACION_MESES,
+            precio=50.0 * (i % 3 + 1),
+            cuota_mensual=20.0 * (i % 3 + 1),
+            cobertura=10000.0,
+            tipo=tipo
+        ))
+        datos.seguros.append(seguro["id"])
+
+    for i in range(usuarios):
+        respuesta = await cliente.post(f"{PREFIJO}/usuarios/", json={
+            "nombre": f"Usuario {i}", "email": f"bench{i}@ejemplo.com"
+        })
+        respuesta.raise_for_status()
+        datos.usuarios.append(respuesta.json()["id"])
+
+    async with database_sql.AsyncSessionLocal() as db:
+        await db.execute(update(UsuarioSQL).values(saldo=SALDO_INICIAL))
+        await db.commit()
+
+    for usuario_id in datos.usuarios:
+        respuesta = await cliente.post(f"{PREFIJO}/usuarios/{usuario_id}/comprar-seguro", json={
+            "seguro_id": rng.choice(datos.seguros)
+        })
+        respuesta.raise_for_status()
+        datos.polizas.append(respuesta.json()["poliza_id"])
+    return datos
+
+
+Peticion = Callable[..., Awaitable]
+
+
+def _comprar(cliente, datos: DatosBench, rng: random.Random):
+    return cliente.post(f"{PREFIJO}/usuarios/{rng.choice(datos.usuarios)}/comprar-seguro",
+                        json={"seguro_id": rng.choice(datos.seguros)})
+
+
+def _pagar(cliente, datos: DatosBench, rng: random.Random):
+    poliza_id = rng.choice(datos.polizas)
+    return cliente.post(f"{PREFIJO}/polizas/{poliza_id}/pagar-cuota", json={"poliza_id": poliza_id})
+
+
+def _proximos(cliente, datos: DatosBench, rng: random.Random):
+    return cliente.get(f"{PREFIJO}/usuarios/{rng.choice(datos.usuarios)}/proximos-pagos")
+
+
+def _catalogo(cliente, datos: DatosBench, rng: random.Random):
+    return cliente.get(f"{PREFIJO}/seguros/")
+
+
+def _catalogo_tipo(cliente, datos: DatosBench, rng: random.Random):
+    return cliente.get(f"{PREFIJO}/seguros/economicos/{rng.choice(TIPOS)}")
+
+
+ESCENARIOS: Dict[str, Peticion] = {
+    "comprar-seguro": _comprar,
+    "pagar-cuota": _pagar,
+    "proximos-pagos": _proximos,
+    "catalogo": _catalogo,
+    "catalogo-tipo": _catalogo_tipo,
+}
@@ -0,0 +1,146 @@
+"""
+Sustituto en memoria de Motor para los benchmarks
+
+Implementa lo que usan `app.crud` y `app.catalogo_cache`: find (filtro,
+proyección, sort, skip, limit, to_list, async for), find_one, insert_one,
+insert_many, update_one ($set/$inc), delete_one, count_documents y
+create_index. Los filtros soportan igualdad, $in, $nin, $ne, $gt, $gte, $lt,
+$lte, $exists, $or y $and (misma semántica que `app.documentos_sqlite`).
+
+Cada operación cede el control al event loop una vez (`asyncio.sleep(0)`)
+para que la concurrencia se parezca a la de un driver real.
+"""
+from app.documentos_sqlite import coincide, ordenar, proyectar
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+import asyncio
+import copy
+import itertools
+
+class CursorFalso:
+    def __init__(self, documentos: List[dict], proyeccion: Optional[dict]):
+        self._documentos = documentos
+        self._proyeccion = proyeccion
+        self._orden: List[tuple] = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, clave, direccion: int = 1):
+        self._orden = list(clave) if isinstance(clave, list) else [(clave, direccion)]
+        return self
+
+    def skip(self, cantidad: int):
+        self._skip = cantidad
+        return self
+
+    def limit(self, cantidad: int):
+        self._limit = cantidad
+        return self
+
+    def _resultado(self) -> List[dict]:
+        documentos = ordenar(list(self._documentos), self._orden)[self._skip:]
+        if self._limit:
+            documentos = documentos[:self._limit]
+        return [proyectar(d, self._proyeccion) for d in documentos]
+
+    async def to_list(self, length: Optional[int] = None) -> List[dict]:
+        await asyncio.sleep(0)
+        resultado = self._resultado()
+        return resultado[:length] if length else resultado
+
+    def __aiter__(self):
+        return self._iterar()
+
+    async def _iterar(self):
+        for documento in await self.to_list():
+            yield documento
+
+
+class ColeccionFalsa:
+    def __init__(self, nombre: str):
+        self.name = nombre
+        self._documentos: List[dict] = []
+        self._ids = itertools.count(1)
+
+    def find(self, filtro: Optional[dict] = None, proyeccion: Optional[dict] = None) -> CursorFalso:
+        return CursorFalso([d for d in self._documentos if coincide(d, filtro)], proyeccion)
+
+    async def find_one(self, filtro: Optional[dict] = None, proyeccion: Optional[dict] = None):
+        await asyncio.sleep(0)
+        for documento in self._documentos:
+            if coincide(documento, filtro):
+                return proyectar(documento, proyeccion)
+        return None
+
+    async def insert_one(self, documento: dict):
+        await asyncio.sleep(0)
+        documento.setdefault("_id", next(self._ids))
+        self._documentos.append(copy.deepcopy(documento))
+        return SimpleNamespace(inserted_id=documento["_id"], acknowledged=True)
+
+    async def insert_many(self, documentos: List[dict]):
+        await asyncio.sleep(0)
+        ids = []
+        for documento in documentos:
+            documento.setdefault("_id", next(self._ids))
+            self._documentos.append(copy.deepcopy(documento))
+            ids.append(documento["_id"])
+        return SimpleNamespace(inserted_ids=ids, acknowledged=True)
+
+    async def update_one(self, filtro: dict, cambios: Dict[str, Dict[str, Any]]):
+        await asyncio.sleep(0)
+        for documento in self._documentos:
+            if coincide(documento, filtro):
+                for campo, valor in cambios.get("$set", {}).items():
+                    documento[campo] = copy.deepcopy(valor)
+                for campo, valor in cambios.get("$inc", {}).items():
+                    documento[campo] = documento.get(campo, 0) + valor
+                return SimpleNamespace(matched_count=1, modified_count=1, acknowledged=True)
+        return SimpleNamespace(matched_count=0, modified_count=0, acknowledged=True)
+
+    async def delete_one(self, filtro: dict):
+        await asyncio.sleep(0)
+        for i, documento in enumerate(self._documentos):
+            if coincide(documento, filtro):
+                del self._documentos[i]
+                return SimpleNamespace(deleted_count=1, acknowledged=True)
+        return SimpleNamespace(deleted_count=0, acknowledged=True)
+
+    async def count_documents(self, filtro: Optional[dict] = None) -> int:
+        await asyncio.sleep(0)
+        return sum(1 for d in self._documentos if coincide(d, filtro))
+
+    async def create_index(self, claves, **opciones) -> str:
+        claves = [(claves, 1)] if isinstance(claves, str) else claves
+        return opciones.get("name") or "_".join(f"{campo}_{direccion}" for campo, direccion in claves)
+
+
+class BaseFalsa:
+    def __init__(self, nombre: str):
+        self.name = nombre
+        self._colecciones: Dict[str, ColeccionFalsa] = {}
+
+    def __getitem__(self, nombre: str) -> ColeccionFalsa:
+        if nombre not in self._colecciones:
+            self._colecciones[nombre] = ColeccionFalsa(nombre)
+        return self._colecciones[nombre]
+
+    def __getattr__(self, nombre: str) -> ColeccionFalsa:
+        if nombre.startswith("_"):
+            raise AttributeError(nombre)
+        return self[nombre]
+
+
+class ClienteFalso:
+    """Reemplazo de AsyncIOMotorClient: `cliente[nombre_base].coleccion`"""
+
+    def __init__(self):
+        self._bases: Dict[str, BaseFalsa] = {}
+
+    def __getitem__(self, nombre: str) -> BaseFalsa:
+        if nombre not in self._bases:
+            self._bases[nombre] = BaseFalsa(nombre)
+        return self._bases[nombre]
+
+    def close(self):
+        pass
@@ -5,6 +5,7 @@ Script para verificar la conexión a MongoDB y el estado de la base de datos
 import asyncio
 import sys
 from motor.motor_asyncio import AsyncIOMotorClient
+from app import indices_mongo
 
 MONGODB_URL = "mongodb://localhost:27017/"
 DATABASE_NAME = "seguros_db"
@@ -46,6 +47,19 @@ async def check_mongodb_connection():
             for seg in siguros:
                 print(f"   - {seg.get('nombre', 'Sin nombre')} (${seg.get('precio', 0)})")
         
+        # Índices declarados (app/indices_mongo.py) y cuánto se usa cada uno
+        for coleccion in indices_mongo.INDICES:
+            if coleccion not in colecciones:
+                continue
+            print(f"\n🗂️  Índices de {coleccion} (uso desde el último reinicio de MongoDB):")
+            for uso in await indices_mongo.estadisticas_uso(db, coleccion):
+                print(f"   • {uso['nombre']}: {uso['operaciones']} operaciones (desde {uso['desde']:%Y-%m-%d %H:%M})")
+        derivas = await indices_mongo.revisar(db)
+        for deriva in derivas:
+            print(f"   ⚠️  Deriva: {deriva}")
+        if not derivas:
+            print("   ✅ Índices al día")
+        
         if "usuarios" in colecciones:
             print("\n👥 Muestreo de usuarios:")
             usuarios = await db.usuarios.find({}).limit(2).to_list(2)
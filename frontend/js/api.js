@@ -4,6 +4,53 @@
 
 const API_BASE = "http://127.0.0.1:8000/api/v1";
 
+// Reintentos de un cobro ante errores de red (con la misma Idempotency-Key)
+const REINTENTOS_COBRO = 2;
+
+/**
+ * Generar una Idempotency-Key (UUID v4)
+ * crypto.randomUUID solo existe en contextos seguros (HTTPS o localhost)
+ */
+function nuevaClaveIdempotencia() {
+    const cripto = window.crypto;
+    if (cripto && typeof cripto.randomUUID === "function") {
+        return cripto.randomUUID();
+    }
+    const bytes = new Uint8Array(16);
+    if (cripto && typeof cripto.getRandomValues === "function") {
+        cripto.getRandomValues(bytes);
+    } else {
+        for (let i = 0; i < bytes.length; i++) bytes[i] = Math.floor(Math.random() * 256);
+    }
+    bytes[6] = (bytes[6] & 0x0f) | 0x40;
+    bytes[8] = (bytes[8] & 0x3f) | 0x80;
+    const hex = Array.from(bytes, b => b.toString(16).padStart(2, "0")).join("");
+    return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+}
+
+/**
+ * POST de un cobro con Idempotency-Key
+ * Si la respuesta no llega (error de red) se reintenta con la misma clave:
+ * el servidor devuelve la respuesta del primer intento sin volver a cobrar
+ */
+async function postIdempotente(url, cuerpo, idempotencyKey) {
+    for (let intento = 0; ; intento++) {
+        try {
+            return await fetch(url, {
+                method: "POST",
+                headers: {
+                    "Content-Type": "application/json",
+                    "Idempotency-Key": idempotencyKey
+                },
+                body: JSON.stringify(cuerpo)
+            });
+        } catch (error) {
+            if (intento >= REINTENTOS_COBRO) throw error;
+            await new Promise(resolve => setTimeout(resolve, 500 * (intento + 1)));
+        }
+    }
+}
+
 class API {
     /**
      * Obtener todos los seguros
@@ -75,20 +122,39 @@ class API {
         }
     }
 
+    /**
+     * Obtener el dashboard del usuario en una sola petición
+     * (usuario, pólizas, próximos pagos y catálogo activo)
+     */
+    static async obtenerDashboard(usuarioId) {
+        try {
+            const response = await fetch(`${API_BASE}/usuarios/${usuarioId}/dashboard`);
+            if (!response.ok) throw new Error("Error al obtener el dashboard");
+            return await response.json();
+        } catch (error) {
+            console.error("Error en obtenerDashboard:", error);
+            return null;
+        }
+    }
+
+    /**
+     * Clave para una acción de cobro del usuario (reutilizarla si el usuario la reintenta)
+     */
+    static nuevaClaveIdempotencia() {
+        return nuevaClaveIdempotencia();
+    }
+
     /**
      * Comprar un seguro
+     * Sin `idempotencyKey` se genera una para esta compra
      */
-    static async comprarSeguro(usuarioId, seguroId) {
+    static async comprarSeguro(usuarioId, seguroId, idempotencyKey = null) {
         try {
-            const response = await fetch(`${API_BASE}/usuarios/${usuarioId}/comprar-seguro`, {
-                method: "POST",
-                headers: {
-                    "Content-Type": "application/json"
-                },
-                body: JSON.stringify({
-                    seguro_id: seguroId
-                })
-            });
+            const response = await postIdempotente(
+                `${API_BASE}/usuarios/${usuarioId}/comprar-seguro`,
+                { seguro_id: seguroId },
+                idempotencyKey || nuevaClaveIdempotencia()
+            );
 
             if (!response.ok) {
                 const error = await response.json();
@@ -104,19 +170,15 @@ class API {
 
     /**
      * Pagar cuota mensual
+     * Sin `idempotencyKey` se genera una para este pago
      */
-    static async pagarCuota(polizaId, metodoPago = "saldo") {
+    static async pagarCuota(polizaId, metodoPago = "saldo", idempotencyKey = null) {
         try {
-            const response = await fetch(`${API_BASE}/polizas/${polizaId}/pagar-cuota`, {
-                method: "POST",
-                headers: {
-                    "Content-Type": "application/json"
-                },
-                body: JSON.stringify({
-                    poliza_id: polizaId,
-                    metodo_pago: metodoPago
-                })
-            });
+            const response = await postIdempotente(
+                `${API_BASE}/polizas/${polizaId}/pagar-cuota`,
+                { poliza_id: polizaId, metodo_pago: metodoPago },
+                idempotencyKey || nuevaClaveIdempotencia()
+            );
 
             if (!response.ok) {
                 const error = await response.json();
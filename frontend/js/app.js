@@ -95,7 +95,7 @@ function comprarSeguro(seguroId, nombreSeguro, precio) {
  * Cargar dashboard del usuario
  */
 async function cargarDashboard() {
-    const usuario = Storage.obtenerUsuario();
+    let usuario = Storage.obtenerUsuario();
     const dashboardContent = document.getElementById("dashboard-content");
 
     if (!usuario) {
@@ -108,6 +108,17 @@ async function cargarDashboard() {
         return;
     }
 
+    dashboardContent.innerHTML = '<div class="loading">Cargando dashboard...</div>';
+
+    // Una sola petición trae usuario, pólizas, próximos pagos y catálogo
+    const dashboard = await API.obtenerDashboard(usuario.id);
+    if (dashboard) {
+        usuario = dashboard.usuario;
+        Storage.guardarUsuario(usuario);
+    }
+    const polizas = dashboard ? dashboard.polizas : [];
+    const proximosPagos = dashboard ? dashboard.proximos_pagos : [];
+
     dashboardContent.innerHTML = `
         <div class="dashboard-grid">
             <div class="dashboard-card">
@@ -128,6 +139,24 @@ async function cargarDashboard() {
             </div>
         </div>
 
+        <h3 style="margin-top: 2rem;">Mis pólizas</h3>
+        ${polizas.length === 0
+            ? '<div class="alert alert-info">Todavía no tienes pólizas</div>'
+            : `<div class="dashboard-grid">${polizas.map(poliza => `
+                <div class="dashboard-card">
+                    <h3>${poliza.seguro_nombre}</h3>
+                    <p>${poliza.estado} · ${poliza.cuotas_pagadas}/${poliza.cuotas_totales} cuotas</p>
+                </div>`).join("")}</div>`}
+
+        <h3 style="margin-top: 2rem;">Próximos pagos</h3>
+        ${proximosPagos.length === 0
+            ? '<div class="alert alert-info">No tienes cuotas pendientes</div>'
+            : `<div class="dashboard-grid">${proximosPagos.map(pago => `
+                <div class="dashboard-card">
+                    <h3>${pago.seguro_nombre}</h3>
+                    <p>$${pago.cuota_mensual.toFixed(2)} · faltan ${pago.cuotas_pendientes} cuotas</p>
+                </div>`).join("")}</div>`}
+
         <div style="margin-top: 2rem; text-align: center;">
             <button class="btn btn-primary btn-sm" onclick="mostrarSeccion('seguros')">Ver Seguros</button>
             <button class="btn btn-primary btn-sm" onclick="cerrarSesion()">Cerrar Sesión</button>
@@ -6,22 +6,31 @@ from pathlib import Path
 project_root = str(Path(__file__).parent)
 sys.path.insert(0, project_root)
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from app.routes import router
-from app.database import connect_to_mongo, close_mongo_connection
-from app.database_sql import init_db_sql, close_db_sql
-from app import models
+from app.database import connect_to_mongo, close_mongo_connection, get_db, ping_mongo
+from app.database_sql import (
+    init_db_sql, close_db_sql, marcar_escritura, escritura_confirmada, calentar_pools, ping_sql,
+    engine, engine_lectura, BACKEND_ALMACENAMIENTO
+)
+from app.auditoria_async import escritor as escritor_auditoria, AUDITORIA_MODO
+from app.facturacion import facturacion_programada, FACTURACION_INTERVALO_HORAS
+from app.idempotencia import purga_programada
+from app import models, metricas, consultas, database, indices_mongo, particiones
+from app.catalogo_cache import catalogo_cache
+from app.disponibilidad import disponibilidad
+from app.respuestas import RespuestaJSON
+from app.estaticos import FrontendPrecomprimido, DIRECTORIO_DIST
+import asyncio
+import time
 import uvicorn
 
 async def crear_seguros_economicos(app: FastAPI):
     """Crear paquetes de seguros económicos automáticamente si no existen"""
-    from motor.motor_asyncio import AsyncIOMotorClient
-    from app.database import DATABASE_NAME, MONGODB_URL
-    
-    client = AsyncIOMotorClient(MONGODB_URL)
-    db = client[DATABASE_NAME]
+    # Usa el cliente compartido (MongoDB o documentos en SQLite según el backend)
+    db = await get_db()
     
     # Verificar si ya existen seguros
     seguros_count = await db.seguros.count_documents({})
@@ -64,15 +73,14 @@ async def crear_seguros_economicos(app: FastAPI):
             await db.seguros.insert_one(seguro.model_dump())
         
         print("✅ Paquetes de seguros económicos creados automáticamente")
-    
-    client.close()
 
 app = FastAPI(
     title="Sistema de Seguros API",
     description="Backend para sistema de seguros de ahorro",
     version="3.0.0",
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    default_response_class=RespuestaJSON
 )
 
 # Configurar CORS
@@ -85,30 +93,101 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.on_event("startup")
-async def startup_db_client():
-    # Conectar a MongoDB
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    """Después de una escritura confirmada en el primario, las lecturas del cliente van al primario por unos segundos"""
+    response = await call_next(request)
+    if response.status_code < 400 and escritura_confirmada(request):
+        marcar_escritura(response)
+    return response
+
+@app.middleware("http")
+async def medir_peticiones(request: Request, call_next):
+    """Latencia y código de estado por ruta para /metrics"""
+    if not metricas.METRICAS_HABILITADAS:
+        return await call_next(request)
+    inicio = time.perf_counter()
+    status = 500
     try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metricas.observar_peticion(request, status, time.perf_counter() - inicio)
+
+@app.middleware("http")
+async def contar_consultas(request: Request, call_next):
+    """Consultas SQL y Mongo por petición (header en modo debug, aviso si supera el presupuesto)"""
+    conteo = consultas.iniciar_conteo()
+    response = await call_next(request)
+    consultas.finalizar_conteo(conteo, request.method, metricas.plantilla_ruta(request), response)
+    return response
+
+@app.get("/metrics", include_in_schema=False)
+async def exponer_metricas():
+    """Métricas en formato de texto de Prometheus"""
+    return Response(metricas.registro.exponer(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+async def iniciar_mongo():
+    """Cliente compartido, índices, seguros iniciales y caché del catálogo"""
+    if database.db.client is None:
         await connect_to_mongo()
-        print("✅ Conectado a MongoDB")
-    except Exception as e:
-        print(f"⚠️  No se pudo conectar a MongoDB: {e}")
+    await ping_mongo()
+    db = await get_db()
+    if BACKEND_ALMACENAMIENTO != "sqlite":
+        await indices_mongo.asegurar(db)
+    await crear_seguros_economicos(app)
+    # Las primeras lecturas del catálogo no van a MongoDB
+    await catalogo_cache.etag_vigente(db)
+
+async def migrar_sql():
+    """Migraciones del esquema y particiones de los próximos meses (DDL: sin tope de tiempo)"""
+    await init_db_sql()
+    await particiones.preparar()
+
+async def iniciar_sql():
+    """Pools precalentados y escritor de auditoría"""
+    await calentar_pools()
+    # Escritor de auditoría en lote (salvo en modo estricto)
+    if AUDITORIA_MODO != "estricto":
+        await escritor_auditoria.iniciar()
+
+# Con BACKEND_ALMACENAMIENTO=sqlite, "mongo" es la tabla de documentos del mismo archivo
+disponibilidad.registrar("mongo", iniciar_mongo, {"mongo": ping_mongo})
+pings_sql = {"sql": ping_sql}
+if engine_lectura is not engine:
+    pings_sql["sql_lectura"] = lambda: ping_sql(engine_lectura)
+disponibilidad.registrar("sql", iniciar_sql, pings_sql, migrar=migrar_sql)
+
+@app.get("/ready", include_in_schema=False)
+async def listo():
+    """Sonda de disponibilidad: 200 solo si todos los backends están inicializados y responden"""
+    esta_listo, backends = await disponibilidad.comprobar()
+    return RespuestaJSON({"listo": esta_listo, "backends": backends}, status_code=200 if esta_listo else 503)
+
+@app.on_event("startup")
+async def startup_db_client():
+    # MongoDB y SQL se inicializan en paralelo; los que fallen se reintentan en segundo plano
+    await disponibilidad.arrancar()
     
-    # Inicializar MySQL (comentado - comentar si no necesitas MySQL)
-    try:
-        await init_db_sql()
-        print("✅ Conectado a MySQL")
-    except Exception as e:
-        print(f"⚠️  No se pudo conectar a MySQL: {e}")
+    # Facturación mensual programada (solo si se configuró un intervalo)
+    if FACTURACION_INTERVALO_HORAS > 0:
+        app.state.tarea_facturacion = asyncio.create_task(facturacion_programada(FACTURACION_INTERVALO_HORAS))
     
-    # Crear seguros iniciales en MongoDB
-    try:
-        await crear_seguros_economicos(app)
-    except Exception as e:
-        print(f"⚠️  No se pudieron crear seguros iniciales: {e}")
+    # Purga de claves de idempotencia vencidas
+    app.state.tarea_idempotencia = asyncio.create_task(purga_programada())
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    # Detener las tareas programadas (facturación y purga de idempotencia)
+    disponibilidad.detener()
+    tarea_facturacion = getattr(app.state, "tarea_facturacion", None)
+    if tarea_facturacion is not None:
+        tarea_facturacion.cancel()
+    tarea_idempotencia = getattr(app.state, "tarea_idempotencia", None)
+    if tarea_idempotencia is not None:
+        tarea_idempotencia.cancel()
+    
     # Cerrar MongoDB
     try:
         await close_mongo_connection()
@@ -116,6 +195,12 @@ async def shutdown_db_client():
     except Exception as e:
         print(f"⚠️  Error al cerrar MongoDB: {e}")
     
+    # Escribir las auditorías pendientes antes de cerrar MySQL
+    try:
+        await escritor_auditoria.detener()
+    except Exception as e:
+        print(f"⚠️  Error al vaciar la cola de auditoría: {e}")
+    
     # Cerrar MySQL (comentado - comentar si no necesitas MySQL)
     try:
         await close_db_sql()
@@ -127,8 +212,11 @@ async def shutdown_db_client():
 app.include_router(router, prefix="/api/v1")
 
 # Servir archivos estáticos del frontend (debe ir al final)
+# Con `python -m app.estaticos` se sirve frontend/dist: assets con hash, precomprimidos y en memoria
 frontend_path = os.path.join(os.path.dirname(__file__), "frontend")
-if os.path.exists(frontend_path):
+if DIRECTORIO_DIST.exists():
+    app.mount("/", FrontendPrecomprimido(DIRECTORIO_DIST), name="static")
+elif os.path.exists(frontend_path):
     app.mount("/", StaticFiles(directory=frontend_path, html=True), name="static")
 
 if __name__ == "__main__":
@@ -20,7 +20,8 @@ CREATE TABLE IF NOT EXISTS usuarios (
     activo BOOLEAN DEFAULT TRUE,
     fecha_registro DATETIME DEFAULT CURRENT_TIMESTAMP,
     INDEX idx_email (email),
-    INDEX idx_activo (activo)
+    INDEX idx_activo (activo),
+    INDEX idx_activo_fecha_id (activo, fecha_registro, id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- 4. Crear tabla de seguros (referencia, aunque principalmente en MongoDB)
@@ -58,32 +59,35 @@ CREATE TABLE IF NOT EXISTS polizas (
     INDEX idx_usuario (usuario_id),
     INDEX idx_seguro (seguro_id),
     INDEX idx_estado (estado),
-    INDEX idx_fecha_inicio (fecha_inicio)
+    INDEX idx_fecha_inicio (fecha_inicio),
+    INDEX idx_polizas_usuario_fecha (usuario_id, fecha_inicio),
+    INDEX idx_polizas_usuario_estado (usuario_id, estado)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- 6. Crear tabla de pagos
+-- pagos y auditoría se particionan por mes (python -m app.particiones particionar):
+-- la fecha va en la clave primaria y no llevan claves foráneas
 CREATE TABLE IF NOT EXISTS pagos (
-    id VARCHAR(36) PRIMARY KEY,
+    id VARCHAR(36) NOT NULL,
     poliza_id VARCHAR(36) NOT NULL,
     usuario_id VARCHAR(36) NOT NULL,
     monto DECIMAL(10, 2) NOT NULL,
-    fecha_pago DATETIME DEFAULT CURRENT_TIMESTAMP,
+    fecha_pago DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
     metodo_pago VARCHAR(50) DEFAULT 'saldo',
     estado ENUM('completado', 'pendiente', 'fallido') DEFAULT 'completado',
     numero_cuota INT NOT NULL,
     
-    FOREIGN KEY (poliza_id) REFERENCES polizas(id) ON DELETE CASCADE,
-    FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE,
-    
+    PRIMARY KEY (id, fecha_pago),
     INDEX idx_poliza (poliza_id),
     INDEX idx_usuario (usuario_id),
     INDEX idx_fecha (fecha_pago),
-    INDEX idx_estado (estado)
+    INDEX idx_estado (estado),
+    INDEX idx_pagos_poliza_fecha (poliza_id, fecha_pago)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- 7. Crear tabla de auditoría
 CREATE TABLE IF NOT EXISTS auditoria (
-    id INT AUTO_INCREMENT PRIMARY KEY,
+    id INT AUTO_INCREMENT,
     usuario_id VARCHAR(36),
     accion VARCHAR(100) NOT NULL,
     tabla_afectada VARCHAR(50) NOT NULL,
@@ -91,21 +95,58 @@ CREATE TABLE IF NOT EXISTS auditoria (
     datos_anteriores JSON,
     datos_nuevos JSON,
     ip_address VARCHAR(45),
-    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-    
-    FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE SET NULL,
+    timestamp DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
     
+    PRIMARY KEY (id, timestamp),
     INDEX idx_usuario (usuario_id),
     INDEX idx_tabla (tabla_afectada),
     INDEX idx_timestamp (timestamp),
-    INDEX idx_accion (accion)
+    INDEX idx_accion (accion),
+    INDEX idx_auditoria_tabla_timestamp (tabla_afectada, timestamp)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 8. Crear tabla de resumen de cuentas (totales por usuario)
+CREATE TABLE IF NOT EXISTS resumen_cuentas (
+    usuario_id VARCHAR(36) PRIMARY KEY,
+    polizas_activas INT NOT NULL DEFAULT 0,
+    total_pagado DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    cuotas_pendientes INT NOT NULL DEFAULT 0,
+    proximo_monto DECIMAL(10, 2) NOT NULL DEFAULT 0,
+    actualizado DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    
+    FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
--- 8. Ver las tablas creadas
+-- 9. Crear tabla de claves de idempotencia (compras y pagos de cuotas)
+CREATE TABLE IF NOT EXISTS idempotencia (
+    clave VARCHAR(100) PRIMARY KEY,
+    huella VARCHAR(64) NOT NULL,
+    respuesta TEXT NOT NULL,
+    creado DATETIME DEFAULT CURRENT_TIMESTAMP,
+    expira DATETIME NOT NULL,
+    
+    INDEX ix_idempotencia_expira (expira)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 10. Crear tabla de totales de pagos archivados (python -m app.particiones archivar)
+CREATE TABLE IF NOT EXISTS pagos_archivados (
+    usuario_id VARCHAR(36) NOT NULL,
+    hasta DATETIME NOT NULL,
+    total DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    pagos INT NOT NULL DEFAULT 0,
+    
+    PRIMARY KEY (usuario_id, hasta),
+    FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Los cambios posteriores al esquema se aplican con: python -m app.migraciones
+
+-- 11. Ver las tablas creadas
 SHOW TABLES;
 
--- 9. Verificar estructura de las tablas
+-- 12. Verificar estructura de las tablas
 DESCRIBE usuarios;
 DESCRIBE polizas;
 DESCRIBE pagos;
 DESCRIBE auditoria;
+DESCRIBE resumen_cuentas;
@@ -0,0 +1,44 @@
+"""
+Entorno de los tests: SQLite temporal y sin eco de SQL
+
+Las variables se fijan antes de importar la app (igual que en `bench`) para
+que `database_sql` cree el engine contra una base descartable.
+"""
+from pathlib import Path
+import asyncio
+import httpx
+import os
+import pytest
+import random
+import sys
+import tempfile
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+os.environ["SQL_DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/tests.db?timeout=30"
+os.environ.pop("SQL_READ_DATABASE_URL", None)
+os.environ.pop("MYSQL_READ_HOST", None)
+os.environ["SQL_ECHO"] = "0"
+os.environ["FACTURACION_INTERVALO_HORAS"] = "0"
+sys.path.insert(0, str(RAIZ))
+
+
+@pytest.fixture
+def con_datos():
+    """Correr `prueba(cliente, datos)` sobre bases recién creadas con dos usuarios y una póliza cada uno"""
+    from app import database_sql
+    from bench import escenarios
+    from main import app
+
+    def correr(prueba):
+        async def principal():
+            await escenarios.preparar_bases()
+            try:
+                transporte = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transporte, base_url="http://test") as cliente:
+                    datos = await escenarios.cargar_datos(cliente, 2, random.Random(1))
+                    await prueba(cliente, datos)
+            finally:
+                await database_sql.engine.dispose()
+        asyncio.run(principal())
+    return correr
@@ -0,0 +1,61 @@
+"""
+Facturación en lote: cuotas atrasadas y bloques fallidos
+"""
+from app import database_sql, facturacion
+from app.models_sql import PagoSQL, PolizaSQL
+from app.resumen_cuentas import verificar_resumenes
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, update
+
+
+async def _atrasar(poliza_ids, dias: int):
+    """Mover el inicio de las pólizas `dias` hacia atrás"""
+    async with database_sql.AsyncSessionLocal() as db:
+        await db.execute(
+            update(PolizaSQL)
+            .where(PolizaSQL.id.in_(poliza_ids))
+            .values(fecha_inicio=datetime.now() - timedelta(days=dias))
+        )
+        await db.commit()
+
+
+def test_cobra_todas_las_cuotas_vencidas(con_datos):
+    async def prueba(cliente, datos):
+        poliza_id = datos.polizas[0]
+        await _atrasar([poliza_id], 2 * facturacion.DIAS_POR_CUOTA + 5)
+
+        resumen = await facturacion.ejecutar_facturacion(sesiones=1)
+
+        assert resumen["cuotas_cobradas"] == 2
+        assert resumen["bloques_fallidos"] == 0
+        async with database_sql.AsyncSessionLocal() as db:
+            poliza = await db.get(PolizaSQL, poliza_id)
+            numeros = (await db.execute(
+                select(PagoSQL.numero_cuota).where(PagoSQL.poliza_id == poliza_id).order_by(PagoSQL.numero_cuota)
+            )).scalars().all()
+        assert poliza.cuotas_pagadas == 2
+        assert numeros == [1, 2]
+        assert await verificar_resumenes() == []
+
+        # Una segunda corrida no cobra nada más
+        resumen = await facturacion.ejecutar_facturacion(sesiones=1)
+        assert resumen["cuotas_cobradas"] == 0
+    con_datos(prueba)
+
+
+def test_bloque_fallido_se_informa(con_datos, monkeypatch):
+    async def fallar(poliza_ids, fecha_corte, resultado):
+        raise RuntimeError("base caída")
+
+    async def prueba(cliente, datos):
+        await _atrasar(datos.polizas, facturacion.DIAS_POR_CUOTA + 1)
+        monkeypatch.setattr(facturacion, "_cobrar_bloque", fallar)
+
+        resumen = await facturacion.ejecutar_facturacion(sesiones=1)
+
+        assert resumen["bloques"] == 0
+        assert resumen["bloques_fallidos"] == 1
+        assert resumen["polizas_omitidas"] == len(datos.polizas)
+        async with database_sql.AsyncSessionLocal() as db:
+            assert (await db.execute(select(func.count()).select_from(PagoSQL))).scalar() == 0
+    con_datos(prueba)
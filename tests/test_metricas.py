@@ -0,0 +1,26 @@
+"""
+Etiquetas de ruta de las métricas HTTP
+"""
+from app import metricas
+import pytest
+
+
+@pytest.mark.parametrize("url, esperada", [
+    ("/api/v1/usuarios/api", "/api/v1/usuarios/{usuario_id}"),
+    ("/api/v1/usuarios/v1/resumen", "/api/v1/usuarios/{usuario_id}/resumen"),
+    ("/api/v1/seguros/", "/api/v1/seguros/"),
+    ("/metrics", "/metrics"),
+])
+def test_plantilla_ruta(con_datos, monkeypatch, url, esperada):
+    etiquetas = []
+    original = metricas.plantilla_ruta
+
+    def registrar(request):
+        etiquetas.append(original(request))
+        return etiquetas[-1]
+    monkeypatch.setattr(metricas, "plantilla_ruta", registrar)
+
+    async def prueba(cliente, datos):
+        await cliente.get(url)
+        assert etiquetas and etiquetas[-1] == esperada
+    con_datos(prueba)
@@ -0,0 +1,76 @@
+"""
+Presupuesto de consultas SQL por endpoint
+
+Cada test hace la petición dentro de `limite_consultas`, así un N+1 o una
+consulta de más en el camino caliente rompe el test. Los datos se cargan con
+los mismos helpers del benchmark (SQLite + Mongo falso); el Mongo falso no
+pasa por el CommandListener de pymongo, por eso solo se limita el SQL.
+"""
+from app import consultas, database_sql
+from app.models_sql import ResumenCuentaSQL
+from bench import escenarios
+from sqlalchemy import delete
+
+PREFIJO = escenarios.PREFIJO
+
+# Máximo de sentencias SQL por petición (SQLite: el débito devuelve el saldo con RETURNING;
+# en MySQL compra y pago leen el saldo con una consulta más)
+PRESUPUESTO_COMPRA = 5
+PRESUPUESTO_PAGO_CUOTA = 7
+PRESUPUESTO_DASHBOARD = 2
+PRESUPUESTO_RESUMEN = 1
+PRESUPUESTO_RESUMEN_PRIMERA_VEZ = 8
+
+
+def test_comprar_seguro(con_datos):
+    async def prueba(cliente, datos):
+        with consultas.limite_consultas(sql=PRESUPUESTO_COMPRA):
+            respuesta = await cliente.post(
+                f"{PREFIJO}/usuarios/{datos.usuarios[0]}/comprar-seguro",
+                json={"seguro_id": datos.seguros[0]}
+            )
+        assert respuesta.status_code == 200, respuesta.text
+    con_datos(prueba)
+
+
+def test_pagar_cuota(con_datos):
+    async def prueba(cliente, datos):
+        poliza_id = datos.polizas[0]
+        with consultas.limite_consultas(sql=PRESUPUESTO_PAGO_CUOTA):
+            respuesta = await cliente.post(
+                f"{PREFIJO}/polizas/{poliza_id}/pagar-cuota", json={"poliza_id": poliza_id}
+            )
+        assert respuesta.status_code == 200, respuesta.text
+        assert respuesta.json()["numero_cuota"] == 1
+    con_datos(prueba)
+
+
+def test_dashboard(con_datos):
+    async def prueba(cliente, datos):
+        with consultas.limite_consultas(sql=PRESUPUESTO_DASHBOARD):
+            respuesta = await cliente.get(f"{PREFIJO}/usuarios/{datos.usuarios[0]}/dashboard")
+        assert respuesta.status_code == 200, respuesta.text
+    con_datos(prueba)
+
+
+def test_resumen(con_datos):
+    async def prueba(cliente, datos):
+        usuario_id = datos.usuarios[0]
+        with consultas.limite_consultas(sql=PRESUPUESTO_RESUMEN):
+            respuesta = await cliente.get(f"{PREFIJO}/usuarios/{usuario_id}/resumen")
+        assert respuesta.status_code == 200, respuesta.text
+        assert respuesta.json()["polizas_activas"] == 1
+    con_datos(prueba)
+
+
+def test_resumen_primera_vez(con_datos):
+    async def prueba(cliente, datos):
+        usuario_id = datos.usuarios[0]
+        async with database_sql.AsyncSessionLocal() as db:
+            await db.execute(delete(ResumenCuentaSQL).where(ResumenCuentaSQL.usuario_id == usuario_id))
+            await db.commit()
+        with consultas.limite_consultas(sql=PRESUPUESTO_RESUMEN_PRIMERA_VEZ):
+            respuesta = await cliente.get(f"{PREFIJO}/usuarios/{usuario_id}/resumen")
+        assert respuesta.status_code == 200, respuesta.text
+        assert respuesta.json()["polizas_activas"] == 1
+    con_datos(prueba)
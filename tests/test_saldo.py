@@ -0,0 +1,29 @@
+"""
+Débitos de saldo: saldo resultante en la respuesta y en la auditoría
+"""
+from app import database_sql
+from app.models_sql import AuditoriaSQL
+from bench import escenarios
+from sqlalchemy import select
+
+
+def test_compra_audita_saldo_anterior_y_nuevo(con_datos):
+    async def prueba(cliente, datos):
+        usuario_id = datos.usuarios[0]
+        respuesta = await cliente.post(
+            f"{escenarios.PREFIJO}/usuarios/{usuario_id}/comprar-seguro",
+            json={"seguro_id": datos.seguros[0]}
+        )
+        assert respuesta.status_code == 200, respuesta.text
+        cuerpo = respuesta.json()
+
+        async with database_sql.AsyncSessionLocal() as db:
+            auditoria = (await db.execute(
+                select(AuditoriaSQL)
+                .where(AuditoriaSQL.usuario_id == usuario_id, AuditoriaSQL.accion == "DEBITO_SALDO")
+                .order_by(AuditoriaSQL.id.desc())
+                .limit(1)
+            )).scalar_one()
+        assert auditoria.datos_nuevos["saldo"] == cuerpo["nuevo_saldo"]
+        assert auditoria.datos_anteriores["saldo"] == cuerpo["nuevo_saldo"] + cuerpo["monto_pagado"]
+    con_datos(prueba)